@@ -3,6 +3,10 @@ ASGI config for Voters_system project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serving through ASGI (e.g. ``uvicorn Voters_system.asgi:application``) enables
+the live dashboard stats stream at ``/api/stats/stream/``; under WSGI the
+dashboards fall back to polling ``/api/stats/``.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -87,6 +87,24 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# إحصائيات لوحات التحكم تُخزن هنا (انظر elections/stats_cache.py). LocMemCache خاص
+# بكل عملية، فمع عدة عمليات للخادم يُفضل Redis أو Memcached أو FileBasedCache
+# لمشاركتها؛ وإلا فقد تُعرض إحصائيات قديمة حتى ELECTIONS_STATS_VERSION_TIMEOUT ثانية
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'voters-system',
+    }
+}
+
+ELECTIONS_STATS_CACHE_TIMEOUT = 300
+# None (بلا انتهاء) فقط مع ذاكرة مؤقتة مشتركة بين كل العمليات
+ELECTIONS_STATS_VERSION_TIMEOUT = 60
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
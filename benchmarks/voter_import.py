@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+"""
+قياس سرعة قراءة ملفات استيراد الناخبين بكل صيغة على البيانات نفسها
+
+الاستخدام:
+    python benchmarks/voter_import.py --rows 500000
+    python benchmarks/voter_import.py --rows 100000 --import
+    python benchmarks/voter_import.py --rows 200000 --workers 1 2 4 8
+
+تُكتب الصفوف نفسها بصيغ xlsx و CSV (UTF-8 مع BOM و Windows-1256) و xls (إن
+وُجدت حزمتا xlrd و xlwt)، ثم يُقاس زمن القراءة والتحقق (readers.py + clean_row) لكل
+صيغة. مع --import يُقاس أيضاً الاستيراد الكامل إلى قاعدة SQLite مؤقتة، بأرقام
+ناخبين مختلفة البادئة لكل صيغة حتى لا تتعارض.
+
+مع --workers يُقاس ملف CSV (UTF-8 مع BOM) بكل عدد من عمليات التحقق: مرحلة التحقق
+وحدها (القراءة تبقى متسلسلة) ثم، مع --import، الاستيراد الكامل بكاتب واحد.
+التسريع لا يظهر إلا على جهاز متعدد الأنوية؛ عدد الأنوية يُطبع مع النتائج.
+"""
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Voters_system.settings')
+
+from voter_indexes import populate, setup_database  # noqa: E402
+
+HEADER = ['رقم الناخب', 'الاسم', 'رقم الهاتف', 'المحافظة', 'المنطقة', 'الناحية', 'اسم المركز', 'رقم المركز',
+          'المحطة', 'حالة البطاقة', 'حالة التصويت']
+
+
+def dataset(count, centers, prefix='IMP'):
+    for i in range(count):
+        yield [f'{prefix}{i:09d}', f'ناخب مستورد {i}', f'0770{i:07d}', *centers[i % len(centers)],
+               str(i % 12), 'محدث' if i % 2 else 'غير محدث', 'لم يصوت']
+
+
+def write_xlsx(path, rows):
+    import openpyxl
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(HEADER)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
+
+
+def write_csv(path, rows, encoding):
+    with open(path, 'w', encoding=encoding, newline='') as output:
+        writer = csv.writer(output)
+        writer.writerow(HEADER)
+        writer.writerows(rows)
+
+
+def write_xls(path, rows):
+    import xlwt
+    workbook = xlwt.Workbook(encoding='utf-8')
+    sheet = workbook.add_sheet('voters')
+    for r, row in enumerate([HEADER] + list(rows)):
+        for c, value in enumerate(row):
+            sheet.write(r, c, value)
+    workbook.save(path)
+
+
+def formats():
+    """(الاسم، الامتداد، دالة الكتابة) لكل صيغة متاحة"""
+    available = [
+        ('xlsx', '.xlsx', write_xlsx),
+        ('csv utf-8-sig', '.csv', lambda path, rows: write_csv(path, rows, 'utf-8-sig')),
+        ('csv cp1256', '.csv', lambda path, rows: write_csv(path, rows, 'cp1256')),
+    ]
+    try:
+        import xlrd  # noqa: F401
+        import xlwt  # noqa: F401
+    except ImportError:
+        print('xls: تم تجاوزه (يتطلب xlrd و xlwt)')
+    else:
+        available.append(('xls', '.xls', write_xls))
+    return available
+
+
+def read_throughput(path):
+    """صفوف/ثانية لقراءة الملف وربط أعمدته والتحقق من قيمه دون قاعدة البيانات"""
+    from elections.imports import clean_row, read_file
+    start = time.perf_counter()
+    count = 0
+    with open(path, 'rb') as file:
+        for _, values in read_file(file):
+            clean_row(values)
+            count += 1
+    return count, time.perf_counter() - start
+
+
+def validate_throughput(path, workers):
+    """صفوف/ثانية للقراءة والتحقق بعدد من العمليات (دون قاعدة البيانات)"""
+    from elections.imports import CHUNK_SIZE, chunked, read_file, validate_chunks
+    start = time.perf_counter()
+    count = 0
+    with open(path, 'rb') as file:
+        for results in validate_chunks(chunked(read_file(file), CHUNK_SIZE), workers):
+            count += len(results)
+    return count, time.perf_counter() - start
+
+
+def compare_workers(args, pillars, centers, files):
+    from elections.imports import import_voters
+    print(f'cpu cores: {os.cpu_count()}')
+    print(f'{"workers":>7} {"validate rows/s":>16} {"speedup":>8} {"import rows/s":>14} {"speedup":>8}')
+    base = {}
+    for index, workers in enumerate(args.workers):
+        # ملف لكل قياس بالصفوف نفسها وبادئة مختلفة حتى لا تتعارض أرقام الناخبين
+        file_path = tempfile.mktemp(suffix='.csv', prefix='voters-import-')
+        files.append(file_path)
+        write_csv(file_path, dataset(args.rows, centers, f'W{index}'), 'utf-8-sig')
+        count, seconds = validate_throughput(file_path, workers)
+        validated = count / seconds
+        base.setdefault('validate', validated)
+        imported = speedup = ''
+        if args.full_import:
+            with open(file_path, 'rb') as file:
+                rate = import_voters(file, pillars[index % len(pillars)], workers=workers)['rows_per_second']
+            base.setdefault('import', rate)
+            imported = f'{rate:,}'
+            speedup = f'{rate / base["import"]:.2f}x'
+        print(f'{workers:7} {validated:16,.0f} {validated / base["validate"]:7.2f}x {imported:>14} {speedup:>8}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=500_000)
+    parser.add_argument('--import', dest='full_import', action='store_true',
+                        help='قياس الاستيراد الكامل إلى القاعدة أيضاً')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        help='مقارنة أعداد عمليات التحقق (مثلاً 1 2 4) بدلاً من مقارنة الصيغ')
+    args = parser.parse_args()
+
+    path = tempfile.mktemp(suffix='.sqlite3', prefix='voters-bench-')
+    setup_database(path)
+    files = []
+    try:
+        pillars = populate(1000)
+        from elections.models import PollingCenter
+        centers = list(PollingCenter.objects.values_list('governorate', 'district', 'sub_district', 'name', 'number'))
+
+        if args.workers:
+            compare_workers(args, pillars, centers, files)
+            return
+        available = formats()
+        print(f'{"format":16} {"size MB":>8} {"read s":>8} {"read rows/s":>12} {"import rows/s":>14}')
+        for index, (name, extension, write) in enumerate(available):
+            file_path = tempfile.mktemp(suffix=extension, prefix='voters-import-')
+            files.append(file_path)
+            prefix = f'F{index}'
+            write(file_path, dataset(args.rows, centers, prefix))
+            size = os.path.getsize(file_path) / 1024 / 1024
+            count, seconds = read_throughput(file_path)
+            imported = ''
+            if args.full_import:
+                from elections.imports import import_voters
+                with open(file_path, 'rb') as file:
+                    result = import_voters(file, pillars[index])
+                imported = f'{result["rows_per_second"]:,}'
+            print(f'{name:16} {size:8.1f} {seconds:8.1f} {count / seconds:12,.0f} {imported:>14}')
+    finally:
+        for file_path in files + [path]:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+
+if __name__ == '__main__':
+    main()
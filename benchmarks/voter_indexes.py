@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+"""
+قياس زمن استعلامات لوحات التحكم على قاعدة SQLite اصطناعية قبل الفهارس المركبة وبعدها
+
+الاستخدام:
+    python benchmarks/voter_indexes.py --voters 1000000
+
+"قبل" = فهارس المفاتيح الأجنبية (pillar, candidate, entity) فقط كما كان الجدول سابقاً،
+"بعد" = الفهارس المركبة المعرفة في Voter.Meta.indexes.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Voters_system.settings')
+
+from django.conf import settings  # noqa: E402
+
+
+def setup_database(path):
+    settings.DATABASES['default']['NAME'] = path
+    import django
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def populate(voters_count, entities=5, candidates_per_entity=20, pillars_per_candidate=10, seed=1):
+    """إنشاء بيانات اصطناعية مباشرة بـ executemany (أسرع بكثير من ORM لمليون صف)"""
+    from django.db import connection, transaction
+    from django.utils import timezone
+    from elections.models import CustomUser, Entity, Candidate, Pillar, Voter, PollingCenter, Station
+    from elections.rollups import rebuild_rollups
+
+    rng = random.Random(seed)
+    pillars = []
+    with transaction.atomic():
+        for e in range(entities):
+            user = CustomUser.objects.create(username=f'entity{e}', user_type='entity', full_name=f'كيان {e}')
+            entity = Entity.objects.create(user=user, entity_name=f'كيان {e}')
+            for c in range(candidates_per_entity):
+                user = CustomUser.objects.create(username=f'candidate{e}_{c}', user_type='candidate',
+                                                 full_name=f'مرشح {e}-{c}')
+                candidate = Candidate.objects.create(user=user, entity=entity)
+                for p in range(pillars_per_candidate):
+                    user = CustomUser.objects.create(username=f'pillar{e}_{c}_{p}', user_type='pillar',
+                                                     full_name=f'ركيزة {e}-{c}-{p}')
+                    pillars.append(Pillar.objects.create(user=user, candidate=candidate))
+
+    governorates = ['بغداد', 'البصرة', 'نينوى', 'أربيل', 'النجف', 'كربلاء']
+    stations = []
+    with transaction.atomic():
+        for center in range(2000):
+            governorate = rng.randrange(len(governorates))
+            district = rng.randrange(8)
+            polling_center = PollingCenter.objects.create(
+                number=str(100000 + center), name=f'مركز {center}', governorate=governorates[governorate],
+                district=f'منطقة {governorate}-{district}', sub_district=f'ناحية {district}-{rng.randrange(5)}')
+            stations.append([Station.objects.create(center=polling_center, number=str(s)).pk for s in range(12)])
+    table = Voter._meta.db_table
+    columns = ['voter_number', 'name', 'card_status', 'polling_center_id', 'polling_station_id',
+               'phone_number', 'phone_reversed', 'pillar_id', 'candidate_id', 'entity_id', 'voting_status', 'created_at']
+    sql = f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join(["%s"] * len(columns))})'
+    now = timezone.now()
+    batch = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for i in range(voters_count):
+            pillar = pillars[rng.randrange(len(pillars))]
+            center = rng.randrange(len(stations))
+            phone = f'07{rng.randrange(10 ** 9):09d}'
+            batch.append((
+                f'{i:09d}', f'ناخب {i}', 'updated' if rng.random() < 0.6 else 'not_updated',
+                center + 1, stations[center][rng.randrange(12)], phone, phone[::-1], pillar.pk, pillar.candidate_id,
+                pillar.candidate.entity_id, 'voted' if rng.random() < 0.4 else 'not_voted', now,
+            ))
+            if len(batch) == 10000:
+                cursor.executemany(sql, batch)
+                batch = []
+        if batch:
+            cursor.executemany(sql, batch)
+    # الإدراج المباشر لا يمر بحفظ الناخب، فتُبنى الإحصائيات المجمعة التي تقرأ منها اللوحات
+    rebuild_rollups()
+    return pillars
+
+
+def dashboard_queries(pillar):
+    """الاستعلامات الفعلية للوحات التحكم وصفحة الإحصائيات كما تبنيها العروض"""
+    from elections.models import Voter
+    from elections.rollups import compute_rollups
+    from django.http import QueryDict
+    from elections.pagination import KeysetPaginator
+    from elections.search import search_filter
+    from elections.statistics import compute_scope_facets, compute_scope_stats
+
+    candidate_id = pillar.candidate_id
+    pillar_voters = Voter.objects.filter(pillar=pillar)
+    candidate_voters = Voter.objects.filter(candidate_id=candidate_id)
+    voter = pillar_voters.order_by('id').first()
+    phone_suffix = voter.phone_number[-7:]
+    return [
+        ('pillar: scope stats', lambda: compute_scope_stats('pillar', pillar.pk)),
+        ('candidate: scope stats', lambda: compute_scope_stats('candidate', candidate_id)),
+        ('pillar: voted count', lambda: pillar_voters.filter(voting_status='voted').count()),
+        ('candidate: updated count', lambda: candidate_voters.filter(card_status='updated').count()),
+        ('candidate: distinct centers', lambda: candidate_voters.values('polling_center').distinct().count()),
+        ('pillar: filter lists', lambda: compute_scope_facets('pillar', pillar.pk)),
+        ('candidate: filter lists', lambda: compute_scope_facets('candidate', candidate_id)),
+        ('pillar: district filter page', lambda: list(pillar_voters.filter(
+            polling_center__district=compute_scope_facets('pillar', pillar.pk)['district'][0][0])[:25])),
+        ('candidate: not_voted page', lambda: list(
+            candidate_voters.filter(voting_status='not_voted').order_by('id')[:50])),
+        ('candidate: last page (OFFSET)', lambda: list(
+            candidate_voters.order_by('id')[candidate_voters.count() // 50 * 50:][:50])),
+        ('candidate: last page (keyset)', lambda: KeysetPaginator(
+            candidate_voters, 50).page(QueryDict('last=1')).object_list),
+        ('entity: voted count', lambda: Voter.objects.filter(
+            entity_id=pillar.candidate.entity_id, voting_status='voted').count()),
+        ('admin: voted count', lambda: Voter.objects.filter(voting_status='voted').count()),
+        ('admin: phone icontains', lambda: list(Voter.objects.filter(phone_number__icontains=phone_suffix))),
+        ('admin: phone last 7 digits', lambda: list(Voter.objects.filter(search_filter(phone_suffix)))),
+        ('admin: voter_number prefix', lambda: list(Voter.objects.filter(
+            search_filter(voter.voter_number[:-2]))[:25])),
+        ('admin: compute_rollups', compute_rollups),
+    ]
+
+
+def measure(queries, repeat):
+    results = {}
+    for name, query in queries:
+        query()  # تسخين ذاكرة الصفحات
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            query()
+            timings.append(time.perf_counter() - start)
+        results[name] = min(timings)
+    return results
+
+
+def set_indexes(composite):
+    """التبديل بين فهارس المفتاحين الأجنبيين القديمة والفهارس المركبة الجديدة"""
+    from django.db import connection, models
+    from elections.models import Voter
+
+    legacy = [models.Index(fields=['pillar'], name='bench_voter_pillar_idx'),
+              models.Index(fields=['candidate'], name='bench_voter_candidate_idx'),
+              models.Index(fields=['entity'], name='bench_voter_entity_idx')]
+    add, remove = (Voter._meta.indexes, legacy) if composite else (legacy, Voter._meta.indexes)
+    with connection.schema_editor() as editor:
+        for index in remove:
+            editor.remove_index(Voter, index)
+        for index in add:
+            editor.add_index(Voter, index)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--voters', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database', help='مسار ملف القاعدة (افتراضياً ملف مؤقت يحذف بعد القياس)')
+    args = parser.parse_args()
+
+    path = args.database or tempfile.mktemp(suffix='.sqlite3', prefix='voters-bench-')
+    setup_database(path)
+    try:
+        start = time.perf_counter()
+        pillars = populate(args.voters)
+        print(f'أنشئ {args.voters:,} ناخب في {time.perf_counter() - start:.1f} ث')
+
+        queries = dashboard_queries(pillars[len(pillars) // 2])
+        set_indexes(composite=False)
+        before = measure(queries, args.repeat)
+        set_indexes(composite=True)
+        after = measure(queries, args.repeat)
+
+        print(f'{"query":32} {"before ms":>10} {"after ms":>10} {"speedup":>8}')
+        for name, _ in queries:
+            speedup = before[name] / after[name] if after[name] else float('inf')
+            print(f'{name:32} {before[name] * 1000:10.2f} {after[name] * 1000:10.2f} {speedup:7.1f}x')
+    finally:
+        if not args.database and os.path.exists(path):
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
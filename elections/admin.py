@@ -1,6 +1,9 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser, Entity, Candidate, Pillar, Voter, AppearanceSettings
+from django import forms
+from .models import CustomUser, Entity, Candidate, Pillar, Voter, PollingCenter, Station, AppearanceSettings, ImportJob
+from .forms import VoterLocationFields
+from .search import search_filter
 
 # تخصيص إدارة المستخدم
 class CustomUserAdmin(UserAdmin):
@@ -58,10 +61,17 @@ class PillarAdmin(admin.ModelAdmin):
     get_voters_count.short_description = 'عدد الناخبين'
 
 # إدارة الناخب
+class VoterAdminForm(VoterLocationFields, forms.ModelForm):
+    class Meta:
+        model = Voter
+        fields = '__all__'
+
 class VoterAdmin(admin.ModelAdmin):
+    form = VoterAdminForm
     list_display = ('name', 'voter_number', 'governorate', 'district', 'card_status', 'voting_status', 'pillar', 'candidate')
-    list_filter = ('governorate', 'district', 'card_status', 'voting_status', 'candidate', 'pillar')
-    search_fields = ('name', 'voter_number', 'phone_number', 'center_name')
+    list_select_related = ('polling_center', 'pillar__user', 'candidate__user')
+    list_filter = ('polling_center__governorate', 'polling_center__district', 'card_status', 'voting_status', 'candidate', 'pillar')
+    search_fields = ('name', 'voter_number', 'phone_number')
     list_editable = ('card_status', 'voting_status')
     
     fieldsets = (
@@ -78,6 +88,33 @@ class VoterAdmin(admin.ModelAdmin):
             'fields': ('card_status', 'voting_status', 'pillar', 'candidate')
         }),
     )
+    
+    def get_search_results(self, request, queryset, search_term):
+        # البحث في جدول البحث المطبّع بدلاً من LIKE على كل حقل؛ لا يُضاف اسم المركز
+        # بـ OR لأنه يعيد مسح جدول الناخبين كاملاً (البحث بالمركز من صفحة المراكز)
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        return queryset.filter(search_filter(search_term)), False
+
+# إدارة مراكز الاقتراع والمحطات
+class StationInline(admin.TabularInline):
+    model = Station
+    extra = 0
+
+class PollingCenterAdmin(admin.ModelAdmin):
+    list_display = ('name', 'number', 'governorate', 'district', 'sub_district')
+    list_filter = ('governorate', 'district')
+    search_fields = ('name', 'number')
+    inlines = [StationInline]
+
+# متابعة مهام استيراد ملفات الناخبين
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('file', 'user', 'pillar', 'status', 'processed_rows', 'created_rows', 'skipped_rows', 'created_at')
+    list_filter = ('status', 'created_at')
+    list_select_related = ('user', 'pillar__user')
+    readonly_fields = ('total_rows', 'processed_rows', 'created_rows', 'skipped_rows', 'errors', 'message',
+                       'started_at', 'finished_at', 'updated_at')
 
 # تسجيل النماذج
 # إدارة إعدادات المظهر
@@ -110,6 +147,8 @@ admin.site.register(Entity, EntityAdmin)
 admin.site.register(Candidate, CandidateAdmin)
 admin.site.register(Pillar, PillarAdmin)
 admin.site.register(Voter, VoterAdmin)
+admin.site.register(PollingCenter, PollingCenterAdmin)
+admin.site.register(ImportJob, ImportJobAdmin)
 admin.site.register(AppearanceSettings, AppearanceSettingsAdmin)
 
 # تخصيص عناوين لوحة الإدارة
@@ -0,0 +1,77 @@
+"""
+طلبات GET المشروطة (ETag / Last-Modified) للوحات التحكم وصفحات الإحصائيات
+
+وسم الصفحة يُشتق من أرقام إصدارات النطاقات وإصدارات محتواها في الذاكرة المؤقتة
+(انظر stats_cache.py) فلا يحتاج حسابه إلى أي استعلام على الناخبين؛ وإن لم يتغير
+شيء منذ آخر طلب يُرجع 304 دون تنفيذ الاستعلامات أو عرض القالب.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .statistics import user_scope
+from .stats_cache import content_scope, scope_versions
+
+# نطاق إعدادات المظهر: يؤثر على كل الصفحات
+APPEARANCE_SCOPE = ('appearance', 0)
+
+
+def has_pending_messages(request):
+    """رسائل التنبيه تُعرض مرة واحدة، فلا يصح إرجاع نسخة مخزنة والصفحة تحمل رسالة"""
+    storage = getattr(request, '_messages', None)
+    return storage is not None and len(storage) > 0
+
+
+def user_scopes(request, *args, **kwargs):
+    scope = user_scope(request.user)
+    return [scope] if scope else None
+
+
+def admin_scopes(request, *args, **kwargs):
+    return [('admin', 0)]
+
+
+def request_etag(request, versions):
+    user = request.user
+    parts = [
+        request.resolver_match.view_name if request.resolver_match else '',
+        request.get_full_path(),
+        str(user.pk),
+        str(user.updated_at) if user.is_authenticated else '',
+        str(user.last_login) if user.is_authenticated else '',
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+    ] + [f'{scope}:{scope_id}:{version}' for (scope, scope_id), version in sorted(versions.items())]
+    return quote_etag(hashlib.md5('|'.join(parts).encode()).hexdigest())
+
+
+def scope_conditional(scopes_func=user_scopes):
+    """
+    مزخرف للعروض: يحسب ETag وLast-Modified من إصدارات النطاقات التي تعيدها
+    scopes_func، ويرجع 304 إن طابقت ما لدى المتصفح
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or has_pending_messages(request):
+                return view(request, *args, **kwargs)
+            scopes = scopes_func(request, *args, **kwargs)
+            if scopes is None:
+                return view(request, *args, **kwargs)
+            scopes = list(scopes)
+            versions = scope_versions(scopes + [content_scope(scope) for scope in scopes] + [APPEARANCE_SCOPE])
+            etag = request_etag(request, versions)
+            last_modified = max(versions.values()) // 1_000_000_000
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200 and not response.has_header('ETag'):
+                    response['ETag'] = etag
+                    response['Last-Modified'] = http_date(last_modified)
+            # يحفظه المتصفح لكن يتحقق منه مع كل طلب
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,116 @@
+"""
+نشر تغييرات الإحصائيات للوحات التحكم المشتركة في البث المباشر (Server-Sent Events)
+
+الناشر الافتراضي يعمل داخل العملية نفسها (InProcessBroker)، ويمكن استبداله
+عند التشغيل بعدة عمليات بناشر آخر له نفس الواجهة (publish / subscribe /
+unsubscribe) عبر الإعداد ELECTIONS_EVENT_BROKER.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+# أقصى عدد رسائل معلقة لكل مشترك قبل إسقاط الأقدم منها
+SUBSCRIPTION_QUEUE_SIZE = 100
+
+
+def scope_channel(scope, scope_id=0):
+    return f'stats:{scope}:{scope_id or 0}'
+
+
+class Subscription:
+    """اشتراك في قناة؛ الرسائل تُسلم إلى حلقة asyncio الخاصة بالمشترك"""
+
+    def __init__(self, channel, loop):
+        self.channel = channel
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=SUBSCRIPTION_QUEUE_SIZE)
+
+    def deliver(self, message):
+        # يُستدعى من أي خيط، ويُنفذ داخل حلقة المشترك
+        self.loop.call_soon_threadsafe(self._put, message)
+
+    def _put(self, message):
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def drain(self):
+        """سحب كل الرسائل المعلقة دفعة واحدة"""
+        messages = []
+        while not self.queue.empty():
+            messages.append(self.queue.get_nowait())
+        return messages
+
+
+class InProcessBroker:
+    """ناشر أحداث داخل العملية: يكفي لعملية خادم واحدة"""
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        subscription = Subscription(channel, asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.channel]
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.deliver(message)
+
+    def subscriber_count(self, channel):
+        with self._lock:
+            return len(self._subscriptions.get(channel, ()))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                broker_class = getattr(settings, 'ELECTIONS_EVENT_BROKER', 'elections.events.InProcessBroker')
+                _broker = import_string(broker_class)()
+    return _broker
+
+
+def publish_changes(changes):
+    """
+    نشر تغييرات النطاقات بعد اعتماد المعاملة
+    changes: {(النطاق، المعرف): {الحقل: مقدار التغير}}
+    """
+    changes = {key: dict(fields) for key, fields in changes.items() if key[1] is not None}
+    if not changes:
+        return
+
+    def publish():
+        broker = get_broker()
+        for (scope, scope_id), fields in changes.items():
+            broker.publish(scope_channel(scope, scope_id), {
+                'scope': scope,
+                'scope_id': scope_id,
+                'changes': fields,
+            })
+
+    transaction.on_commit(publish)
@@ -0,0 +1,132 @@
+"""
+تصدير قوائم الناخبين إلى CSV أو Excel كاستجابة متدفقة
+
+الصفوف تُقرأ بـ values_list و iterator على دفعات فلا تُنشأ كائنات Voter ولا تُحمّل
+القائمة كاملة في الذاكرة؛ ملف CSV يبدأ وصوله من أول دفعة، وملف Excel يُكتب
+بوضع write_only (الصفوف في ملف مؤقت على القرص) ثم يُرسل على أجزاء.
+"""
+import csv
+import io
+import tempfile
+
+import openpyxl
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import Voter
+
+# عدد الصفوف المقروءة من قاعدة البيانات في كل دفعة
+CHUNK_SIZE = 2000
+# حجم أجزاء ملف Excel المرسلة
+FILE_CHUNK_SIZE = 64 * 1024
+
+# (عنوان العمود، مسار الحقل)
+VOTER_COLUMNS = [
+    ('رقم الناخب', 'voter_number'),
+    ('الاسم', 'name'),
+    ('رقم الهاتف', 'phone_number'),
+    ('المحافظة', 'polling_center__governorate'),
+    ('المنطقة', 'polling_center__district'),
+    ('الناحية', 'polling_center__sub_district'),
+    ('اسم المركز', 'polling_center__name'),
+    ('رقم المركز', 'polling_center__number'),
+    ('المحطة', 'polling_station__number'),
+    ('حالة البطاقة', 'card_status'),
+    ('حالة التصويت', 'voting_status'),
+]
+
+# أعمدة الانتماء الإضافية حسب نطاق المستخدم
+SCOPE_COLUMNS = {
+    'admin': [('الكيان', 'entity__entity_name'), ('المرشح', 'candidate__user__full_name'),
+              ('الركيزة', 'pillar__user__full_name')],
+    'entity': [('المرشح', 'candidate__user__full_name'), ('الركيزة', 'pillar__user__full_name')],
+    'candidate': [('الركيزة', 'pillar__user__full_name')],
+    'pillar': [],
+}
+
+# قيم الاختيارات تُكتب بتسمياتها العربية
+CHOICE_LABELS = {
+    'card_status': dict(Voter.CARD_STATUS_CHOICES),
+    'voting_status': dict(Voter.VOTING_STATUS_CHOICES),
+}
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def export_columns(scope):
+    return VOTER_COLUMNS + SCOPE_COLUMNS[scope]
+
+
+def voter_rows(voters, columns, ordering=('id',)):
+    """صفوف الناخبين كقيم جاهزة للكتابة، مقروءة على دفعات"""
+    paths = [path for _, path in columns]
+    labels = [CHOICE_LABELS.get(path) for path in paths]
+    rows = voters.order_by(*ordering).values_list(*paths).iterator(chunk_size=CHUNK_SIZE)
+    for row in rows:
+        yield [label.get(value, value) if label else ('' if value is None else value)
+               for label, value in zip(labels, row)]
+
+
+def csv_chunks(rows, headers):
+    """ملف CSV على أجزاء (دفعة صفوف لكل جزء) يبدأ بعلامة BOM ليقرأه Excel بالعربية"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(headers)
+    # العناوين تُرسل فوراً قبل انتظار أول دفعة من قاعدة البيانات
+    yield buffer.getvalue().encode('utf-8')
+    buffer.seek(0)
+    buffer.truncate()
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count % CHUNK_SIZE == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def xlsx_chunks(rows, headers, title='الناخبون'):
+    """ملف Excel بوضع write_only في ملف مؤقت، ثم إرساله على أجزاء"""
+    with tempfile.TemporaryFile() as output:
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet(title)
+        sheet.sheet_view.rightToLeft = True
+        sheet.append(headers)
+        for row in rows:
+            sheet.append(row)
+        workbook.save(output)
+        output.seek(0)
+        while chunk := output.read(FILE_CHUNK_SIZE):
+            yield chunk
+
+
+async def _async_chunks(chunks):
+    # مع ASGI يجمع Django المكرر المتزامن كاملاً في الذاكرة قبل إرساله، فتُقرأ الأجزاء
+    # واحداً واحداً في خيط قاعدة البيانات نفسه
+    done = object()
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    while (chunk := await next_chunk(chunks, done)) is not done:
+        yield chunk
+
+
+def export_response(request, voters, scope, export_format, name, ordering=('id',)):
+    """استجابة متدفقة لتصدير ناخبين (voters مصفاة مسبقاً) بصيغة csv أو xlsx"""
+    columns = export_columns(scope)
+    headers = [header for header, _ in columns]
+    rows = voter_rows(voters, columns, ordering)
+    chunks = csv_chunks(rows, headers) if export_format == 'csv' else xlsx_chunks(rows, headers)
+    if isinstance(request, ASGIRequest):
+        chunks = _async_chunks(chunks)
+    response = StreamingHttpResponse(chunks, content_type=EXPORT_FORMATS[export_format])
+    filename = f'{name}-{timezone.localdate():%Y%m%d}.{export_format}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,7 +1,9 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import authenticate
-from .models import CustomUser, Voter, Pillar, Candidate, Entity
+from .models import CustomUser, Voter, Pillar, Candidate, Entity, ImportJob
+from .locations import LOCATION_FIELDS
+from . import readers
 
 # نموذج تسجيل الدخول
 class LoginForm(forms.Form):
@@ -23,8 +25,37 @@ class LoginForm(forms.Form):
         label='كلمة المرور'
     )
 
+# حقول موقع الناخب: تُكتب كنصوص وتُحوَّل عند الحفظ إلى معرفي المركز والمحطة
+class VoterLocationFields(forms.Form):
+    governorate = forms.CharField(max_length=100, label='المحافظة *',
+                                  widget=forms.TextInput(attrs={'class': 'form-control', 'dir': 'rtl', 'required': True}))
+    district = forms.CharField(max_length=100, label='المنطقة *',
+                               widget=forms.TextInput(attrs={'class': 'form-control', 'dir': 'rtl', 'required': True}))
+    sub_district = forms.CharField(max_length=100, required=False, label='الناحية',
+                                   widget=forms.TextInput(attrs={'class': 'form-control', 'dir': 'rtl'}))
+    center_name = forms.CharField(max_length=200, label='اسم المركز *',
+                                  widget=forms.TextInput(attrs={'class': 'form-control', 'dir': 'rtl', 'required': True}))
+    center_number = forms.CharField(max_length=50, label='رقم المركز *',
+                                    widget=forms.TextInput(attrs={'class': 'form-control', 'dir': 'rtl', 'required': True}))
+    station = forms.CharField(max_length=100, label='المحطة *',
+                              widget=forms.TextInput(attrs={'class': 'form-control', 'dir': 'rtl', 'required': True}))
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # عرض موقع الناخب الحالي عند التعديل
+        instance = getattr(self, 'instance', None)
+        if instance is not None and instance.polling_center_id is not None:
+            for name in LOCATION_FIELDS:
+                self.initial.setdefault(name, getattr(instance, name))
+    
+    def _post_clean(self):
+        for name in LOCATION_FIELDS:
+            if name in self.cleaned_data:
+                setattr(self.instance, name, self.cleaned_data[name])
+        super()._post_clean()
+
 # نموذج إضافة ناخب
-class VoterForm(forms.ModelForm):
+class VoterForm(VoterLocationFields, forms.ModelForm):
     class Meta:
         model = Voter
         fields = [
@@ -35,28 +66,16 @@ class VoterForm(forms.ModelForm):
         widgets = {
             'voter_number': forms.TextInput(attrs={'class': 'form-control', 'dir': 'rtl', 'required': True}),
             'name': forms.TextInput(attrs={'class': 'form-control', 'dir': 'rtl', 'required': True}),
-            'governorate': forms.TextInput(attrs={'class': 'form-control', 'dir': 'rtl', 'required': True}),
-            'district': forms.TextInput(attrs={'class': 'form-control', 'dir': 'rtl', 'required': True}),
-            'sub_district': forms.TextInput(attrs={'class': 'form-control', 'dir': 'rtl'}),
             'card_status': forms.Select(attrs={'class': 'form-select', 'dir': 'rtl', 'required': True}, choices=[
                 ('updated', 'محدث'),
                 ('not_updated', 'غير محدث')
             ]),
-            'center_name': forms.TextInput(attrs={'class': 'form-control', 'dir': 'rtl', 'required': True}),
-            'center_number': forms.TextInput(attrs={'class': 'form-control', 'dir': 'rtl', 'required': True}),
-            'station': forms.TextInput(attrs={'class': 'form-control', 'dir': 'rtl', 'required': True}),
             'phone_number': forms.TextInput(attrs={'class': 'form-control', 'dir': 'rtl', 'required': True}),
         }
         labels = {
             'voter_number': 'رقم الناخب *',
             'name': 'الاسم *',
-            'governorate': 'المحافظة *',
-            'district': 'المنطقة *',
-            'sub_district': 'الناحية',
             'card_status': 'حالة البطاقة *',
-            'center_name': 'اسم المركز *',
-            'center_number': 'رقم المركز *',
-            'station': 'المحطة *',
             'phone_number': 'رقم الهاتف *',
         }
     
@@ -75,7 +94,7 @@ class VoterForm(forms.ModelForm):
          ]
 
 # نموذج إضافة ناخب للمرشح
-class VoterCandidateForm(forms.ModelForm):
+class VoterCandidateForm(VoterLocationFields, forms.ModelForm):
     pillar = forms.ModelChoiceField(
         queryset=None,
         required=True,
@@ -94,25 +113,13 @@ class VoterCandidateForm(forms.ModelForm):
         widgets = {
             'voter_number': forms.TextInput(attrs={'class': 'form-control', 'dir': 'rtl', 'required': True}),
             'name': forms.TextInput(attrs={'class': 'form-control', 'dir': 'rtl', 'required': True}),
-            'governorate': forms.TextInput(attrs={'class': 'form-control', 'dir': 'rtl', 'required': True}),
-            'district': forms.TextInput(attrs={'class': 'form-control', 'dir': 'rtl', 'required': True}),
-            'sub_district': forms.TextInput(attrs={'class': 'form-control', 'dir': 'rtl'}),
             'card_status': forms.Select(attrs={'class': 'form-select', 'dir': 'rtl', 'required': True}),
-            'center_name': forms.TextInput(attrs={'class': 'form-control', 'dir': 'rtl', 'required': True}),
-            'center_number': forms.TextInput(attrs={'class': 'form-control', 'dir': 'rtl', 'required': True}),
-            'station': forms.TextInput(attrs={'class': 'form-control', 'dir': 'rtl', 'required': True}),
             'phone_number': forms.TextInput(attrs={'class': 'form-control', 'dir': 'rtl', 'required': True}),
         }
         labels = {
             'voter_number': 'رقم الناخب *',
             'name': 'الاسم *',
-            'governorate': 'المحافظة *',
-            'district': 'المنطقة *',
-            'sub_district': 'الناحية',
             'card_status': 'حالة البطاقة *',
-            'center_name': 'اسم المركز *',
-            'center_number': 'رقم المركز *',
-            'station': 'المحطة *',
             'phone_number': 'رقم الهاتف *',
         }
     
@@ -312,14 +319,23 @@ class ExcelUploadForm(forms.Form):
     excel_file = forms.FileField(
         widget=forms.FileInput(attrs={
             'class': 'form-control',
-            'accept': '.xlsx,.xls'
+            'accept': '.xlsx,.xls,.csv'
         }),
-        label='ملف Excel'
+        label='ملف Excel أو CSV'
     )
     pillar = forms.ModelChoiceField(
         queryset=Pillar.objects.none(),
         widget=forms.Select(attrs={'class': 'form-select', 'dir': 'rtl'}),
         label='الركيزة المسؤولة',
+        empty_label='اختر الركيزة',
+        error_messages={'required': 'يرجى اختيار الركيزة المسؤولة عن الناخبين'}
+    )
+    mode = forms.ChoiceField(
+        choices=ImportJob.MODE_CHOICES,
+        initial='create',
+        widget=forms.Select(attrs={'class': 'form-select', 'dir': 'rtl'}),
+        label='طريقة الاستيراد',
+        help_text='عند التحديث يُعدَّل ناخبو المرشح الموجودون برقم الناخب ويبقون في ركائزهم',
         required=False
     )
     
@@ -327,10 +343,24 @@ class ExcelUploadForm(forms.Form):
         super().__init__(*args, **kwargs)
         if user.user_type == 'candidate':
             candidate = Candidate.objects.get(user=user)
-            self.fields['pillar'].queryset = candidate.pillars.all()
+            self.fields['pillar'].queryset = candidate.pillars.select_related('user')
         elif user.user_type == 'entity':
             entity = Entity.objects.get(user=user)
-            self.fields['pillar'].queryset = Pillar.objects.filter(candidate__entity=entity)
+            self.fields['pillar'].queryset = Pillar.objects.filter(candidate__entity=entity).select_related('user')
+        self.fields['excel_file'].widget.attrs['accept'] = ','.join(readers.upload_extensions())
+
+    def clean_excel_file(self):
+        # ملف xls بلا xlrd يُرفض عند الرفع بدل أن تفشل مهمة الاستيراد لاحقاً
+        excel_file = self.cleaned_data['excel_file']
+        name = excel_file.name.lower()
+        if name.endswith('.xls') and readers.xlrd is None:
+            raise forms.ValidationError(readers.XLRD_REQUIRED)
+        if not name.endswith(readers.upload_extensions()):
+            raise forms.ValidationError('يجب أن يكون الملف من نوع Excel أو CSV')
+        return excel_file
+    
+    def clean_mode(self):
+        return self.cleaned_data['mode'] or 'create'
 
 
 class EditEntityForm(forms.ModelForm):
@@ -0,0 +1,374 @@
+"""
+استيراد الناخبين من ملف Excel أو CSV على دفعات
+
+الملف يُقرأ صفاً صفاً (readers.py) فلا يُحمّل كاملاً في الذاكرة، وتُربط أعمدته
+بحقول الناخب حسب عناوين الصف الأول (عناوين ملف التصدير مقبولة فيُعاد استيراده
+كما هو). كل CHUNK_SIZE صف صالح تُدرج بـ bulk_create في معاملة واحدة مع
+تحديث الإحصائيات المجمعة وجدول البحث، بدلاً من معاملة وحفظ لكل صف.
+
+التحقق من قيم الصفوف لا يحتاج قاعدة البيانات، فيمكن توزيعه على عمليات منفصلة
+(ELECTIONS_IMPORT_PROCESSES)، بينما تبقى القراءة وكشف المكرر والكتابة في عملية
+واحدة.
+
+bulk_create لا يستدعي save() ولا إشارات الحفظ، لذلك يُضبط هنا ما يضبطانه: المرشح
+والكيان من الركيزة، معرفا المركز والمحطة، والهاتف المعكوس. الملف لا يحمل وقت
+التصويت، فالمصوتون المستوردون يبقون بلا وقت (يُعدّون في منحنى المشاركة كمصوتين
+بلا وقت) بدلاً من تسجيلهم جميعاً في فترة الاستيراد.
+"""
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from . import rollups, search
+from .locations import LOCATION_FIELDS, LocationLookup, clean_value
+from .models import Voter
+from .processes import process_pool
+from .readers import read_rows
+
+# عدد الصفوف المدرجة في كل معاملة
+CHUNK_SIZE = 2000
+# أقصى عدد لرسائل الأخطاء المعادة (العدد الكلي يُحسب دائماً)
+MAX_ERRORS = 100
+
+# حقل الناخب: العناوين المقبولة له في الصف الأول
+IMPORT_COLUMNS = {
+    'voter_number': ('رقم الناخب', 'voter_number'),
+    'name': ('الاسم', 'الاسم الكامل', 'name'),
+    'phone_number': ('رقم الهاتف', 'الهاتف', 'phone_number', 'phone'),
+    'governorate': ('المحافظة', 'governorate'),
+    'district': ('المنطقة', 'القضاء', 'district'),
+    'sub_district': ('الناحية', 'sub_district'),
+    'center_name': ('اسم المركز', 'المركز', 'center_name'),
+    'center_number': ('رقم المركز', 'center_number'),
+    'station': ('المحطة', 'رقم المحطة', 'station'),
+    'card_status': ('حالة البطاقة', 'card_status'),
+    'voting_status': ('حالة التصويت', 'voting_status'),
+}
+REQUIRED_COLUMNS = ('voter_number', 'name', 'center_number')
+
+# قيم الاختيارات مقبولة برموزها أو بتسمياتها العربية
+CHOICE_VALUES = {
+    'card_status': {**{code: code for code, _ in Voter.CARD_STATUS_CHOICES},
+                    **{label: code for code, label in Voter.CARD_STATUS_CHOICES}},
+    'voting_status': {**{code: code for code, _ in Voter.VOTING_STATUS_CHOICES},
+                      **{label: code for code, label in Voter.VOTING_STATUS_CHOICES}},
+}
+# الحقول التي يكتبها التحديث، والحقول المقارنة لمعرفة تغير الناخب (مع لقطة الإحصائيات)
+UPDATE_FIELDS = ['name', 'phone_number', 'phone_reversed', 'card_status', 'voting_status', 'voted_at',
+                 'polling_center', 'polling_station']
+COMPARED_FIELDS = ['name', 'phone_number', 'phone_reversed', 'card_status', 'voting_status', 'voted_at',
+                   'polling_center_id', 'polling_station_id', 'pillar_id', 'candidate_id', 'entity_id']
+MAX_LENGTHS = {field: Voter._meta.get_field(field).max_length for field in ('voter_number', 'name', 'phone_number')}
+
+
+def _header_key(value):
+    return clean_value(value).lower()
+
+
+_HEADERS = {_header_key(header): field for field, headers in IMPORT_COLUMNS.items() for header in headers}
+
+
+def map_columns(header):
+    """ربط حقول الناخب بأرقام أعمدة الصف الأول؛ ValueError إن نقص عمود مطلوب"""
+    mapping = {}
+    for index, value in enumerate(header):
+        field = _HEADERS.get(_header_key(value))
+        if field and field not in mapping:
+            mapping[field] = index
+    missing = [IMPORT_COLUMNS[field][0] for field in REQUIRED_COLUMNS if field not in mapping]
+    if missing:
+        raise ValueError(f'أعمدة مطلوبة غير موجودة في الصف الأول: {"، ".join(missing)}')
+    return mapping
+
+
+def cell_text(value):
+    """نص الخلية؛ الأرقام الصحيحة المخزنة كأعداد عشرية (123.0) تُكتب دون كسر"""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return clean_value(value)
+
+
+def clean_row(values):
+    """التحقق من قيم صف وإرجاعها جاهزة؛ ValueError برسالة الخطأ"""
+    data = {field: cell_text(values.get(field)) for field in IMPORT_COLUMNS}
+    for field in REQUIRED_COLUMNS:
+        if not data[field]:
+            raise ValueError(f'{IMPORT_COLUMNS[field][0]} فارغ')
+    # الهاتف المكتوب كرقم في Excel يفقد الصفر الأول
+    if isinstance(values.get('phone_number'), (int, float)) and not data['phone_number'].startswith('0'):
+        data['phone_number'] = '0' + data['phone_number']
+    for field, max_length in MAX_LENGTHS.items():
+        if len(data[field]) > max_length:
+            raise ValueError(f'{IMPORT_COLUMNS[field][0]} أطول من {max_length} حرفاً')
+    for field, choices in CHOICE_VALUES.items():
+        value = data[field]
+        if not value:
+            data[field] = Voter._meta.get_field(field).default
+        elif value in choices:
+            data[field] = choices[value]
+        else:
+            raise ValueError(f'{IMPORT_COLUMNS[field][0]} غير معروفة: {value}')
+    return data
+
+
+def read_file(file, file_format=None):
+    """صفوف بيانات الملف (رقم الصف، قيم الأعمدة المربوطة)، أياً كانت صيغته"""
+    rows = read_rows(file, file_format)
+    mapping = map_columns(next(rows, None) or ())
+    for row_num, row in enumerate(rows, start=2):
+        if all(value is None or value == '' for value in row):
+            continue
+        yield row_num, {field: row[index] if index < len(row) else None for field, index in mapping.items()}
+
+
+def validate_chunk(rows):
+    """
+    التحقق من دفعة صفوف (رقم الصف، القيم) دون قاعدة البيانات، فيمكن تنفيذه في
+    عملية منفصلة؛ يعيد (رقم الصف، القيم المنظفة أو None، رسالة الخطأ أو None) بالترتيب
+    """
+    results = []
+    for row_num, values in rows:
+        try:
+            results.append((row_num, clean_row(values), None))
+        except ValueError as e:
+            results.append((row_num, None, str(e)))
+    return results
+
+
+def chunked(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_processes():
+    return getattr(settings, 'ELECTIONS_IMPORT_PROCESSES', 1)
+
+
+def validate_chunks(chunks, workers=1):
+    """
+    نتائج التحقق من الدفعات بترتيب قراءتها. مع أكثر من عامل يُوزَّع التحقق على
+    مجموعة عمليات بينما تبقى القراءة والكتابة في عملية واحدة (كاتب واحد كما
+    تتطلب SQLite)، ولا يُعلَّق أكثر من دفعتين لكل عامل حتى تبقى الذاكرة محدودة
+    """
+    if workers <= 1:
+        yield from map(validate_chunk, chunks)
+        return
+    pool = process_pool(workers)
+    try:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(validate_chunk, chunk))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+class VoterImporter:
+    """
+    إدراج صفوف ناخبين في ركيزة على دفعات، مع عدّ الصفوف والأخطاء
+
+    بوضع 'upsert' تُحمّل أرقام ناخبي المرشح ومعرفاتهم مرة واحدة، فتُقسم الصفوف إلى
+    إضافة وتحديث دون استعلام لكل صف؛ الناخب المحدَّث يبقى في ركيزته، وتُكتب فقط
+    الصفوف التي تغيرت قيمها. رقم ناخب مسجل لدى مرشح آخر يُعد تعارضاً ولا يُعدَّل.
+    """
+
+    def __init__(self, pillar, chunk_size=CHUNK_SIZE, progress=None, mode='create', workers=None):
+        self.pillar = pillar
+        self.candidate_id = pillar.candidate_id
+        self.entity_id = pillar.candidate.entity_id
+        self.chunk_size = chunk_size
+        # عدد عمليات التحقق (1 = في العملية نفسها)
+        self.workers = import_processes() if workers is None else workers
+        # تُستدعى بالمستورد بعد كل دفعة (حفظ تقدم مهمة الاستيراد)
+        self.progress = progress
+        self.mode = mode
+        self.keys = None
+        if mode == 'upsert':
+            self.keys = dict(Voter.objects.filter(candidate_id=self.candidate_id).values_list('voter_number', 'id'))
+        self.lookup = LocationLookup().preload()
+        self.seen = set()
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.conflicts = 0
+        self.error_count = 0
+        self.errors = []
+        self.seconds = 0.0
+
+    def error(self, row_num, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(f'الصف {row_num}: {message}')
+
+    def conflict(self, row_num, voter_number):
+        self.conflicts += 1
+        self.error(row_num, f'رقم الناخب {voter_number} مسجل لدى مرشح آخر')
+
+    def accept(self, row_num, data, message):
+        """نتيجة التحقق من صف: قيمه إن كان صالحاً وغير مكرر في الملف، أو None مع تسجيل الخطأ"""
+        if message is not None:
+            self.error(row_num, message)
+            return None
+        if data['voter_number'] in self.seen:
+            self.error(row_num, f'رقم الناخب {data["voter_number"]} مكرر في الملف')
+            return None
+        self.seen.add(data['voter_number'])
+        return data
+
+    def voter(self, data, current=None):
+        """
+        ناخب غير محفوظ بالقيم التي يضبطها save() عادة؛ current قيم الناخب المحفوظ
+        عند التحديث (ركيزته ووقت تصويته يبقيان، ولا وقت لمن صوت حسب الملف فقط)
+        """
+        voter = Voter(
+            voter_number=data['voter_number'], name=data['name'], phone_number=data['phone_number'],
+            card_status=data['card_status'], voting_status=data['voting_status'],
+            pillar=self.pillar, candidate_id=self.candidate_id, entity_id=self.entity_id,
+        )
+        if current is not None:
+            voter.pk = current['id']
+            voter.pillar_id = current['pillar_id']
+            voter.voted_at = current['voted_at']
+        voter.polling_center_id, voter.polling_station_id = self.lookup.resolve(
+            **{field: data[field] for field in LOCATION_FIELDS})
+        voter.assign_phone()
+        if voter.voting_status != 'voted':
+            voter.voted_at = None
+        return voter
+
+    def write(self, batch):
+        """
+        كتابة دفعة (رقم الصف، القيم) في معاملة واحدة مع الإحصائيات وجدول البحث؛
+        المراكز والمحطات الجديدة تُنشأ في المعاملة نفسها
+        """
+        if not batch:
+            return
+        updates, inserts = [], []
+        for row_num, data in batch:
+            if self.keys is not None and data['voter_number'] in self.keys:
+                updates.append((row_num, data))
+            else:
+                inserts.append((row_num, data))
+        existing = set(Voter.objects.filter(voter_number__in=[data['voter_number'] for _, data in inserts])
+                       .values_list('voter_number', flat=True))
+        rows = []
+        for row_num, data in inserts:
+            if data['voter_number'] not in existing:
+                rows.append((row_num, data))
+            elif self.keys is None:
+                self.error(row_num, f'رقم الناخب {data["voter_number"]} موجود مسبقاً')
+            else:
+                self.conflict(row_num, data['voter_number'])
+        if not rows and not updates:
+            return
+        try:
+            with transaction.atomic():
+                voters = [self.voter(data) for _, data in rows]
+                Voter.objects.bulk_create(voters)
+                changes = [(None, rollups.voter_snapshot(voter)) for voter in voters]
+                updated = self.update(updates, changes)
+                rollups.record_voters_changed(changes)
+                search.index_voters(voters + updated)
+        except IntegrityError as e:
+            # معرفات المراكز المنشأة في المعاملة الملغاة لم تعد صالحة
+            self.lookup = LocationLookup().preload()
+            for row_num, _ in rows + updates:
+                self.error(row_num, f'تعذر الحفظ: {e}')
+            return
+        self.created += len(voters)
+        self.updated += len(updated)
+
+    def update(self, updates, changes):
+        """
+        تحديث ناخبي المرشح الموجودين بقيم الملف إن تغيرت، بجملة INSERT ... ON CONFLICT
+        واحدة؛ يضيف (القديم، الجديد) إلى changes ويعيد الناخبين المحدَّثين
+        """
+        if not updates:
+            return []
+        ids = [self.keys[data['voter_number']] for _, data in updates]
+        current = {row['id']: row for row in Voter.objects.filter(pk__in=ids).values('id', *COMPARED_FIELDS)}
+        updated = []
+        for row_num, data in updates:
+            old = current.get(self.keys[data['voter_number']])
+            # حُذف الناخب أو نُقل لمرشح آخر بعد تحميل المفاتيح
+            if old is None or old['candidate_id'] != self.candidate_id:
+                self.conflict(row_num, data['voter_number'])
+                continue
+            voter = self.voter(data, old)
+            if all(getattr(voter, field) == old[field] for field in COMPARED_FIELDS):
+                self.unchanged += 1
+                continue
+            changes.append(({field: old[field] for field in rollups.SNAPSHOT_FIELDS}, rollups.voter_snapshot(voter)))
+            updated.append(voter)
+        if updated:
+            # بلا معرف حتى يكون التعارض على رقم الناخب وحده، ثم تُعاد المعرفات للفهرسة
+            pks = [voter.pk for voter in updated]
+            for voter in updated:
+                voter.pk = None
+            Voter.objects.bulk_create(updated, update_conflicts=True, unique_fields=['voter_number'],
+                                      update_fields=UPDATE_FIELDS)
+            for voter, pk in zip(updated, pks):
+                voter.pk = pk
+        return updated
+
+    def run(self, rows):
+        """
+        استيراد صفوف (رقم الصف، القيم) وإرجاع ملخص النتيجة؛ كل chunk_size صف مقروء
+        (صالحة أو لا) يُتحقق منها معاً ثم تُكتب كدفعة واحدة فيتقدم العداد بانتظام
+        """
+        start = time.perf_counter()
+        for results in validate_chunks(chunked(rows, self.chunk_size), self.workers):
+            self.rows += len(results)
+            batch = []
+            for row_num, data, message in results:
+                data = self.accept(row_num, data, message)
+                if data is not None:
+                    batch.append((row_num, data))
+            self.write(batch)
+            if self.progress:
+                self.progress(self)
+        self.seconds = time.perf_counter() - start
+        return self.result()
+
+    def result(self):
+        return {
+            'mode': self.mode,
+            'rows': self.rows,
+            'created': self.created,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'conflicts': self.conflicts,
+            'skipped': self.error_count,
+            'errors': self.errors,
+            'seconds': round(self.seconds, 2),
+            'rows_per_second': round(self.rows / self.seconds) if self.seconds else 0,
+        }
+
+
+def result_message(result):
+    """ملخص نتيجة الاستيراد للمستخدم"""
+    message = f'تم إضافة {result["created"]} ناخب'
+    if result['mode'] == 'upsert':
+        message += f' وتحديث {result["updated"]} (دون تغيير {result["unchanged"]})'
+    message += (f' من {result["rows"]} صف خلال {result["seconds"]} ثانية '
+                f'({result["rows_per_second"]} صف/ثانية)')
+    if result['conflicts']:
+        message += f'، {result["conflicts"]} رقم مسجل لدى مرشح آخر'
+    return message
+
+
+def import_voters(file, pillar, chunk_size=CHUNK_SIZE, mode='create', workers=None):
+    """استيراد ملف مفتوح (xlsx أو xls أو csv) إلى ركيزة"""
+    return VoterImporter(pillar, chunk_size, mode=mode, workers=workers).run(read_file(file))
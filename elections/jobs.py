@@ -0,0 +1,117 @@
+"""
+تنفيذ مهام استيراد الناخبين (ImportJob) خارج طلب HTTP
+
+الرفع يحفظ الملف ومهمة "في الانتظار" ويعيد معرفها فوراً، ثم تُنفذ المهمة إما في
+مجموعة خيوط داخل عملية الخادم نفسها (الافتراضي) أو بالأمر run_import_worker في
+عملية مستقلة عند ضبط ELECTIONS_IMPORT_IN_PROCESS = False. تُحجز المهمة بتحديث
+شرطي لحالتها فلا ينفذها عاملان معاً، ويُحفظ تقدمها بعد كل دفعة لتعرضه صفحة الرفع.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .imports import VoterImporter, read_file, result_message
+from .models import ImportJob
+from .readers import count_rows, sniff_format
+
+# المهام "قيد التنفيذ" التي لم يُحفظ تقدمها منذ هذه المدة تُعاد للانتظار (توقف عاملها)
+STALE_AFTER = timedelta(minutes=10)
+PROGRESS_FIELDS = ['processed_rows', 'created_rows', 'updated_rows', 'conflict_rows', 'skipped_rows', 'errors',
+                   'updated_at']
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def in_process():
+    return getattr(settings, 'ELECTIONS_IMPORT_IN_PROCESS', True)
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'ELECTIONS_IMPORT_WORKERS', 1),
+                    thread_name_prefix='voter-import')
+    return _executor
+
+
+def claim_job(job_id):
+    """حجز مهمة في الانتظار للتنفيذ؛ None إن حجزها عامل آخر"""
+    claimed = ImportJob.objects.filter(pk=job_id, status='pending').update(
+        status='running', started_at=timezone.now(), updated_at=timezone.now())
+    return ImportJob.objects.select_related('pillar__candidate').get(pk=job_id) if claimed else None
+
+
+def claim_next_job():
+    """حجز أقدم مهمة في الانتظار"""
+    for job_id in ImportJob.objects.filter(status='pending').order_by('created_at').values_list('pk', flat=True):
+        job = claim_job(job_id)
+        if job is not None:
+            return job
+    return None
+
+
+def requeue_stale_jobs():
+    """
+    إعادة المهام المتوقفة للانتظار؛ الصفوف التي أُدرجت قبل التوقف تظهر عند إعادة
+    التنفيذ كأرقام ناخبين موجودة مسبقاً (أو دون تغيير بوضع التحديث)
+    """
+    return ImportJob.objects.filter(status='running', updated_at__lt=timezone.now() - STALE_AFTER).update(
+        status='pending', started_at=None)
+
+
+def save_progress(job, importer):
+    job.processed_rows = importer.rows
+    job.created_rows = importer.created
+    job.updated_rows = importer.updated
+    job.conflict_rows = importer.conflicts
+    job.skipped_rows = importer.error_count
+    job.errors = importer.errors
+    job.save(update_fields=PROGRESS_FIELDS)
+
+
+def run_job(job):
+    """تنفيذ مهمة محجوزة حتى نهايتها وحفظ نتيجتها"""
+    try:
+        with job.file.open('rb') as file:
+            file_format = sniff_format(file)
+            job.total_rows = count_rows(file, file_format)
+            job.save(update_fields=['total_rows', 'updated_at'])
+            importer = VoterImporter(job.pillar, progress=lambda importer: save_progress(job, importer),
+                                     mode=job.mode)
+            result = importer.run(read_file(file, file_format))
+    except Exception as e:
+        job.status = 'failed'
+        job.message = str(e) if isinstance(e, ValueError) else f'خطأ في معالجة الملف: {e}'
+    else:
+        save_progress(job, importer)
+        job.status = 'done'
+        job.message = result_message(result)
+    job.finished_at = timezone.now()
+    job.save()
+    # الملف المرفوع لم يعد لازماً بعد انتهاء المهمة
+    job.file.delete(save=False)
+    return job
+
+
+def _run_in_thread(job_id):
+    close_old_connections()
+    try:
+        job = claim_job(job_id)
+        if job is not None:
+            run_job(job)
+    finally:
+        connection.close()
+
+
+def submit_job(job):
+    """تنفيذ المهمة في الخلفية بعد اعتماد معاملة إنشائها (أو تركها لعامل run_import_worker)"""
+    if in_process():
+        transaction.on_commit(lambda: get_executor().submit(_run_in_thread, job.pk))
@@ -0,0 +1,52 @@
+"""
+تحويل أسماء مراكز الاقتراع ومحطاتها إلى معرفات جداول الأبعاد (PollingCenter / Station)
+
+LocationLookup يحفظ ما حوّله في الذاكرة، فيمر الاستيراد الكبير بقاعدة البيانات
+مرة واحدة لكل مركز أو محطة بدلاً من مرة لكل صف. يُنشأ كائن جديد لكل طلب أو
+عملية استيراد حتى لا تبقى في الذاكرة معرفات صفوف أُلغيت معاملتها.
+"""
+from .models import PollingCenter, Station
+
+# حقول الموقع التي يكتبها المستخدم أو ملف Excel كنصوص
+LOCATION_FIELDS = ('governorate', 'district', 'sub_district', 'center_name', 'center_number', 'station')
+
+
+def clean_value(value):
+    return '' if value is None else str(value).strip()
+
+
+class LocationLookup:
+    """ذاكرة تحويل (المركز، المحطة) من النصوص إلى المعرفات"""
+
+    def __init__(self):
+        self.centers = {}
+        self.stations = {}
+
+    def preload(self):
+        """تحميل كل المراكز والمحطات الموجودة دفعة واحدة (قبل استيراد ملف كبير)"""
+        for pk, *key in PollingCenter.objects.values_list(
+                'pk', 'number', 'name', 'governorate', 'district', 'sub_district'):
+            self.centers[tuple(key)] = pk
+        for pk, center_id, number in Station.objects.values_list('pk', 'center_id', 'number'):
+            self.stations[(center_id, number)] = pk
+        return self
+
+    def center_id(self, number, name, governorate, district, sub_district=''):
+        key = tuple(clean_value(v) for v in (number, name, governorate, district, sub_district))
+        if key not in self.centers:
+            center, _ = PollingCenter.objects.get_or_create(
+                number=key[0], name=key[1], governorate=key[2], district=key[3], sub_district=key[4])
+            self.centers[key] = center.pk
+        return self.centers[key]
+
+    def station_id(self, center_id, number):
+        key = (center_id, clean_value(number))
+        if key not in self.stations:
+            station, _ = Station.objects.get_or_create(center_id=center_id, number=key[1])
+            self.stations[key] = station.pk
+        return self.stations[key]
+
+    def resolve(self, governorate='', district='', sub_district='', center_name='', center_number='', station=''):
+        """إرجاع (معرف المركز، معرف المحطة)، مع إنشائهما إن لم يوجدا"""
+        center_id = self.center_id(center_number, center_name, governorate, district, sub_district)
+        return center_id, self.station_id(center_id, station)
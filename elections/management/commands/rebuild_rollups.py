@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from elections.rollups import check_rollups, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'إعادة بناء جداول إحصائيات الناخبين المجمعة أو التحقق من تطابقها مع بيانات الناخبين'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='التحقق فقط من تطابق الإحصائيات المخزنة دون إعادة بنائها',
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            mismatches = check_rollups()
+            for scope, scope_id, field, stored, expected in mismatches:
+                self.stdout.write(f'{scope} {scope_id} {field}: المخزن {stored} الصحيح {expected}')
+            if mismatches:
+                raise CommandError(f'يوجد {len(mismatches)} اختلاف في الإحصائيات المجمعة')
+            self.stdout.write(self.style.SUCCESS('الإحصائيات المجمعة مطابقة لبيانات الناخبين'))
+            return
+        count = rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(f'تمت إعادة بناء الإحصائيات المجمعة لـ {count} نطاق'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from elections.search import fts_available, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'إعادة بناء جدول البحث المطبّع في أسماء الناخبين وأرقامهم (SQLite FTS5)'
+
+    def handle(self, *args, **options):
+        if not fts_available():
+            raise CommandError('جدول البحث متاح مع قاعدة بيانات SQLite فقط')
+        count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'تمت فهرسة {count} ناخب'))
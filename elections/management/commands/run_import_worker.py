@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from elections.jobs import claim_next_job, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = 'تنفيذ مهام استيراد ملفات الناخبين في الانتظار (عند ضبط ELECTIONS_IMPORT_IN_PROCESS = False)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='تنفيذ المهام الموجودة في الانتظار ثم الخروج',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=2.0,
+            help='ثواني الانتظار بين عمليات البحث عن مهام جديدة',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            requeued = requeue_stale_jobs()
+            if requeued:
+                self.stdout.write(f'أعيدت {requeued} مهمة متوقفة إلى الانتظار')
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
+                continue
+            run_job(job)
+            self.stdout.write(f'المهمة {job.pk}: {job.get_status_display()} - {job.message}')
@@ -0,0 +1,91 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:46
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def build_rollups(apps, schema_editor):
+    """بناء الإحصائيات المجمعة من الناخبين الموجودين"""
+    Voter = apps.get_model('elections', 'Voter')
+    VoterRollup = apps.get_model('elections', 'VoterRollup')
+    VoterRollupMember = apps.get_model('elections', 'VoterRollupMember')
+    aggregates = {
+        'total_voters': Count('id'),
+        'voted': Count('id', filter=Q(voting_status='voted')),
+        'not_voted': Count('id', filter=Q(voting_status='not_voted')),
+        'updated_cards': Count('id', filter=Q(card_status='updated')),
+        'not_updated_cards': Count('id', filter=Q(card_status='not_updated')),
+    }
+    voters = Voter.objects.order_by()
+    rollups, members = [], []
+    for scope, field in (('admin', None), ('entity', 'candidate__entity_id'),
+                         ('candidate', 'candidate_id'), ('pillar', 'pillar_id')):
+        fields = [field] if field else []
+        rows = voters.values(*fields).annotate(**aggregates) if field else [voters.aggregate(**aggregates)]
+        distinct = {}
+        for kind, value_field in (('center', 'center_number'), ('station', 'station')):
+            for row in voters.values(*fields, value_field).annotate(n=Count('id')):
+                scope_id = row[field] if field else 0
+                members.append(VoterRollupMember(
+                    scope=scope, scope_id=scope_id, kind=kind, value=row[value_field], voters=row['n']))
+                distinct[(scope_id, kind)] = distinct.get((scope_id, kind), 0) + 1
+        for row in rows:
+            if not row['total_voters']:
+                continue
+            scope_id = row.pop(field) if field else 0
+            rollups.append(VoterRollup(
+                scope=scope, scope_id=scope_id,
+                total_centers=distinct.get((scope_id, 'center'), 0),
+                total_stations=distinct.get((scope_id, 'station'), 0),
+                **row
+            ))
+    VoterRollup.objects.bulk_create(rollups, batch_size=500)
+    VoterRollupMember.objects.bulk_create(members, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elections', '0006_customuser_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoterRollupMember',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('admin', 'إدارة'), ('entity', 'كيان'), ('candidate', 'مرشح'), ('pillar', 'ركيزة')], max_length=20, verbose_name='النطاق')),
+                ('scope_id', models.PositiveBigIntegerField(default=0, verbose_name='معرف النطاق')),
+                ('kind', models.CharField(choices=[('center', 'مركز'), ('station', 'محطة')], max_length=10, verbose_name='النوع')),
+                ('value', models.CharField(max_length=100, verbose_name='القيمة')),
+                ('voters', models.PositiveIntegerField(default=0, verbose_name='عدد الناخبين')),
+            ],
+            options={
+                'verbose_name': 'عنصر إحصائية مجمعة',
+                'verbose_name_plural': 'عناصر الإحصائيات المجمعة',
+                'unique_together': {('scope', 'scope_id', 'kind', 'value')},
+            },
+        ),
+        migrations.CreateModel(
+            name='VoterRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('admin', 'إدارة'), ('entity', 'كيان'), ('candidate', 'مرشح'), ('pillar', 'ركيزة')], max_length=20, verbose_name='النطاق')),
+                ('scope_id', models.PositiveBigIntegerField(default=0, verbose_name='معرف النطاق')),
+                ('total_voters', models.PositiveIntegerField(default=0, verbose_name='عدد الناخبين')),
+                ('voted', models.PositiveIntegerField(default=0, verbose_name='صوتوا')),
+                ('not_voted', models.PositiveIntegerField(default=0, verbose_name='لم يصوتوا')),
+                ('updated_cards', models.PositiveIntegerField(default=0, verbose_name='بطاقات محدثة')),
+                ('not_updated_cards', models.PositiveIntegerField(default=0, verbose_name='بطاقات غير محدثة')),
+                ('total_centers', models.PositiveIntegerField(default=0, verbose_name='عدد المراكز')),
+                ('total_stations', models.PositiveIntegerField(default=0, verbose_name='عدد المحطات')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='تاريخ التحديث')),
+            ],
+            options={
+                'verbose_name': 'إحصائية مجمعة',
+                'verbose_name_plural': 'الإحصائيات المجمعة',
+                'unique_together': {('scope', 'scope_id')},
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
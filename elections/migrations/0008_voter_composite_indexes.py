@@ -0,0 +1,60 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elections', '0007_voterrollup'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='voter',
+            name='candidate',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='voters', to='elections.candidate', verbose_name='المرشح'),
+        ),
+        migrations.AlterField(
+            model_name='voter',
+            name='pillar',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='voters', to='elections.pillar', verbose_name='الركيزة'),
+        ),
+        migrations.AddIndex(
+            model_name='voter',
+            index=models.Index(fields=['pillar', 'voting_status'], name='voter_pillar_voting_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='voter',
+            index=models.Index(fields=['pillar', 'card_status'], name='voter_pillar_card_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='voter',
+            index=models.Index(fields=['candidate', 'voting_status'], name='voter_candidate_voting_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='voter',
+            index=models.Index(fields=['candidate', 'card_status'], name='voter_candidate_card_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='voter',
+            index=models.Index(fields=['candidate', 'center_number', 'station'], name='voter_candidate_center_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='voter',
+            index=models.Index(fields=['pillar', 'district', 'sub_district'], name='voter_pillar_district_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='voter',
+            index=models.Index(fields=['pillar', 'governorate'], name='voter_pillar_governorate_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='voter',
+            index=models.Index(fields=['voting_status'], name='voter_voting_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='voter',
+            index=models.Index(fields=['card_status'], name='voter_card_status_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:10
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def fill_voter_entity(apps, schema_editor):
+    """نسخ كيان المرشح إلى الناخبين الموجودين"""
+    Voter = apps.get_model('elections', 'Voter')
+    Candidate = apps.get_model('elections', 'Candidate')
+    Voter.objects.update(
+        entity_id=Subquery(Candidate.objects.filter(pk=OuterRef('candidate_id')).values('entity_id')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elections', '0008_voter_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='voter',
+            name='entity',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='voters', to='elections.entity', verbose_name='الكيان'),
+        ),
+        migrations.RunPython(fill_voter_entity, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='voter',
+            name='entity',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='voters', to='elections.entity', verbose_name='الكيان'),
+        ),
+        migrations.AddIndex(
+            model_name='voter',
+            index=models.Index(fields=['entity', 'voting_status'], name='voter_entity_voting_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='voter',
+            index=models.Index(fields=['entity', 'card_status'], name='voter_entity_card_idx'),
+        ),
+    ]
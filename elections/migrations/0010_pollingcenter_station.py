@@ -0,0 +1,195 @@
+# Generated by Django 4.2.7 on 2026-10-18 21:05
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+import django.db.models.deletion
+
+# عمود الناخب القديم لكل حقل من حقول المركز
+LOCATION = {
+    'number': 'center_number',
+    'name': 'center_name',
+    'governorate': 'governorate',
+    'district': 'district',
+    'sub_district': 'sub_district',
+}
+
+
+def fill_locations(apps, schema_editor):
+    """
+    إنشاء مركز لكل مجموعة مميزة من قيم الموقع ومحطة لكل (مركز، محطة)، ثم ربط
+    الناخبين بها بجملة UPDATE واحدة لكل عمود (استعلام فرعي على الفهرس الفريد)
+    """
+    Voter = apps.get_model('elections', 'Voter')
+    PollingCenter = apps.get_model('elections', 'PollingCenter')
+    Station = apps.get_model('elections', 'Station')
+    voters = Voter.objects.order_by()
+    PollingCenter.objects.bulk_create([
+        PollingCenter(**{field: values[column] for field, column in LOCATION.items()})
+        for values in voters.values(*LOCATION.values()).distinct()
+    ], batch_size=500)
+    centers = PollingCenter.objects.filter(**{field: OuterRef(column) for field, column in LOCATION.items()})
+    voters.update(polling_center=Subquery(centers.values('pk')[:1]))
+    Station.objects.bulk_create([
+        Station(center_id=values['polling_center_id'], number=values['station'])
+        for values in voters.values('polling_center_id', 'station').distinct()
+    ], batch_size=500)
+    stations = Station.objects.filter(center=OuterRef('polling_center'), number=OuterRef('station'))
+    voters.update(polling_station=Subquery(stations.values('pk')[:1]))
+
+
+def restore_locations(apps, schema_editor):
+    """نسخ قيم المركز والمحطة إلى أعمدة الناخب القديمة عند التراجع عن الترحيل"""
+    Voter = apps.get_model('elections', 'Voter')
+    PollingCenter = apps.get_model('elections', 'PollingCenter')
+    Station = apps.get_model('elections', 'Station')
+    center = PollingCenter.objects.filter(pk=OuterRef('polling_center'))
+    Voter.objects.update(
+        station=Subquery(Station.objects.filter(pk=OuterRef('polling_station')).values('number')[:1]),
+        **{column: Subquery(center.values(field)[:1]) for field, column in LOCATION.items()})
+
+
+def rebuild_rollup_members(apps, schema_editor):
+    """عناصر الإحصائيات المجمعة أصبحت معرفات المراكز والمحطات بدلاً من نصوصها"""
+    Voter = apps.get_model('elections', 'Voter')
+    VoterRollup = apps.get_model('elections', 'VoterRollup')
+    VoterRollupMember = apps.get_model('elections', 'VoterRollupMember')
+    VoterRollupMember.objects.all().delete()
+    voters = Voter.objects.order_by()
+    members, distinct = [], {}
+    for scope, field in (('admin', None), ('entity', 'entity_id'),
+                         ('candidate', 'candidate_id'), ('pillar', 'pillar_id')):
+        fields = [field] if field else []
+        for kind, value_field in (('center', 'polling_center_id'), ('station', 'polling_station_id')):
+            for row in voters.values(*fields, value_field).annotate(n=Count('id')):
+                scope_id = row[field] if field else 0
+                members.append(VoterRollupMember(
+                    scope=scope, scope_id=scope_id, kind=kind, value=str(row[value_field]), voters=row['n']))
+                distinct[(scope, scope_id, kind)] = distinct.get((scope, scope_id, kind), 0) + 1
+    VoterRollupMember.objects.bulk_create(members, batch_size=500)
+    for rollup in VoterRollup.objects.all():
+        rollup.total_centers = distinct.get((rollup.scope, rollup.scope_id, 'center'), 0)
+        rollup.total_stations = distinct.get((rollup.scope, rollup.scope_id, 'station'), 0)
+        rollup.save(update_fields=['total_centers', 'total_stations'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elections', '0009_voter_entity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PollingCenter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.CharField(max_length=50, verbose_name='رقم المركز')),
+                ('name', models.CharField(max_length=200, verbose_name='اسم المركز')),
+                ('governorate', models.CharField(max_length=100, verbose_name='المحافظة')),
+                ('district', models.CharField(max_length=100, verbose_name='المنطقة')),
+                ('sub_district', models.CharField(blank=True, max_length=100, verbose_name='الناحية')),
+            ],
+            options={
+                'verbose_name': 'مركز اقتراع',
+                'verbose_name_plural': 'مراكز الاقتراع',
+                'indexes': [models.Index(fields=['district', 'sub_district'], name='center_district_idx'), models.Index(fields=['governorate'], name='center_governorate_idx')],
+                'unique_together': {('number', 'name', 'governorate', 'district', 'sub_district')},
+            },
+        ),
+        migrations.CreateModel(
+            name='Station',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.CharField(max_length=100, verbose_name='المحطة')),
+                ('center', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stations', to='elections.pollingcenter', verbose_name='المركز')),
+            ],
+            options={
+                'verbose_name': 'محطة',
+                'verbose_name_plural': 'المحطات',
+                'unique_together': {('center', 'number')},
+            },
+        ),
+        migrations.AddField(
+            model_name='voter',
+            name='polling_center',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='voters', to='elections.pollingcenter', verbose_name='المركز'),
+        ),
+        migrations.AddField(
+            model_name='voter',
+            name='polling_station',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='voters', to='elections.station', verbose_name='المحطة'),
+        ),
+        # قيمة افتراضية في الحالة فقط (لا تُحفظ في القاعدة) حتى يعيد التراجع الأعمدة
+        # المحذوفة على صفوف موجودة، ثم يملؤها restore_locations
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AlterField(
+                model_name='voter',
+                name=name,
+                field=models.CharField(default='', max_length=max_length, verbose_name=verbose_name),
+            )
+            for name, max_length, verbose_name in (
+                ('governorate', 100, 'المحافظة'),
+                ('district', 100, 'المنطقة'),
+                ('sub_district', 100, 'الناحية'),
+                ('center_name', 200, 'اسم المركز'),
+                ('center_number', 50, 'رقم المركز'),
+                ('station', 100, 'المحطة'),
+            )
+        ]),
+        migrations.RunPython(fill_locations, restore_locations),
+        migrations.RemoveIndex(
+            model_name='voter',
+            name='voter_candidate_center_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='voter',
+            name='voter_pillar_district_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='voter',
+            name='voter_pillar_governorate_idx',
+        ),
+        migrations.RemoveField(
+            model_name='voter',
+            name='center_name',
+        ),
+        migrations.RemoveField(
+            model_name='voter',
+            name='center_number',
+        ),
+        migrations.RemoveField(
+            model_name='voter',
+            name='district',
+        ),
+        migrations.RemoveField(
+            model_name='voter',
+            name='governorate',
+        ),
+        migrations.RemoveField(
+            model_name='voter',
+            name='station',
+        ),
+        migrations.RemoveField(
+            model_name='voter',
+            name='sub_district',
+        ),
+        migrations.AlterField(
+            model_name='voter',
+            name='polling_center',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='voters', to='elections.pollingcenter', verbose_name='المركز'),
+        ),
+        migrations.AlterField(
+            model_name='voter',
+            name='polling_station',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='voters', to='elections.station', verbose_name='المحطة'),
+        ),
+        migrations.AddIndex(
+            model_name='voter',
+            index=models.Index(fields=['candidate', 'polling_center', 'polling_station'], name='voter_candidate_center_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='voter',
+            index=models.Index(fields=['pillar', 'polling_center', 'polling_station'], name='voter_pillar_center_idx'),
+        ),
+        migrations.RunPython(rebuild_rollup_members, migrations.RunPython.noop),
+    ]
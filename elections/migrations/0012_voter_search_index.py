@@ -0,0 +1,63 @@
+# Generated by Django 4.2.7 on 2026-10-18 22:30
+
+import re
+
+from django.db import migrations
+
+# نسخة ثابتة من search.py وقت كتابة الترحيل، فلا يتغير الترحيل إن تغيرت الوحدة
+FTS_TABLE = 'elections_voter_fts'
+INDEXED_FIELDS = ('name', 'voter_number', 'phone_number')
+_DIACRITICS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+_FOLD = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ؤ': 'و', 'ئ': 'ي',
+    'ة': 'ه',
+    'ى': 'ي',
+    **{chr(0x0660 + d): str(d) for d in range(10)},
+    **{chr(0x06f0 + d): str(d) for d in range(10)},
+})
+_SPACES = re.compile(r'\s+')
+
+
+def normalize_arabic(text):
+    if not text:
+        return ''
+    text = _DIACRITICS.sub('', str(text)).translate(_FOLD)
+    return _SPACES.sub(' ', text).strip().lower()
+
+
+def create_search_index(apps, schema_editor):
+    # جدول FTS5 خاص بـ SQLite، ومع القواعد الأخرى يبحث العرض بـ icontains
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Voter = apps.get_model('elections', 'Voter')
+    sql = f'INSERT INTO {FTS_TABLE} (rowid, {", ".join(INDEXED_FIELDS)}) VALUES (%s, %s, %s, %s)'
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5({', '.join(INDEXED_FIELDS)}, tokenize='trigram')")
+        batch = []
+        for row in Voter.objects.values_list('pk', *INDEXED_FIELDS).iterator(chunk_size=5000):
+            batch.append([row[0]] + [normalize_arabic(value) for value in row[1:]])
+            if len(batch) == 5000:
+                cursor.executemany(sql, batch)
+                batch = []
+        if batch:
+            cursor.executemany(sql, batch)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elections', '0011_voter_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
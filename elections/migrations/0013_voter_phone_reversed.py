@@ -0,0 +1,54 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:17
+
+import re
+
+from django.db import migrations, models
+
+# نسخة ثابتة من تطبيع الهاتف في search.py وقت كتابة الترحيل (الترحيل 0018 يكمل ما تغير بعده)
+COUNTRY_CODE = '964'
+_DIGITS = str.maketrans({
+    **{chr(0x0660 + d): str(d) for d in range(10)},
+    **{chr(0x06f0 + d): str(d) for d in range(10)},
+})
+_NON_DIGITS = re.compile(r'\D')
+
+
+def reversed_phone(phone):
+    digits = _NON_DIGITS.sub('', str(phone or '').translate(_DIGITS))
+    if digits.startswith('00' + COUNTRY_CODE):
+        digits = digits[2:]
+    if digits.startswith(COUNTRY_CODE) and len(digits) > 10:
+        digits = '0' + digits[len(COUNTRY_CODE):]
+    return digits[::-1]
+
+
+def fill_phone_reversed(apps, schema_editor):
+    Voter = apps.get_model('elections', 'Voter')
+    batch = []
+    for voter in Voter.objects.exclude(phone_number='').only('phone_number').iterator(chunk_size=5000):
+        voter.phone_reversed = reversed_phone(voter.phone_number)
+        batch.append(voter)
+        if len(batch) == 5000:
+            Voter.objects.bulk_update(batch, ['phone_reversed'])
+            batch = []
+    Voter.objects.bulk_update(batch, ['phone_reversed'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elections', '0012_voter_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='voter',
+            name='phone_reversed',
+            field=models.CharField(blank=True, editable=False, max_length=20, verbose_name='الهاتف معكوساً'),
+        ),
+        migrations.RunPython(fill_phone_reversed, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='voter',
+            index=models.Index(fields=['phone_reversed'], name='voter_phone_reversed_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elections', '0013_voter_phone_reversed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='voter',
+            name='voted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='وقت التصويت'),
+        ),
+        migrations.CreateModel(
+            name='TurnoutBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('admin', 'إدارة'), ('entity', 'كيان'), ('candidate', 'مرشح'), ('pillar', 'ركيزة')], max_length=20, verbose_name='النطاق')),
+                ('scope_id', models.PositiveBigIntegerField(default=0, verbose_name='معرف النطاق')),
+                ('bucket', models.DateTimeField(verbose_name='بداية الفترة')),
+                ('voted', models.PositiveIntegerField(default=0, verbose_name='صوتوا')),
+            ],
+            options={
+                'verbose_name': 'مشاركة فترة',
+                'verbose_name_plural': 'المشاركة حسب الوقت',
+                'unique_together': {('scope', 'scope_id', 'bucket')},
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:07
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elections', '0014_voter_voted_at_turnoutbucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(upload_to='imports/', verbose_name='الملف')),
+                ('status', models.CharField(choices=[('pending', 'في الانتظار'), ('running', 'قيد التنفيذ'), ('done', 'مكتمل'), ('failed', 'فشل')], default='pending', max_length=20, verbose_name='الحالة')),
+                ('total_rows', models.PositiveIntegerField(blank=True, null=True, verbose_name='عدد الصفوف')),
+                ('processed_rows', models.PositiveIntegerField(default=0, verbose_name='الصفوف المعالجة')),
+                ('created_rows', models.PositiveIntegerField(default=0, verbose_name='الناخبون المضافون')),
+                ('skipped_rows', models.PositiveIntegerField(default=0, verbose_name='الصفوف المتجاوزة')),
+                ('errors', models.JSONField(blank=True, default=list, verbose_name='الأخطاء')),
+                ('message', models.TextField(blank=True, verbose_name='الرسالة')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='تاريخ الرفع')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='بداية التنفيذ')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='نهاية التنفيذ')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='آخر تحديث')),
+                ('pillar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_jobs', to='elections.pillar', verbose_name='الركيزة')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_jobs', to=settings.AUTH_USER_MODEL, verbose_name='المستخدم')),
+            ],
+            options={
+                'verbose_name': 'مهمة استيراد',
+                'verbose_name_plural': 'مهام الاستيراد',
+                'indexes': [models.Index(fields=['status', 'created_at'], name='import_job_status_idx')],
+            },
+        ),
+    ]
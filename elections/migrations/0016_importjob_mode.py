@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elections', '0015_importjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='conflict_rows',
+            field=models.PositiveIntegerField(default=0, verbose_name='التعارضات'),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='mode',
+            field=models.CharField(choices=[('create', 'إضافة ناخبين جدد فقط'), ('upsert', 'إضافة الجدد وتحديث الموجودين')], default='create', max_length=10, verbose_name='طريقة الاستيراد'),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='updated_rows',
+            field=models.PositiveIntegerField(default=0, verbose_name='الناخبون المحدثون'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:00
+
+from django.db import migrations
+
+# نسخة ثابتة من قيم search.py وقت كتابة الترحيل
+FTS_TABLE = 'elections_voter_fts'
+DELETE_TRIGGER = 'elections_voter_fts_delete'
+
+
+def create_delete_trigger(apps, schema_editor):
+    # جدول البحث خاص بـ SQLite
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TRIGGER IF NOT EXISTS {DELETE_TRIGGER} AFTER DELETE ON elections_voter '
+            f'BEGIN DELETE FROM {FTS_TABLE} WHERE rowid = old.id; END')
+        # صفوف ناخبين حُذفوا دون إشارات قبل هذا الترحيل
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid NOT IN (SELECT id FROM elections_voter)')
+
+
+def drop_delete_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'DROP TRIGGER IF EXISTS {DELETE_TRIGGER}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elections', '0016_importjob_mode'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_delete_trigger, drop_delete_trigger),
+    ]
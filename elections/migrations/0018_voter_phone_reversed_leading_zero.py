@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:30
+
+from django.db import migrations
+from django.db.models import Value
+from django.db.models.functions import Concat
+
+
+def add_leading_zero(apps, schema_editor):
+    # الهواتف المحفوظة بعشرة أرقام تبدأ بـ 7 صارت تُطبَّع بصفر أول؛ معكوسها يُكمَّل بالصفر في آخره
+    Voter = apps.get_model('elections', 'Voter')
+    Voter.objects.filter(phone_reversed__regex=r'^[0-9]{9}7$').update(
+        phone_reversed=Concat('phone_reversed', Value('0')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elections', '0017_voter_search_delete_trigger'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_leading_zero, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 
@@ -58,6 +58,78 @@ class Pillar(models.Model):
     def __str__(self):
         return self.user.full_name
 
+# مراكز الاقتراع: كل مجموعة (المحافظة، المنطقة، الناحية، الاسم، الرقم) تُحفظ مرة واحدة ويشير إليها الناخبون
+class PollingCenter(models.Model):
+    number = models.CharField(max_length=50, verbose_name='رقم المركز')
+    name = models.CharField(max_length=200, verbose_name='اسم المركز')
+    governorate = models.CharField(max_length=100, verbose_name='المحافظة')
+    district = models.CharField(max_length=100, verbose_name='المنطقة')
+    sub_district = models.CharField(max_length=100, verbose_name='الناحية', blank=True)
+    
+    class Meta:
+        verbose_name = 'مركز اقتراع'
+        verbose_name_plural = 'مراكز الاقتراع'
+        unique_together = ('number', 'name', 'governorate', 'district', 'sub_district')
+        indexes = [
+            models.Index(fields=['district', 'sub_district'], name='center_district_idx'),
+            models.Index(fields=['governorate'], name='center_governorate_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} ({self.number})"
+
+# محطات الاقتراع داخل كل مركز
+class Station(models.Model):
+    center = models.ForeignKey(PollingCenter, on_delete=models.CASCADE, related_name='stations', verbose_name='المركز')
+    number = models.CharField(max_length=100, verbose_name='المحطة')
+    
+    class Meta:
+        verbose_name = 'محطة'
+        verbose_name_plural = 'المحطات'
+        unique_together = ('center', 'number')
+    
+    def __str__(self):
+        return f"{self.center} - {self.number}"
+
+
+def _location_property(name, relation, attr):
+    """
+    خاصية للقراءة والكتابة تعرض قيمة من جدول المراكز/المحطات كأنها حقل في الناخب؛
+    القيم المكتوبة تبقى معلقة حتى يحولها save() إلى معرفات
+    """
+    def fget(self):
+        pending = self.__dict__.get('_pending_location')
+        if pending and name in pending:
+            return pending[name]
+        if getattr(self, f'{relation}_id') is None:
+            return ''
+        return getattr(getattr(self, relation), attr)
+
+    def fset(self, value):
+        pending = self.__dict__.setdefault('_pending_location', {})
+        pending[name] = value
+
+    return property(fget, fset)
+
+
+class VoterQuerySet(models.QuerySet):
+
+    def delete(self):
+        """
+        حذف مجموعة ناخبين وطرح إحصائياتهم دفعة واحدة من قيمهم المحفوظة؛ لا توجد
+        إشارات حذف للناخب فيحذفها Django بجملة واحدة (وجدول البحث يُحدَّث بقادح)
+        """
+        from . import rollups
+        with transaction.atomic():
+            snapshots = list(self.order_by().values(*rollups.SNAPSHOT_FIELDS))
+            result = super().delete()
+            rollups.record_voters_changed((snapshot, None) for snapshot in snapshots)
+        return result
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
 # نموذج الناخب
 class Voter(models.Model):
     CARD_STATUS_CHOICES = (
@@ -72,25 +144,273 @@ class Voter(models.Model):
     
     voter_number = models.CharField(max_length=50, unique=True, verbose_name='رقم الناخب')
     name = models.CharField(max_length=200, verbose_name='الاسم')
-    governorate = models.CharField(max_length=100, verbose_name='المحافظة')
-    district = models.CharField(max_length=100, verbose_name='المنطقة')
-    sub_district = models.CharField(max_length=100, verbose_name='الناحية')
     card_status = models.CharField(max_length=20, choices=CARD_STATUS_CHOICES, default='not_updated', verbose_name='حالة البطاقة')
-    center_name = models.CharField(max_length=200, verbose_name='اسم المركز')
-    center_number = models.CharField(max_length=50, verbose_name='رقم المركز')
-    station = models.CharField(max_length=100, verbose_name='المحطة')
+    # المركز والمحطة مفاتيح صحيحة إلى جداول الأبعاد؛ صفوف هذه الجداول لا تُحذف ما دام لها ناخبون
+    polling_center = models.ForeignKey(PollingCenter, on_delete=models.PROTECT, related_name='voters', verbose_name='المركز', db_index=False)
+    polling_station = models.ForeignKey(Station, on_delete=models.PROTECT, related_name='voters', verbose_name='المحطة', db_index=False)
     phone_number = models.CharField(max_length=15, verbose_name='رقم الهاتف', blank=True)
-    pillar = models.ForeignKey(Pillar, on_delete=models.CASCADE, related_name='voters', verbose_name='الركيزة')
-    candidate = models.ForeignKey(Candidate, on_delete=models.CASCADE, related_name='voters', verbose_name='المرشح')
+    # أرقام الهاتف المطبّعة معكوسة للبحث بآخر الأرقام على الفهرس (تُضبط في save)
+    phone_reversed = models.CharField(max_length=20, blank=True, editable=False, verbose_name='الهاتف معكوساً')
+    # الفهارس المركبة في Meta تبدأ بالركيزة/المرشح/الكيان فتغني عن فهرس المفتاح الأجنبي المنفرد
+    pillar = models.ForeignKey(Pillar, on_delete=models.CASCADE, related_name='voters', verbose_name='الركيزة', db_index=False)
+    candidate = models.ForeignKey(Candidate, on_delete=models.CASCADE, related_name='voters', verbose_name='المرشح', db_index=False)
+    # نسخة من كيان المرشح حتى تُصفى ناخبو الكيان دون المرور بجدول المرشحين (تُضبط في save)
+    entity = models.ForeignKey(Entity, on_delete=models.CASCADE, related_name='voters', verbose_name='الكيان', db_index=False)
     voting_status = models.CharField(max_length=20, choices=VOTING_STATUS_CHOICES, default='not_voted', verbose_name='حالة التصويت')
+    # وقت التحول إلى "صوت" (يُضبط في save ويُمسح عند إلغاء التصويت)
+    voted_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name='وقت التصويت')
     created_at = models.DateTimeField(default=timezone.now, verbose_name='تاريخ الإضافة')
+
+    objects = VoterQuerySet.as_manager()
     
     class Meta:
         verbose_name = 'ناخب'
         verbose_name_plural = 'الناخبون'
+        indexes = [
+            # عدّ وتصفية ناخبي النطاق حسب حالة التصويت/البطاقة
+            models.Index(fields=['pillar', 'voting_status'], name='voter_pillar_voting_idx'),
+            models.Index(fields=['pillar', 'card_status'], name='voter_pillar_card_idx'),
+            models.Index(fields=['candidate', 'voting_status'], name='voter_candidate_voting_idx'),
+            models.Index(fields=['candidate', 'card_status'], name='voter_candidate_card_idx'),
+            models.Index(fields=['entity', 'voting_status'], name='voter_entity_voting_idx'),
+            models.Index(fields=['entity', 'card_status'], name='voter_entity_card_idx'),
+            # المراكز والمحطات المميزة لكل مرشح/ركيزة (عدّ من الفهرس وحده)
+            models.Index(fields=['candidate', 'polling_center', 'polling_station'], name='voter_candidate_center_idx'),
+            # قوائم المناطق والنواحي وتصفيتها في لوحة الركيزة تمر بمراكز الركيزة
+            models.Index(fields=['pillar', 'polling_center', 'polling_station'], name='voter_pillar_center_idx'),
+            # ترتيب صفحات الناخبين في التصفح بالمؤشر (انظر pagination.py)
+            models.Index(fields=['pillar', 'name', 'id'], name='voter_pillar_name_idx'),
+            models.Index(fields=['candidate', 'id'], name='voter_candidate_id_idx'),
+            models.Index(fields=['entity', 'id'], name='voter_entity_id_idx'),
+            # تصفية لوحة الإدارة وصفحات الإحصائيات على مستوى النظام
+            models.Index(fields=['voting_status'], name='voter_voting_status_idx'),
+            models.Index(fields=['card_status'], name='voter_card_status_idx'),
+            # البحث بآخر أرقام الهاتف (انظر search.number_filter)
+            models.Index(fields=['phone_reversed'], name='voter_phone_reversed_idx'),
+        ]
+    
+    governorate = _location_property('governorate', 'polling_center', 'governorate')
+    district = _location_property('district', 'polling_center', 'district')
+    sub_district = _location_property('sub_district', 'polling_center', 'sub_district')
+    center_name = _location_property('center_name', 'polling_center', 'name')
+    center_number = _location_property('center_number', 'polling_center', 'number')
+    station = _location_property('station', 'polling_station', 'number')
     
     def __str__(self):
         return f"{self.name} - {self.voter_number}"
+    
+    def resolve_location(self, lookup=None):
+        """تحويل قيم الموقع المكتوبة إلى معرفي المركز والمحطة"""
+        pending = self.__dict__.pop('_pending_location', None)
+        if not pending:
+            return
+        from .locations import LocationLookup
+        lookup = lookup or LocationLookup()
+        current = {}
+        if self.polling_center_id is not None:
+            center = self.polling_center
+            current = {'governorate': center.governorate, 'district': center.district,
+                       'sub_district': center.sub_district, 'center_name': center.name,
+                       'center_number': center.number}
+        if self.polling_station_id is not None:
+            current['station'] = self.polling_station.number
+        current.update(pending)
+        self.polling_center_id, self.polling_station_id = lookup.resolve(**current)
+    
+    def assign_scope(self):
+        """اشتقاق المرشح من الركيزة والكيان من المرشح حتى تبقى المفاتيح المباشرة متسقة"""
+        if self.pillar_id is not None:
+            self.candidate_id = self.pillar.candidate_id
+        if self.candidate_id is not None:
+            self.entity_id = self.candidate.entity_id
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_voting_status = instance.__dict__.get('voting_status')
+        return instance
+
+    def assign_voted_at(self):
+        """
+        وقت التصويت عند التحول إلى "صوت"، ولا وقت لمن لم يصوت؛ المصوت المحفوظ بلا
+        وقت (المستورد مثلاً) يبقى بلا وقت عند حفظه مرة أخرى
+        """
+        if self.voting_status != 'voted':
+            self.voted_at = None
+        elif self.voted_at is None and getattr(self, '_stored_voting_status', None) != 'voted':
+            self.voted_at = timezone.now()
+    
+    def assign_phone(self):
+        """ضبط الهاتف المعكوس من رقم الهاتف (يُستدعى أيضاً قبل bulk_create)"""
+        from .search import reversed_phone
+        self.phone_reversed = reversed_phone(self.phone_number)
+    
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'pillar', 'candidate'} & set(update_fields):
+            self.assign_scope()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'candidate', 'entity'}
+        if update_fields is None or 'voting_status' in update_fields:
+            self.assign_voted_at()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | {'voted_at'}
+        if update_fields is None or 'phone_number' in update_fields:
+            self.assign_phone()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | {'phone_reversed'}
+        if '_pending_location' in self.__dict__:
+            self.resolve_location()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | {'polling_center', 'polling_station'}
+        # حفظ الناخب وتحديث جداول الإحصائيات المجمعة في معاملة واحدة
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        self._stored_voting_status = self.voting_status
+    
+    def delete(self, *args, **kwargs):
+        # طرح القيم المحفوظة لا قيم الكائن (قد يكون قديماً أو نُقلت ركيزته)، كما في الحفظ
+        from . import rollups
+        with transaction.atomic():
+            snapshot = rollups.stored_snapshot(self.pk)
+            result = super().delete(*args, **kwargs)
+            if snapshot is not None:
+                rollups.record_voter_change(old=snapshot)
+            return result
+
+# إحصائيات الناخبين المجمعة لكل نطاق (الإدارة، كيان، مرشح، ركيزة)
+class VoterRollup(models.Model):
+    SCOPE_CHOICES = (
+        ('admin', 'إدارة'),
+        ('entity', 'كيان'),
+        ('candidate', 'مرشح'),
+        ('pillar', 'ركيزة'),
+    )
+    
+    scope = models.CharField(max_length=20, choices=SCOPE_CHOICES, verbose_name='النطاق')
+    scope_id = models.PositiveBigIntegerField(default=0, verbose_name='معرف النطاق')
+    total_voters = models.PositiveIntegerField(default=0, verbose_name='عدد الناخبين')
+    voted = models.PositiveIntegerField(default=0, verbose_name='صوتوا')
+    not_voted = models.PositiveIntegerField(default=0, verbose_name='لم يصوتوا')
+    updated_cards = models.PositiveIntegerField(default=0, verbose_name='بطاقات محدثة')
+    not_updated_cards = models.PositiveIntegerField(default=0, verbose_name='بطاقات غير محدثة')
+    total_centers = models.PositiveIntegerField(default=0, verbose_name='عدد المراكز')
+    total_stations = models.PositiveIntegerField(default=0, verbose_name='عدد المحطات')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='تاريخ التحديث')
+    
+    class Meta:
+        verbose_name = 'إحصائية مجمعة'
+        verbose_name_plural = 'الإحصائيات المجمعة'
+        unique_together = ('scope', 'scope_id')
+    
+    def __str__(self):
+        return f"{self.get_scope_display()} {self.scope_id}"
+
+# عدد ناخبي كل مركز/محطة ضمن النطاق (لحساب عدد المراكز والمحطات المميزة تراكمياً)
+class VoterRollupMember(models.Model):
+    KIND_CHOICES = (
+        ('center', 'مركز'),
+        ('station', 'محطة'),
+    )
+    
+    scope = models.CharField(max_length=20, choices=VoterRollup.SCOPE_CHOICES, verbose_name='النطاق')
+    scope_id = models.PositiveBigIntegerField(default=0, verbose_name='معرف النطاق')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, verbose_name='النوع')
+    value = models.CharField(max_length=100, verbose_name='القيمة')
+    voters = models.PositiveIntegerField(default=0, verbose_name='عدد الناخبين')
+    
+    class Meta:
+        verbose_name = 'عنصر إحصائية مجمعة'
+        verbose_name_plural = 'عناصر الإحصائيات المجمعة'
+        unique_together = ('scope', 'scope_id', 'kind', 'value')
+
+# عدد المصوتين في كل فترة زمنية لكل نطاق (منحنى نسبة المشاركة)، يُحدَّث تراكمياً مع الإحصائيات المجمعة
+class TurnoutBucket(models.Model):
+    scope = models.CharField(max_length=20, choices=VoterRollup.SCOPE_CHOICES, verbose_name='النطاق')
+    scope_id = models.PositiveBigIntegerField(default=0, verbose_name='معرف النطاق')
+    bucket = models.DateTimeField(verbose_name='بداية الفترة')
+    voted = models.PositiveIntegerField(default=0, verbose_name='صوتوا')
+    
+    class Meta:
+        verbose_name = 'مشاركة فترة'
+        verbose_name_plural = 'المشاركة حسب الوقت'
+        unique_together = ('scope', 'scope_id', 'bucket')
+    
+    def __str__(self):
+        return f"{self.scope} {self.scope_id} {self.bucket}"
+
+# مهمة استيراد ملف ناخبين تُنفذ في الخلفية (انظر jobs.py)
+class ImportJob(models.Model):
+    STATUS_CHOICES = (
+        ('pending', 'في الانتظار'),
+        ('running', 'قيد التنفيذ'),
+        ('done', 'مكتمل'),
+        ('failed', 'فشل'),
+    )
+    
+    MODE_CHOICES = (
+        ('create', 'إضافة ناخبين جدد فقط'),
+        ('upsert', 'إضافة الجدد وتحديث الموجودين'),
+    )
+    
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='import_jobs', verbose_name='المستخدم')
+    pillar = models.ForeignKey(Pillar, on_delete=models.CASCADE, related_name='import_jobs', verbose_name='الركيزة')
+    file = models.FileField(upload_to='imports/', verbose_name='الملف')
+    mode = models.CharField(max_length=10, choices=MODE_CHOICES, default='create', verbose_name='طريقة الاستيراد')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name='الحالة')
+    # تقدير من أبعاد الورقة (قد يشمل صفوفاً فارغة)
+    total_rows = models.PositiveIntegerField(null=True, blank=True, verbose_name='عدد الصفوف')
+    processed_rows = models.PositiveIntegerField(default=0, verbose_name='الصفوف المعالجة')
+    created_rows = models.PositiveIntegerField(default=0, verbose_name='الناخبون المضافون')
+    updated_rows = models.PositiveIntegerField(default=0, verbose_name='الناخبون المحدثون')
+    # أرقام ناخبين مسجلة لدى مرشح آخر (ضمن الصفوف المتجاوزة)
+    conflict_rows = models.PositiveIntegerField(default=0, verbose_name='التعارضات')
+    skipped_rows = models.PositiveIntegerField(default=0, verbose_name='الصفوف المتجاوزة')
+    errors = models.JSONField(default=list, blank=True, verbose_name='الأخطاء')
+    message = models.TextField(blank=True, verbose_name='الرسالة')
+    created_at = models.DateTimeField(default=timezone.now, verbose_name='تاريخ الرفع')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='بداية التنفيذ')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='نهاية التنفيذ')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='آخر تحديث')
+    
+    class Meta:
+        verbose_name = 'مهمة استيراد'
+        verbose_name_plural = 'مهام الاستيراد'
+        indexes = [
+            # العامل يبحث عن أقدم مهمة في الانتظار
+            models.Index(fields=['status', 'created_at'], name='import_job_status_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.file.name} - {self.get_status_display()}"
+    
+    def progress(self):
+        """حالة المهمة وتقدمها كما تعرضها صفحة الرفع"""
+        elapsed = None
+        if self.started_at:
+            elapsed = ((self.finished_at or timezone.now()) - self.started_at).total_seconds()
+        rate = self.processed_rows / elapsed if elapsed else 0
+        eta = None
+        if self.status == 'running' and rate and self.total_rows:
+            eta = round(max(self.total_rows - self.processed_rows, 0) / rate)
+        elif self.status in ('done', 'failed'):
+            eta = 0
+        return {
+            'id': self.pk,
+            'status': self.status,
+            'status_display': self.get_status_display(),
+            'total_rows': self.total_rows,
+            'processed_rows': self.processed_rows,
+            'mode': self.mode,
+            'created': self.created_rows,
+            'updated': self.updated_rows,
+            'conflicts': self.conflict_rows,
+            'skipped': self.skipped_rows,
+            'errors': self.errors,
+            'message': self.message,
+            'rows_per_second': round(rate),
+            'eta_seconds': eta,
+        }
 
 # نموذج إعدادات المظهر
 class AppearanceSettings(models.Model):
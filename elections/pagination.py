@@ -0,0 +1,182 @@
+"""
+تصفح قوائم الناخبين بالمؤشر (keyset) بدلاً من OFFSET
+
+الصفحة تُجلب بشرط "بعد آخر صف في الصفحة السابقة" على ترتيب يخدمه فهرس
+(مثل (الركيزة، الاسم، المعرف))، فتكلف الصفحة الأخيرة ما تكلفه الأولى مهما
+كبر عدد الناخبين. المؤشرات تُمرر في الرابط (after / before)، وتحمل مع قيم
+الترتيب موقع الصف في القائمة حتى يستمر ترقيم الصفوف بين الصفحات.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+# معاملات لا تنتقل إلى روابط الصفحات (التصفح، وطلب جزء من الصفحة)
+PAGE_PARAMS = ('after', 'before', 'last', 'page', 'fragment')
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, ensure_ascii=False).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+def after_condition(fields, values, reverse=False):
+    """
+    شرط "بعد المؤشر" على عدة حقول بصيغة يستعملها SQLite كنطاق على الفهرس:
+    f1 >= v1 AND (f1 > v1 OR (f2 >= v2 AND (f2 > v2 OR ...)))
+    """
+    op = 'lt' if reverse else 'gt'
+    field, value = fields[0], values[0]
+    if len(fields) == 1:
+        return Q(**{f'{field}__{op}': value})
+    return Q(**{f'{field}__{op}e': value}) & (
+        Q(**{f'{field}__{op}': value}) | after_condition(fields[1:], values[1:], reverse))
+
+
+class KeysetPage:
+    """صفحة من النتائج مع مؤشري الصفحة التالية والسابقة"""
+
+    def __init__(self, object_list, ordering, has_next, has_previous, query, count=None, start=1):
+        self.object_list = object_list
+        # موقع أول صف في القائمة (يبدأ من 1)
+        self.start = start
+        self.count = count
+        self.ordering = ordering
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.query = query
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def start_index(self):
+        return self.start
+
+    def _cursor(self, obj, position):
+        # الصفوف كائنات أو قواميس (من values())
+        if isinstance(obj, dict):
+            return encode_cursor([obj[field] for field in self.ordering] + [position])
+        return encode_cursor([getattr(obj, field) for field in self.ordering] + [position])
+
+    @property
+    def _end(self):
+        return self.start + len(self.object_list) - 1
+
+    def _link(self, **params):
+        query = self.query.copy()
+        for name in PAGE_PARAMS:
+            query.pop(name, None)
+        for name, value in params.items():
+            query[name] = value
+        return query.urlencode()
+
+    @property
+    def first_query(self):
+        return self._link()
+
+    @property
+    def last_query(self):
+        return self._link(last='1')
+
+    @property
+    def next_cursor(self):
+        return self._cursor(self.object_list[-1], self._end) if self.has_next else None
+
+    @property
+    def previous_cursor(self):
+        return self._cursor(self.object_list[0], self.start) if self.has_previous else None
+
+    @property
+    def next_query(self):
+        return self._link(after=self._cursor(self.object_list[-1], self._end)) if self.object_list else ''
+
+    @property
+    def previous_query(self):
+        return self._link(before=self._cursor(self.object_list[0], self.start)) if self.object_list else ''
+
+
+class KeysetPaginator:
+    """
+    ordering: حقول الترتيب، وآخرها يجب أن يكون فريداً (المعرف)
+    count: إجمالي الصفوف إن كان محسوباً مسبقاً (لا يُعدّ الاستعلام هنا)
+    مثال: KeysetPaginator(voters, 25, ('name', 'id')).page(request.GET)
+    """
+
+    def __init__(self, queryset, per_page, ordering=('id',), count=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.count = count
+
+    def field(self, name):
+        annotation = self.queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return self.queryset.model._meta.get_field(name)
+
+    def clean_cursor(self, cursor):
+        """
+        (قيم المؤشر محوّلة لأنواع حقول الترتيب، موقع صفه)، أو None إن كان تالفاً (عدد
+        قيم مختلف أو قيمة لا تناسب حقلها)، فيُعامل الرابط المعدَّل كأنه بلا مؤشر
+        """
+        values = decode_cursor(cursor)
+        if values is None or len(values) != len(self.ordering) + 1:
+            return None
+        *values, position = values
+        if not isinstance(position, int) or isinstance(position, bool) or position < 1:
+            return None
+        cleaned = []
+        for name, value in zip(self.ordering, values):
+            if not isinstance(value, (str, int, float)) or isinstance(value, bool):
+                return None
+            try:
+                value = self.field(name).to_python(value)
+            except (ValidationError, TypeError, ValueError):
+                return None
+            if value is None:
+                return None
+            cleaned.append(value)
+        return cleaned, position
+
+    def page(self, query):
+        """جلب الصفحة المطلوبة في معاملات الرابط (QueryDict)"""
+        after = self.clean_cursor(query.get('after', ''))
+        before = self.clean_cursor(query.get('before', ''))
+        backwards = before is not None or query.get('last') == '1'
+        cursor = before if backwards else after
+
+        queryset = self.queryset
+        if cursor is not None:
+            queryset = queryset.filter(after_condition(self.ordering, cursor[0], reverse=backwards))
+        order = [f'-{field}' if backwards else field for field in self.ordering]
+        rows = list(queryset.order_by(*order)[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+            if before is not None:
+                end = before[1] - 1
+            else:
+                end = self.count if self.count is not None else self.queryset.count()
+            # الرجوع من مؤشر يعني وجود صفوف بعده، والصفحة الأخيرة ليس بعدها شيء
+            return KeysetPage(rows, self.ordering, has_next=before is not None, has_previous=more,
+                              query=query, count=self.count, start=max(end - len(rows) + 1, 1))
+        return KeysetPage(rows, self.ordering, has_next=more, has_previous=after is not None,
+                          query=query, count=self.count, start=after[1] + 1 if after else 1)
@@ -0,0 +1,24 @@
+"""
+مجموعات عمليات لأعمال المعالجة الثقيلة (التحقق من صفوف الاستيراد)
+
+العمليات تبدأ بطريقة spawn بمفسر جديد، فهي آمنة مع خيوط مهام الاستيراد واتصالات
+قاعدة البيانات المفتوحة في العملية الأم (بخلاف fork). لذلك لا تستورد هذه الوحدة
+النماذج: دالة التهيئة تُحمَّل في العملية الجديدة قبل django.setup().
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+
+def setup_process(settings_module):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def process_pool(workers):
+    """مجموعة عمليات جاهزة لاستيراد وحدات التطبيق"""
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=setup_process, initargs=(settings.SETTINGS_MODULE,))
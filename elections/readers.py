@@ -0,0 +1,134 @@
+"""
+قراءة ملفات الناخبين المرفوعة صفاً صفاً بحسب صيغتها
+
+الصيغة تُعرف من أول بايتات الملف لا من امتداده: ملف xlsx أرشيف zip، وملف xls
+القديم حاوية OLE2، وما عدا ذلك نص CSV. كل قارئ في READERS يعيد صفوف الورقة
+(مع صف العناوين) كصفوف قيم بالشكل نفسه، فيمر ما بعدها من ربط الأعمدة والتحقق
+بالمسار نفسه.
+
+CSV يُقرأ بوحدة csv مباشرة (أسرع بكثير من openpyxl)، بترميز UTF-8 أو UTF-8 مع
+BOM أو Windows-1256 (ملفات Excel العربية القديمة)، والفاصل يُكتشف من بداية
+الملف. قراءة xls تتطلب حزمة xlrd الاختيارية.
+"""
+import codecs
+import csv
+import io
+
+import openpyxl
+
+try:
+    import xlrd
+except ImportError:
+    xlrd = None
+
+# حجم العينة المقروءة لمعرفة الترميز والفاصل
+SAMPLE_SIZE = 64 * 1024
+CSV_DELIMITERS = ',;\t'
+# امتدادات الملفات المقبولة في الرفع (الصيغة الفعلية تُعرف من المحتوى)
+UPLOAD_EXTENSIONS = ('.xlsx', '.xls', '.csv')
+XLRD_REQUIRED = 'قراءة ملفات .xls تتطلب تثبيت حزمة xlrd؛ احفظ الملف بصيغة .xlsx أو .csv'
+
+_SIGNATURES = (
+    (b'PK\x03\x04', 'xlsx'),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'xls'),
+)
+
+
+def upload_extensions():
+    """الامتدادات المقبولة فعلاً: xls فقط إن كانت xlrd مثبتة"""
+    return tuple(extension for extension in UPLOAD_EXTENSIONS if extension != '.xls' or xlrd is not None)
+
+
+def sniff_format(file):
+    """صيغة الملف من أول بايتاته: xlsx أو xls أو csv"""
+    position = file.tell()
+    head = file.read(8)
+    file.seek(position)
+    for signature, file_format in _SIGNATURES:
+        if head.startswith(signature):
+            return file_format
+    return 'csv'
+
+
+def xlsx_rows(file):
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def xls_rows(file):
+    if xlrd is None:
+        raise ValueError(XLRD_REQUIRED)
+    workbook = xlrd.open_workbook(file_contents=file.read(), on_demand=True)
+    try:
+        sheet = workbook.sheet_by_index(0)
+        for index in range(sheet.nrows):
+            yield tuple(sheet.row_values(index))
+    finally:
+        workbook.release_resources()
+
+
+def csv_encoding(sample):
+    """ترميز ملف CSV من عينة بدايته"""
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    try:
+        # final=False: العينة قد تنتهي في منتصف حرف متعدد البايتات
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return 'cp1256'
+    return 'utf-8'
+
+
+def csv_rows(file):
+    sample = file.read(SAMPLE_SIZE)
+    file.seek(0)
+    encoding = csv_encoding(sample)
+    text = io.TextIOWrapper(file, encoding=encoding, newline='')
+    try:
+        try:
+            dialect = csv.Sniffer().sniff(sample.decode(encoding, errors='ignore'), delimiters=CSV_DELIMITERS)
+        except csv.Error:
+            dialect = csv.excel
+        yield from map(tuple, csv.reader(text, dialect))
+    finally:
+        # الملف نفسه يغلقه صاحبه
+        text.detach()
+
+
+READERS = {
+    'xlsx': xlsx_rows,
+    'xls': xls_rows,
+    'csv': csv_rows,
+}
+
+
+def read_rows(file, file_format=None):
+    """صفوف الملف (مع صف العناوين) كصفوف قيم، أياً كانت صيغته"""
+    return READERS[file_format or sniff_format(file)](file)
+
+
+def count_rows(file, file_format=None):
+    """تقدير عدد صفوف البيانات دون تحليلها (لحساب الوقت المتبقي)، أو None"""
+    file_format = file_format or sniff_format(file)
+    position = file.tell()
+    try:
+        if file_format == 'xlsx':
+            workbook = openpyxl.load_workbook(file, read_only=True)
+            max_row = workbook.active.max_row
+            workbook.close()
+            return max(max_row - 1, 0) if max_row else None
+        if file_format == 'csv':
+            lines = 0
+            last = b''
+            while chunk := file.read(SAMPLE_SIZE):
+                lines += chunk.count(b'\n')
+                last = chunk
+            if last and not last.endswith(b'\n'):
+                lines += 1
+            return max(lines - 1, 0)
+        return None
+    finally:
+        file.seek(position)
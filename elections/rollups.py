@@ -0,0 +1,372 @@
+"""
+جداول الإحصائيات المجمعة (rollups) للناخبين
+
+كل نطاق (الإدارة، كيان، مرشح، ركيزة) له صف في VoterRollup يحمل عداداته،
+وتُحدَّث هذه العدادات تراكمياً عند كل إضافة أو حذف أو تعديل لناخب بدلاً من
+إعادة عدّ جدول الناخبين. عدد المراكز والمحطات المميزة يُحسب من جدول
+VoterRollupMember الذي يحفظ عدد ناخبي كل مركز/محطة ضمن النطاق، ومنحنى
+المشاركة من TurnoutBucket الذي يحفظ عدد المصوتين في كل فترة (حسب voted_at).
+"""
+from collections import defaultdict
+
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import Candidate, Voter, VoterRollup, VoterRollupMember, TurnoutBucket
+from .events import publish_changes
+from .stats_cache import invalidate_content, invalidate_scopes
+
+COUNTERS = ('total_voters', 'voted', 'not_voted', 'updated_cards', 'not_updated_cards')
+MEMBER_KINDS = {'center': 'total_centers', 'station': 'total_stations'}
+STAT_FIELDS = COUNTERS + tuple(MEMBER_KINDS.values())
+
+# حقول الناخب التي تؤثر على الإحصائيات
+SNAPSHOT_FIELDS = ('pillar_id', 'candidate_id', 'entity_id', 'voting_status', 'voted_at',
+                   'card_status', 'polling_center_id', 'polling_station_id')
+# عمود الناخب الذي تُعدّ قيمه المميزة لكل نوع من عناصر VoterRollupMember
+MEMBER_FIELDS = {'center': 'polling_center_id', 'station': 'polling_station_id'}
+
+# طول فترة منحنى المشاركة بالدقائق
+TURNOUT_BUCKET_MINUTES = 15
+
+def voter_snapshot(voter):
+    """لقطة من قيم الناخب المؤثرة على الإحصائيات"""
+    return {
+        'pillar_id': voter.pillar_id,
+        'candidate_id': voter.candidate_id,
+        'entity_id': voter.entity_id,
+        'voting_status': voter.voting_status,
+        'voted_at': voter.voted_at,
+        'card_status': voter.card_status,
+        'polling_center_id': voter.polling_center_id,
+        'polling_station_id': voter.polling_station_id,
+    }
+
+
+def turnout_bucket(moment):
+    """بداية فترة المنحنى التي يقع فيها الوقت"""
+    return moment.replace(minute=moment.minute - moment.minute % TURNOUT_BUCKET_MINUTES, second=0, microsecond=0)
+
+
+def candidate_entity_id(candidate_id):
+    return Candidate.objects.filter(pk=candidate_id).values_list('entity_id', flat=True).first()
+
+
+def stored_snapshot(voter_id):
+    """لقطة الناخب كما هي محفوظة حالياً في قاعدة البيانات"""
+    return Voter.objects.filter(pk=voter_id).values(*SNAPSHOT_FIELDS).first()
+
+
+def snapshot_scopes(snapshot):
+    return [
+        ('admin', 0),
+        ('entity', snapshot['entity_id']),
+        ('candidate', snapshot['candidate_id']),
+        ('pillar', snapshot['pillar_id']),
+    ]
+
+
+class RollupDelta:
+    """تجميع فروقات العدادات لعدة نطاقات ثم تطبيقها دفعة واحدة"""
+
+    def __init__(self):
+        self.counts = defaultdict(lambda: defaultdict(int))
+        self.members = defaultdict(lambda: defaultdict(int))
+        self.turnout = defaultdict(lambda: defaultdict(int))
+
+    def add_voter(self, snapshot, sign=1):
+        for key in snapshot_scopes(snapshot):
+            if key[1] is None:
+                continue
+            counts = self.counts[key]
+            counts['total_voters'] += sign
+            if snapshot['voting_status'] in ('voted', 'not_voted'):
+                counts[snapshot['voting_status']] += sign
+            if snapshot['card_status'] == 'updated':
+                counts['updated_cards'] += sign
+            elif snapshot['card_status'] == 'not_updated':
+                counts['not_updated_cards'] += sign
+            for kind, field in MEMBER_FIELDS.items():
+                self.members[key][(kind, str(snapshot[field]))] += sign
+            if snapshot['voting_status'] == 'voted' and snapshot.get('voted_at'):
+                self.turnout[turnout_bucket(snapshot['voted_at'])][key] += sign
+
+    def add_rollup(self, source, targets, sign=1):
+        """إضافة (أو طرح) مساهمة نطاق كامل إلى نطاقات أخرى، مثل ركيزة محذوفة أو مرشح نُقل لكيان آخر"""
+        rollup = VoterRollup.objects.filter(scope=source[0], scope_id=source[1]).first()
+        if rollup is None:
+            return
+        members = VoterRollupMember.objects.filter(scope=source[0], scope_id=source[1])
+        buckets = TurnoutBucket.objects.filter(scope=source[0], scope_id=source[1])
+        for key in targets:
+            for field in COUNTERS:
+                self.counts[key][field] += sign * getattr(rollup, field)
+            for member in members:
+                self.members[key][(member.kind, member.value)] += sign * member.voters
+            for bucket in buckets:
+                self.turnout[bucket.bucket][key] += sign * bucket.voted
+
+    def apply(self):
+        """تطبيق الفروقات وإرجاع النطاقات التي تغيرت عداداتها"""
+        changed = {}
+        touched = set(self.counts) | set(self.members)
+        with transaction.atomic():
+            for key in touched:
+                updates = {field: delta for field, delta in self.counts[key].items() if delta}
+                for kind, delta in self._apply_members(key).items():
+                    if delta:
+                        updates[MEMBER_KINDS[kind]] = delta
+                if not updates:
+                    continue
+                rollups = VoterRollup.objects.filter(scope=key[0], scope_id=key[1])
+                if not rollups.update(**{field: F(field) + delta for field, delta in updates.items()}):
+                    VoterRollup.objects.create(
+                        scope=key[0], scope_id=key[1],
+                        **{field: max(delta, 0) for field, delta in updates.items()}
+                    )
+                changed[key] = updates
+            self._apply_turnout()
+        invalidate_scopes(changed)
+        # كل ناخب مُضاف أو محذوف أو معدَّل يغير قوائم نطاقاته ولو بقيت العدادات كما هي
+        invalidate_content(touched)
+        publish_changes(changed)
+        return changed
+
+    def _apply_turnout(self):
+        """إضافة فروقات المصوتين إلى فترات المنحنى: تحديث واحد لكل (فترة، فرق) ثم إنشاء الفترات الجديدة"""
+        for bucket, deltas in self.turnout.items():
+            by_delta = defaultdict(list)
+            for key, delta in deltas.items():
+                if delta and key[1] is not None:
+                    by_delta[delta].append(key)
+            for delta, keys in by_delta.items():
+                rows = TurnoutBucket.objects.filter(
+                    reduce(or_, (Q(scope=scope, scope_id=scope_id) for scope, scope_id in keys)), bucket=bucket)
+                if rows.update(voted=F('voted') + delta) == len(keys):
+                    continue
+                existing = set(rows.values_list('scope', 'scope_id'))
+                TurnoutBucket.objects.bulk_create([
+                    TurnoutBucket(scope=scope, scope_id=scope_id, bucket=bucket, voted=max(delta, 0))
+                    for scope, scope_id in keys if (scope, scope_id) not in existing
+                ])
+
+    def _apply_members(self, key):
+        """تحديث عدد ناخبي كل مركز/محطة وإرجاع التغير في عدد العناصر المميزة"""
+        deltas = {kind: {value: d for (k, value), d in self.members[key].items() if k == kind and d}
+                  for kind in MEMBER_KINDS}
+        distinct = defaultdict(int)
+        for kind, values in deltas.items():
+            if not values:
+                continue
+            existing = {
+                value: (pk, voters) for pk, value, voters in VoterRollupMember.objects.filter(
+                    scope=key[0], scope_id=key[1], kind=kind, value__in=list(values)
+                ).values_list('pk', 'value', 'voters')
+            }
+            # التحديثات مجمعة حسب الفرق: استعلام واحد لكل فرق بدلاً من CASE ضخم في bulk_update
+            created, updated, removed = [], defaultdict(list), []
+            for value, delta in values.items():
+                pk, before = existing.get(value, (None, 0))
+                after = before + delta
+                distinct[kind] += (after > 0) - (before > 0)
+                if pk is None:
+                    if after > 0:
+                        created.append(VoterRollupMember(
+                            scope=key[0], scope_id=key[1], kind=kind, value=value, voters=after))
+                elif after > 0:
+                    updated[delta].append(pk)
+                else:
+                    removed.append(pk)
+            VoterRollupMember.objects.bulk_create(created)
+            for delta, pks in updated.items():
+                VoterRollupMember.objects.filter(pk__in=pks).update(voters=F('voters') + delta)
+            VoterRollupMember.objects.filter(pk__in=removed).delete()
+        return distinct
+
+
+def record_voter_change(old=None, new=None):
+    """تحديث الإحصائيات بعد إضافة ناخب (old=None) أو حذفه (new=None) أو تعديله"""
+    delta = RollupDelta()
+    if old:
+        delta.add_voter(old, -1)
+    if new:
+        delta.add_voter(new, 1)
+    return delta.apply()
+
+
+def record_voters_changed(changes):
+    """تحديث الإحصائيات لتعديلات ناخبين دفعة واحدة دون إشارات الحفظ، كل عنصر (لقطة قديمة، لقطة جديدة)"""
+    delta = RollupDelta()
+    for old, new in changes:
+        if old:
+            delta.add_voter(old, -1)
+        if new:
+            delta.add_voter(new, 1)
+    return delta.apply()
+
+
+def remove_pillar(pillar):
+    """طرح مساهمة ركيزة محذوفة من المرشح والكيان والإدارة وحذف صفوفها"""
+    entity_id = candidate_entity_id(pillar.candidate_id)
+    delta = RollupDelta()
+    delta.add_rollup(('pillar', pillar.pk),
+                     [('admin', 0), ('entity', entity_id), ('candidate', pillar.candidate_id)], -1)
+    changed = delta.apply()
+    delete_scope('pillar', pillar.pk)
+    return changed
+
+
+def move_candidate(candidate_id, old_entity_id, new_entity_id):
+    """نقل مساهمة مرشح من كيان لآخر"""
+    delta = RollupDelta()
+    delta.add_rollup(('candidate', candidate_id), [('entity', old_entity_id)], -1)
+    delta.add_rollup(('candidate', candidate_id), [('entity', new_entity_id)], 1)
+    return delta.apply()
+
+
+def move_pillar(pillar_id, old_candidate_id, old_entity_id, new_candidate_id, new_entity_id):
+    """نقل مساهمة ركيزة من مرشح (وكيان) لآخر"""
+    delta = RollupDelta()
+    delta.add_rollup(('pillar', pillar_id), [('candidate', old_candidate_id), ('entity', old_entity_id)], -1)
+    delta.add_rollup(('pillar', pillar_id), [('candidate', new_candidate_id), ('entity', new_entity_id)], 1)
+    return delta.apply()
+
+
+def delete_scope(scope, scope_id):
+    VoterRollup.objects.filter(scope=scope, scope_id=scope_id).delete()
+    VoterRollupMember.objects.filter(scope=scope, scope_id=scope_id).delete()
+    TurnoutBucket.objects.filter(scope=scope, scope_id=scope_id).delete()
+
+
+def _empty_stats():
+    return {field: 0 for field in STAT_FIELDS}
+
+
+def rollup_stats(scope, scope_id=0):
+    """إحصائيات النطاق من الجدول المجمّع (قراءة صف واحد)"""
+    row = VoterRollup.objects.filter(scope=scope, scope_id=scope_id or 0).values(*STAT_FIELDS).first()
+    return row or _empty_stats()
+
+
+def rollup_map(scope, ids):
+    """إحصائيات عدة عناصر من نفس النطاق في استعلام واحد: {المعرف: الإحصائيات}"""
+    ids = list(ids)
+    stats = {scope_id: _empty_stats() for scope_id in ids}
+    for row in VoterRollup.objects.filter(scope=scope, scope_id__in=ids).values('scope_id', *STAT_FIELDS):
+        stats[row.pop('scope_id')] = row
+    return stats
+
+
+# حقول التجميع لكل نطاق عند إعادة البناء من بيانات الناخبين
+SCOPE_GROUP_FIELDS = {
+    'entity': 'entity_id',
+    'candidate': 'candidate_id',
+    'pillar': 'pillar_id',
+}
+
+
+def compute_rollups():
+    """
+    حساب الإحصائيات المجمعة من جدول الناخبين مباشرة (الحقيقة المرجعية)
+    يرجع (العدادات، العناصر) مفهرسة بالنطاق
+    """
+    aggregates = {
+        'total_voters': Count('id'),
+        'voted': Count('id', filter=Q(voting_status='voted')),
+        'not_voted': Count('id', filter=Q(voting_status='not_voted')),
+        'updated_cards': Count('id', filter=Q(card_status='updated')),
+        'not_updated_cards': Count('id', filter=Q(card_status='not_updated')),
+    }
+    voters = Voter.objects.order_by()
+    counts = {}
+    members = {}
+    groupings = [('admin', None)] + list(SCOPE_GROUP_FIELDS.items())
+    for scope, field in groupings:
+        if field is None:
+            counts[(scope, 0)] = voters.aggregate(**aggregates)
+        else:
+            for row in voters.values(field).annotate(**aggregates):
+                counts[(scope, row.pop(field))] = row
+        for kind, value_field in MEMBER_FIELDS.items():
+            fields = [value_field] if field is None else [field, value_field]
+            for row in voters.values(*fields).annotate(n=Count('id')):
+                key = (scope, row[field] if field else 0)
+                members[(key, kind, str(row[value_field]))] = row['n']
+    for key, row in counts.items():
+        for kind, stat in MEMBER_KINDS.items():
+            row[stat] = 0
+    for (key, kind, value), n in members.items():
+        counts[key][MEMBER_KINDS[kind]] += 1
+    # نطاق الإدارة بلا ناخبين لا يحتاج صفاً
+    if not counts[('admin', 0)]['total_voters']:
+        del counts[('admin', 0)]
+    return counts, members
+
+
+def compute_turnout():
+    """عدد المصوتين في كل (نطاق، فترة) من أوقات التصويت في جدول الناخبين"""
+    buckets = defaultdict(int)
+    voters = Voter.objects.filter(voting_status='voted', voted_at__isnull=False).order_by()
+    for entity_id, candidate_id, pillar_id, voted_at in voters.values_list(
+            'entity_id', 'candidate_id', 'pillar_id', 'voted_at').iterator(chunk_size=5000):
+        bucket = turnout_bucket(voted_at)
+        for key in (('admin', 0), ('entity', entity_id), ('candidate', candidate_id), ('pillar', pillar_id)):
+            buckets[key + (bucket,)] += 1
+    return buckets
+
+
+def turnout_series(scope, scope_id=0, since=None):
+    """منحنى المشاركة للنطاق: [(بداية الفترة، المصوتون فيها)] مرتبة بالوقت"""
+    buckets = TurnoutBucket.objects.filter(scope=scope, scope_id=scope_id or 0, voted__gt=0)
+    if since is not None:
+        buckets = buckets.filter(bucket__gte=since)
+    return list(buckets.order_by('bucket').values_list('bucket', 'voted'))
+
+
+@transaction.atomic
+def rebuild_rollups():
+    """إعادة بناء جداول الإحصائيات المجمعة بالكامل من بيانات الناخبين"""
+    counts, members = compute_rollups()
+    stored = VoterRollup.objects.values_list('scope', 'scope_id')
+    invalidate_scopes(set(counts) | set(stored))
+    VoterRollup.objects.all().delete()
+    VoterRollupMember.objects.all().delete()
+    VoterRollup.objects.bulk_create(
+        [VoterRollup(scope=scope, scope_id=scope_id, **row) for (scope, scope_id), row in counts.items()],
+        batch_size=500,
+    )
+    VoterRollupMember.objects.bulk_create(
+        [VoterRollupMember(scope=scope, scope_id=scope_id, kind=kind, value=value, voters=n)
+         for ((scope, scope_id), kind, value), n in members.items()],
+        batch_size=500,
+    )
+    TurnoutBucket.objects.all().delete()
+    TurnoutBucket.objects.bulk_create(
+        [TurnoutBucket(scope=scope, scope_id=scope_id, bucket=bucket, voted=n)
+         for (scope, scope_id, bucket), n in compute_turnout().items()],
+        batch_size=500,
+    )
+    return len(counts)
+
+
+def check_rollups():
+    """
+    مقارنة الجداول المجمعة بالحقيقة المرجعية
+    يرجع قائمة (النطاق، المعرف، الحقل، المخزن، الصحيح) لكل اختلاف
+    """
+    counts, _ = compute_rollups()
+    stored = {
+        (row.pop('scope'), row.pop('scope_id')): row
+        for row in VoterRollup.objects.values('scope', 'scope_id', *STAT_FIELDS)
+    }
+    mismatches = []
+    for key in set(counts) | set(stored):
+        expected = counts.get(key, _empty_stats())
+        actual = stored.get(key, _empty_stats())
+        for field in STAT_FIELDS:
+            if expected[field] != actual[field]:
+                mismatches.append((key[0], key[1], field, actual[field], expected[field]))
+    return sorted(mismatches)
@@ -0,0 +1,178 @@
+"""
+البحث في الناخبين (الاسم، رقم الناخب، الهاتف) عبر جدول SQLite FTS5
+
+الجدول elections_voter_fts يحفظ نسخة مطبّعة من نصوص الناخب (توحيد الألف
+والهمزات، التاء المربوطة والهاء، الياء والألف المقصورة، وحذف التشكيل
+والتطويل) بمُقسِّم trigram، فيجد "احمد" الاسم "أحمد" دون مسح جدول الناخبين.
+يُحدَّث الجدول من إشارات حفظ الناخبين (signals.py)، ويحذف قادح AFTER DELETE
+صفوف الناخبين المحذوفين (فيبقى حذف ناخبي ركيزة كاملة جملة واحدة)، ومع قواعد
+بيانات غير SQLite يعود البحث إلى icontains.
+
+نص البحث الرقمي (رقم الناخب أو الهاتف المطبوع على البطاقة) لا يمر بجدول البحث:
+يُبحث ببادئة رقم الناخب على فهرسه الفريد، وبآخر أرقام الهاتف على عمود الهاتف
+المعكوس phone_reversed المفهرس.
+"""
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'elections_voter_fts'
+# حقول الناخب المفهرسة بالترتيب نفسه لأعمدة جدول البحث
+INDEXED_FIELDS = ('name', 'voter_number', 'phone_number')
+DELETE_TRIGGER = f'{FTS_TABLE}_delete'
+# إعادة بناء جدول الناخبين في ترحيلات SQLite تحذف قوادحه، فيُعاد إنشاؤه مع إعادة بناء الفهرس
+DELETE_TRIGGER_SQL = (
+    f'CREATE TRIGGER IF NOT EXISTS {DELETE_TRIGGER} AFTER DELETE ON elections_voter '
+    f'BEGIN DELETE FROM {FTS_TABLE} WHERE rowid = old.id; END'
+)
+# أقل طول يستطيع مُقسِّم trigram البحث به
+MIN_QUERY_LENGTH = 3
+
+_DIACRITICS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+_FOLD = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ؤ': 'و', 'ئ': 'ي',
+    'ة': 'ه',
+    'ى': 'ي',
+    # الأرقام العربية الهندية والفارسية إلى أرقام لاتينية
+    **{chr(0x0660 + d): str(d) for d in range(10)},
+    **{chr(0x06f0 + d): str(d) for d in range(10)},
+})
+_SPACES = re.compile(r'\s+')
+_NON_DIGITS = re.compile(r'\D')
+# مفتاح الدولة للهواتف العراقية (+964 7701234567 = 07701234567)
+COUNTRY_CODE = '964'
+# أقل عدد أرقام يُعامل كبحث برقم الناخب أو الهاتف
+MIN_NUMBER_LENGTH = 4
+
+
+def normalize_arabic(text):
+    """تطبيع النص العربي للبحث"""
+    if not text:
+        return ''
+    text = _DIACRITICS.sub('', str(text)).translate(_FOLD)
+    return _SPACES.sub(' ', text).strip().lower()
+
+
+def normalize_phone(phone):
+    """أرقام الهاتف فقط بصيغة محلية تبدأ بصفر"""
+    digits = _NON_DIGITS.sub('', str(phone or '').translate(_FOLD))
+    if digits.startswith('00' + COUNTRY_CODE):
+        digits = digits[2:]
+    if digits.startswith(COUNTRY_CODE) and len(digits) > 10:
+        digits = '0' + digits[len(COUNTRY_CODE):]
+    # رقم محمول بلا صفره الأول (ملفات CSV وخلايا Excel النصية): 7701234567
+    if len(digits) == 10 and digits.startswith('7'):
+        digits = '0' + digits
+    return digits
+
+
+def reversed_phone(phone):
+    """الهاتف المطبّع معكوساً: البحث بآخر الأرقام يصبح بحثاً ببادئة على الفهرس"""
+    return normalize_phone(phone)[::-1]
+
+
+def numeric_query(query):
+    """أرقام نص البحث إن كان رقماً (مع مسافات أو شرطات أو +)، وإلا None"""
+    text = _SPACES.sub('', str(query).translate(_FOLD)).replace('-', '').lstrip('+')
+    return text if len(text) >= MIN_NUMBER_LENGTH and text.isdigit() else None
+
+
+def prefix_range(field, prefix):
+    """
+    شرط بادئة كنطاق (field >= prefix AND field < prefix التالية) يمر بالفهرس؛
+    LIKE في SQLite لا يستعمل الفهرس لأنه غير حساس لحالة الأحرف ومع ESCAPE
+    """
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': upper})
+
+
+def number_filter(digits):
+    """رقم الناخب مطابقاً أو ببادئته، أو الهاتف بآخر أرقامه (أو كاملاً بصيغته المحلية)"""
+    return prefix_range('voter_number', digits) | prefix_range('phone_reversed', reversed_phone(digits))
+
+
+def fts_available():
+    return connection.vendor == 'sqlite'
+
+
+def _row(voter):
+    return [voter.pk] + [normalize_arabic(getattr(voter, field)) for field in INDEXED_FIELDS]
+
+
+def index_voters(voters):
+    """إضافة الناخبين إلى جدول البحث أو تحديثهم فيه"""
+    if not fts_available():
+        return
+    rows = [_row(voter) for voter in voters]
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [[row[0]] for row in rows])
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, {", ".join(INDEXED_FIELDS)}) VALUES (%s, %s, %s, %s)', rows)
+
+
+def rebuild_index():
+    """إعادة بناء جدول البحث بالكامل من جدول الناخبين"""
+    from .models import Voter
+    if not fts_available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(DELETE_TRIGGER_SQL)
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    count = 0
+    batch = []
+    for voter in Voter.objects.only(*INDEXED_FIELDS).iterator(chunk_size=5000):
+        batch.append(voter)
+        if len(batch) == 5000:
+            count += len(batch)
+            index_voters(batch)
+            batch = []
+    count += len(batch)
+    index_voters(batch)
+    return count
+
+
+def match_expression(query):
+    """عبارة MATCH لنص البحث المطبّع (كعبارة واحدة بين علامتي تنصيص)"""
+    return '"' + query.replace('"', '""') + '"'
+
+
+def _use_fts(normalized):
+    return fts_available() and len(normalized) >= MIN_QUERY_LENGTH
+
+
+def search_filter(query):
+    """
+    شرط Q لنص البحث: الأرقام على فهرسي رقم الناخب والهاتف المعكوس، والنص من جدول
+    البحث، أو icontains للنص القصير والقواعد الأخرى
+    """
+    digits = numeric_query(query)
+    if digits is not None:
+        return number_filter(digits)
+    normalized = normalize_arabic(query)
+    if not _use_fts(normalized):
+        return Q(name__icontains=query) | Q(voter_number__icontains=query) | Q(phone_number__icontains=query)
+    return Q(pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+                           [match_expression(normalized)]))
+
+
+def search_voters(voters, query):
+    """
+    تصفية ناخبين بنص البحث مع إضافة search_rank (أقل = أكثر صلة) عند البحث في الجدول
+    يحافظ على تصفية النطاق الموجودة في voters
+    """
+    normalized = normalize_arabic(query)
+    if not normalized:
+        return voters
+    voters = voters.filter(search_filter(query))
+    if numeric_query(query) is not None or not _use_fts(normalized):
+        return voters
+    table = voters.model._meta.db_table
+    rank = RawSQL(
+        f'SELECT rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = "{table}"."id"',
+        [match_expression(normalized)], output_field=FloatField())
+    return voters.annotate(search_rank=rank)
@@ -0,0 +1,139 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from .models import Entity, Candidate, Pillar, Voter, PollingCenter, AppearanceSettings
+from . import rollups, search
+from .events import publish_changes
+from .stats_cache import invalidate_scopes
+
+
+# تحديث الإحصائيات المجمعة عند تعديل الناخبين
+@receiver(pre_save, sender=Voter)
+def capture_voter_snapshot(sender, instance, raw=False, **kwargs):
+    instance._rollup_snapshot = None if raw or instance.pk is None else rollups.stored_snapshot(instance.pk)
+
+
+@receiver(post_save, sender=Voter)
+def update_rollups_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old = getattr(instance, '_rollup_snapshot', None)
+    new = rollups.voter_snapshot(instance)
+    rollups.record_voter_change(old, new)
+    instance._rollup_snapshot = new
+
+
+# حذف الناخبين لا يمر بالإشارات حتى يحذفهم Django بجملة واحدة: Voter.delete و
+# VoterQuerySet.delete يطرحان إحصائياتهم، وحذف ركيزة (أو مرشح أو كيان) يطرح مساهمة
+# الركيزة كاملة، وقادح في القاعدة يحذفهم من جدول البحث
+
+
+# تحديث جدول البحث عند تعديل نصوص الناخب أو حذفه
+@receiver(post_save, sender=Voter)
+def index_voter_on_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not set(update_fields) & set(search.INDEXED_FIELDS)):
+        return
+    search.index_voters([instance])
+
+
+# حذف المرشح أو الكيان يحذف ركائزه أولاً، فتُطرح المساهمات ركيزةً ركيزة
+@receiver(pre_delete, sender=Pillar)
+def remove_pillar_rollups(sender, instance, **kwargs):
+    rollups.remove_pillar(instance)
+
+
+@receiver(post_delete, sender=Candidate)
+def remove_candidate_rollups(sender, instance, **kwargs):
+    rollups.delete_scope('candidate', instance.pk)
+
+
+@receiver(post_delete, sender=Entity)
+def remove_entity_rollups(sender, instance, **kwargs):
+    rollups.delete_scope('entity', instance.pk)
+
+
+# إبطال الإحصائيات المخزنة مؤقتاً وإشعار البث المباشر عند تغير أعداد الكيانات والمرشحين والركائز
+def scopes_changed(keys):
+    invalidate_scopes(keys)
+    publish_changes({key: {} for key in keys})
+
+
+@receiver(post_save, sender=Pillar)
+@receiver(post_delete, sender=Pillar)
+def invalidate_pillar_scopes(sender, instance, **kwargs):
+    keys = [
+        ('admin', 0),
+        ('entity', rollups.candidate_entity_id(instance.candidate_id)),
+        ('candidate', instance.candidate_id),
+        ('pillar', instance.pk),
+    ]
+    old_candidate_id = getattr(instance, '_old_candidate_id', None)
+    if old_candidate_id is not None and old_candidate_id != instance.candidate_id:
+        keys += [('candidate', old_candidate_id), ('entity', rollups.candidate_entity_id(old_candidate_id))]
+    scopes_changed(keys)
+
+
+@receiver(post_save, sender=Candidate)
+@receiver(post_delete, sender=Candidate)
+def invalidate_candidate_scopes(sender, instance, **kwargs):
+    keys = [('admin', 0), ('entity', instance.entity_id), ('candidate', instance.pk)]
+    old_entity_id = getattr(instance, '_old_entity_id', None)
+    if old_entity_id is not None:
+        keys.append(('entity', old_entity_id))
+    scopes_changed(keys)
+
+
+@receiver(post_save, sender=Entity)
+@receiver(post_delete, sender=Entity)
+def invalidate_entity_scopes(sender, instance, **kwargs):
+    scopes_changed([('admin', 0), ('entity', instance.pk)])
+
+
+# نقل إحصائيات المرشح عند تغيير كيانه
+@receiver(pre_save, sender=Candidate)
+def capture_candidate_entity(sender, instance, raw=False, **kwargs):
+    instance._old_entity_id = None
+    if not raw and instance.pk is not None:
+        instance._old_entity_id = rollups.candidate_entity_id(instance.pk)
+
+
+@receiver(post_save, sender=Candidate)
+def move_candidate_voters(sender, instance, raw=False, **kwargs):
+    old_entity_id = getattr(instance, '_old_entity_id', None)
+    if old_entity_id is not None and old_entity_id != instance.entity_id:
+        Voter.objects.filter(candidate_id=instance.pk).update(entity_id=instance.entity_id)
+        rollups.move_candidate(instance.pk, old_entity_id, instance.entity_id)
+
+
+# نقل ناخبي الركيزة وإحصائياتها عند تغيير مرشحها
+@receiver(pre_save, sender=Pillar)
+def capture_pillar_candidate(sender, instance, raw=False, **kwargs):
+    instance._old_candidate_id = None
+    if not raw and instance.pk is not None:
+        instance._old_candidate_id = Pillar.objects.filter(pk=instance.pk).values_list(
+            'candidate_id', flat=True).first()
+
+
+@receiver(post_save, sender=Pillar)
+def move_pillar_voters(sender, instance, raw=False, **kwargs):
+    old_candidate_id = getattr(instance, '_old_candidate_id', None)
+    if old_candidate_id is None or old_candidate_id == instance.candidate_id:
+        return
+    old_entity_id = rollups.candidate_entity_id(old_candidate_id)
+    new_entity_id = rollups.candidate_entity_id(instance.candidate_id)
+    Voter.objects.filter(pillar_id=instance.pk).update(candidate_id=instance.candidate_id, entity_id=new_entity_id)
+    rollups.move_pillar(instance.pk, old_candidate_id, old_entity_id, instance.candidate_id, new_entity_id)
+
+
+# تعديل أسماء المراكز يغير قوائم التصفية في كل النطاقات (انظر statistics.scope_facets)
+@receiver(post_save, sender=PollingCenter)
+@receiver(post_delete, sender=PollingCenter)
+def invalidate_location_facets(sender, instance, **kwargs):
+    invalidate_scopes([('locations', 0)])
+
+
+# إعدادات المظهر تؤثر على كل الصفحات المخزنة لدى المتصفح (انظر conditional.py)
+@receiver(post_save, sender=AppearanceSettings)
+@receiver(post_delete, sender=AppearanceSettings)
+def invalidate_appearance(sender, instance, **kwargs):
+    invalidate_scopes([('appearance', 0)])
@@ -0,0 +1,93 @@
+// استبدال أجزاء الصفحة (جدول الناخبين، بطاقات الإحصائيات) بدلاً من إعادة تحميلها كاملة.
+// الحاوية تحمل data-fragment="اسم الجزء"، والخادم يعرض الجزء وحده عند ?fragment=الاسم.
+function fragmentUrl(url, name) {
+    const target = new URL(url, window.location.href);
+    target.searchParams.set('fragment', name);
+    return target;
+}
+
+// روابط التصدير تتبع البحث والتصفية الحالية
+function updateExportLinks(url) {
+    const params = new URL(url, window.location.href).searchParams;
+    document.querySelectorAll('a[data-export-format]').forEach(function(link) {
+        const query = new URLSearchParams(params);
+        query.set('format', link.dataset.exportFormat);
+        link.href = link.href.split('?')[0] + '?' + query.toString();
+    });
+}
+
+function loadFragment(container, url) {
+    container.classList.add('opacity-50');
+    return fetch(fragmentUrl(url, container.dataset.fragment), {credentials: 'same-origin'})
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            return response.text();
+        })
+        .then(html => {
+            container.innerHTML = html;
+            history.replaceState(null, '', url);
+            updateExportLinks(url);
+        })
+        .catch(error => console.log('خطأ في تحميل البيانات:', error))
+        .finally(() => container.classList.remove('opacity-50'));
+}
+
+// روابط التصفح داخل الحاوية
+function bindFragmentLinks(container) {
+    container.addEventListener('click', function(event) {
+        const link = event.target.closest('a.page-link');
+        if (link && container.contains(link)) {
+            event.preventDefault();
+            loadFragment(container, link.href);
+        }
+    });
+}
+
+// نموذج التصفية: يُطبق عند التغيير، وبعد توقف الكتابة في حقول النص، وزر data-fragment-clear يمسحه
+function bindFragmentForm(form) {
+    const container = document.getElementById(form.dataset.fragmentTarget);
+    let timer = null;
+    const apply = function() {
+        const params = new URLSearchParams(new FormData(form));
+        for (const [name, value] of Array.from(params.entries())) {
+            if (!value) {
+                params.delete(name);
+            }
+        }
+        const query = params.toString();
+        loadFragment(container, window.location.pathname + (query ? '?' + query : ''));
+    };
+    form.addEventListener('submit', function(event) {
+        event.preventDefault();
+        apply();
+    });
+    form.addEventListener('change', function(event) {
+        if (event.target.type !== 'text') {
+            apply();
+        }
+    });
+    form.addEventListener('input', function(event) {
+        if (event.target.type === 'text') {
+            clearTimeout(timer);
+            timer = setTimeout(apply, 400);
+        }
+    });
+    form.querySelectorAll('[data-fragment-clear]').forEach(function(button) {
+        button.addEventListener('click', function() {
+            form.querySelectorAll('input, select').forEach(field => field.value = '');
+            apply();
+        });
+    });
+}
+
+// استبدال صف جدول بصف يعرضه الخادم
+function replaceRow(row, html) {
+    if (!row) {
+        return;
+    }
+    const template = document.createElement('template');
+    template.innerHTML = html.trim();
+    row.replaceWith(template.content.firstElementChild);
+}
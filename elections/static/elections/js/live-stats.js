@@ -0,0 +1,58 @@
+// تحديث أرقام الإحصائيات في لوحات التحكم من واجهة الإحصائيات (JSON)
+// بدلاً من إعادة تحميل الصفحة كاملة وتحليلها.
+// العناصر المراد تحديثها تحمل data-stat="اسم الإحصائية"، ويمكن إضافة
+// data-stat-suffix="%" للنسب، وdata-stat-width لأشرطة التقدم.
+function applyStats(stats) {
+    document.querySelectorAll('[data-stat]').forEach(function(element) {
+        const value = stats[element.dataset.stat];
+        if (value !== undefined) {
+            element.textContent = value + (element.dataset.statSuffix || '');
+        }
+    });
+    document.querySelectorAll('[data-stat-width]').forEach(function(element) {
+        const value = stats[element.dataset.statWidth];
+        if (value !== undefined) {
+            element.style.width = value + '%';
+            element.setAttribute('aria-valuenow', value);
+        }
+    });
+}
+
+function updateStats(url) {
+    return fetch(url, {headers: {'Accept': 'application/json'}, credentials: 'same-origin'})
+        .then(response => response.ok ? response.json() : null)
+        .then(data => {
+            if (data && data.stats) {
+                applyStats(data.stats);
+            }
+        })
+        .catch(error => console.log('خطأ في تحديث البيانات:', error));
+}
+
+function startPolling(url, interval) {
+    setInterval(function() {
+        // لا داعي للتحديث والصفحة غير ظاهرة
+        if (!document.hidden) {
+            updateStats(url);
+        }
+    }, interval || 30000);
+}
+
+// البث المباشر (Server-Sent Events) عند توفره، مع العودة للتحديث الدوري إن أُغلق
+function startLiveStats(url, interval, streamUrl) {
+    if (!streamUrl || !window.EventSource) {
+        startPolling(url, interval);
+        return;
+    }
+    const source = new EventSource(streamUrl);
+    const onMessage = function(event) {
+        applyStats(JSON.parse(event.data));
+    };
+    source.addEventListener('snapshot', onMessage);
+    source.addEventListener('delta', onMessage);
+    source.addEventListener('error', function() {
+        if (source.readyState === EventSource.CLOSED) {
+            startPolling(url, interval);
+        }
+    });
+}
@@ -0,0 +1,30 @@
+// منحنى المشاركة التراكمي من واجهة فترات التصويت (Chart.js)
+function startTurnoutChart(canvas, url, interval) {
+    let chart = null;
+    const draw = function(data) {
+        const labels = data.buckets.map(row => new Date(row[0]).toLocaleTimeString('ar-IQ', {hour: '2-digit', minute: '2-digit'}));
+        const values = data.buckets.map(row => row[2] + data.untimed);
+        if (chart) {
+            chart.data.labels = labels;
+            chart.data.datasets[0].data = values;
+            chart.update();
+            return;
+        }
+        chart = new Chart(canvas, {
+            type: 'line',
+            data: {labels: labels, datasets: [{label: 'المصوتون', data: values, fill: true, tension: 0.3}]},
+            options: {plugins: {legend: {display: false}}, scales: {y: {beginAtZero: true}}}
+        });
+    };
+    const load = function() {
+        if (document.hidden) {
+            return;
+        }
+        fetch(url, {credentials: 'same-origin'})
+            .then(response => response.ok ? response.json() : null)
+            .then(data => data && draw(data))
+            .catch(error => console.log('خطأ في تحميل منحنى المشاركة:', error));
+    };
+    load();
+    setInterval(load, interval || 60000);
+}
@@ -0,0 +1,199 @@
+from collections import defaultdict
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Count, Q
+from django.utils.functional import cached_property
+from .models import Entity, Candidate, Pillar, Voter
+from .rollups import rollup_map, rollup_stats
+from .search import search_voters
+from .stats_cache import cached_scope_data, scope_version
+
+
+def user_scope(user):
+    """نطاق إحصائيات المستخدم حسب نوعه: (النطاق، المعرف) أو None إن لم يكن له ملف مرتبط"""
+    try:
+        if user.user_type == 'admin':
+            return ('admin', 0)
+        if user.user_type == 'entity':
+            return ('entity', user.entity_profile.pk)
+        if user.user_type == 'candidate':
+            return ('candidate', user.candidate_profile.pk)
+        if user.user_type == 'pillar':
+            return ('pillar', user.pillar_profile.pk)
+    except ObjectDoesNotExist:
+        pass
+    return None
+
+
+def scope_voters(scope, scope_id=None):
+    """الناخبون ضمن نطاق معين"""
+    if scope == 'admin':
+        return Voter.objects.all()
+    if scope == 'entity':
+        return Voter.objects.filter(entity_id=scope_id)
+    if scope == 'candidate':
+        return Voter.objects.filter(candidate_id=scope_id)
+    if scope == 'pillar':
+        return Voter.objects.filter(pillar_id=scope_id)
+    raise ValueError(f'نطاق غير معروف: {scope}')
+
+
+# منازل النسب العشرية لكل نطاق (لوحة الإدارة تعرضها بمنزلتين، وبقية اللوحات بمنزلة)
+PERCENTAGE_DIGITS = {'admin': 2}
+
+
+def with_percentages(stats, digits=1):
+    """إضافة نسب التصويت وتحديث البطاقات إلى قاموس الإحصائيات"""
+    total = stats['total_voters']
+    stats['voting_percentage'] = round(stats['voted'] / total * 100, digits) if total else 0
+    stats['update_percentage'] = round(stats['updated_cards'] / total * 100, digits) if total else 0
+    return stats
+
+
+def scope_stats(scope, scope_id=None):
+    """إحصائيات النطاق من الذاكرة المؤقتة، تُعاد حسابها فقط بعد تغير بيانات النطاق"""
+    return cached_scope_data('stats', scope, scope_id, lambda: compute_scope_stats(scope, scope_id))
+
+
+def compute_scope_stats(scope, scope_id=None):
+    """
+    إحصائيات النطاق كاملة: الناخبون (من الجداول المجمعة) إضافة إلى أعداد
+    الكيانات والمرشحين والركائز
+    """
+    stats = with_percentages(dict(rollup_stats(scope, scope_id)), PERCENTAGE_DIGITS.get(scope, 1))
+    if scope == 'admin':
+        stats['total_entities'] = Entity.objects.count()
+        stats['total_candidates'] = Candidate.objects.count()
+        stats['total_pillars'] = Pillar.objects.count()
+    elif scope == 'entity':
+        stats['total_candidates'] = Candidate.objects.filter(entity_id=scope_id).count()
+        stats['total_pillars'] = Pillar.objects.filter(candidate__entity_id=scope_id).count()
+    elif scope == 'candidate':
+        stats['total_pillars'] = Pillar.objects.filter(candidate_id=scope_id).count()
+    return stats
+
+
+# حقول المركز التي تُعرض كقوائم تصفية
+FACET_FIELDS = ('governorate', 'district', 'sub_district')
+
+
+def scope_facets(scope, scope_id=None):
+    """
+    قيم قوائم التصفية في النطاق مع عدد ناخبي كل قيمة: {الحقل: [(القيمة، العدد)، ...]}
+    تُخزن مؤقتاً وتُبطل مع إحصائيات النطاق عند أي كتابة على ناخبيه، أو عند تعديل المراكز
+    """
+    name = f'facets:{scope_version("locations")}'
+    return cached_scope_data(name, scope, scope_id, lambda: compute_scope_facets(scope, scope_id))
+
+
+def compute_scope_facets(scope, scope_id=None):
+    """حساب قوائم التصفية من تجميع واحد لناخبي النطاق حسب موقع المركز"""
+    fields = {field: f'polling_center__{field}' for field in FACET_FIELDS}
+    facets = {field: defaultdict(int) for field in FACET_FIELDS}
+    for row in scope_voters(scope, scope_id).order_by().values(*fields.values()).annotate(n=Count('id')):
+        for field, path in fields.items():
+            if row[path]:
+                facets[field][row[path]] += row['n']
+    return {field: sorted(counts.items()) for field, counts in facets.items()}
+
+
+def attach_rollups(objects, scope):
+    """إضافة إحصائيات الناخبين المجمعة كخصائص على كل مرشح/ركيزة (استعلام واحد للجميع)"""
+    objects = list(objects)
+    stats = rollup_map(scope, [obj.pk for obj in objects])
+    for obj in objects:
+        row = stats[obj.pk]
+        obj.voters_count = row['total_voters']
+        obj.voted_count = row['voted']
+        obj.not_voted_count = row['not_voted']
+        obj.updated_count = row['updated_cards']
+    return objects
+
+
+def candidate_stats(candidates):
+    """قائمة إحصائيات المرشحين مع نسبة التصويت، بالشكل المستخدم في لوحة الكيان"""
+    candidates = candidates.select_related('user').annotate(pillars_count=Count('pillars'))
+    return [{
+        'candidate': candidate,
+        'voters_count': candidate.voters_count,
+        'voted_count': candidate.voted_count,
+        'not_voted_count': candidate.not_voted_count,
+        'updated_count': candidate.updated_count,
+        'pillars_count': candidate.pillars_count,
+        'voting_percentage': round(candidate.voted_count / candidate.voters_count * 100, 1)
+        if candidate.voters_count else 0,
+    } for candidate in attach_rollups(candidates, 'candidate')]
+
+
+# العداد المجمّع الذي يساوي إجمالي القائمة عند تصفية النطاق بحالة واحدة فقط
+STATUS_TOTALS = {
+    None: 'total_voters',
+    ('voting_status', 'voted'): 'voted',
+    ('voting_status', 'not_voted'): 'not_voted',
+    ('card_status', 'updated'): 'updated_cards',
+    ('card_status', 'not_updated'): 'not_updated_cards',
+}
+
+
+class VoterResultSet:
+    """
+    قائمة ناخبي نطاق مع تصفيتها، تُحسب أعدادها مرة واحدة:
+    الإجمالي وتوزيع حالة التصويت في استعلام تجميعي واحد، أو من الإحصائيات
+    المجمعة (المخزنة مؤقتاً) إن لم يُطبق على النطاق أي فلتر غير الحالة
+    """
+
+    def __init__(self, scope, scope_id=0, status=None, use_rollups=True):
+        self.scope = scope
+        self.scope_id = scope_id
+        self.status = status
+        self.use_rollups = use_rollups
+        self.filtered = False
+        self.voters = scope_voters(scope, scope_id)
+        if status is not None:
+            self.voters = self.voters.filter(**{status[0]: status[1]})
+
+    def filter(self, *args, **kwargs):
+        self.voters = self.voters.filter(*args, **kwargs)
+        self.filtered = True
+        self.__dict__.pop('counts', None)
+        return self
+
+    def search(self, query):
+        """البحث بالاسم أو رقم الناخب أو الهاتف (انظر search.search_voters)"""
+        if query:
+            self.voters = search_voters(self.voters, query)
+            self.filtered = True
+            self.__dict__.pop('counts', None)
+        return self
+
+    @property
+    def ordering(self):
+        """حقول الترتيب للتصفح: حسب الصلة عند البحث في جدول البحث وإلا None"""
+        return ('search_rank', 'id') if 'search_rank' in self.voters.query.annotations else None
+
+    def _rollup_stats(self):
+        if self.filtered or not self.use_rollups:
+            return None
+        return scope_stats(self.scope, self.scope_id)
+
+    @property
+    def total(self):
+        stats = self._rollup_stats()
+        if stats is not None and 'counts' not in self.__dict__:
+            return stats[STATUS_TOTALS[self.status]]
+        return self.counts['total']
+
+    @cached_property
+    def counts(self):
+        """{'total', 'voted', 'not_voted'} للقائمة المصفاة"""
+        stats = self._rollup_stats()
+        if stats is not None and self.status is None:
+            return {'total': stats['total_voters'], 'voted': stats['voted'], 'not_voted': stats['not_voted']}
+        if stats is not None and self.status[0] == 'voting_status':
+            total = stats[self.status[1]]
+            return {'total': total, 'voted': 0, 'not_voted': 0, self.status[1]: total}
+        return self.voters.order_by().aggregate(
+            total=Count('id'),
+            voted=Count('id', filter=Q(voting_status='voted')),
+            not_voted=Count('id', filter=Q(voting_status='not_voted')),
+        )
@@ -0,0 +1,120 @@
+"""
+تخزين مؤقت لإحصائيات لوحات التحكم مفهرس بالنطاق ورقم إصدار
+
+لكل نطاق (الإدارة، كيان، مرشح، ركيزة) رقم إصدار في الذاكرة المؤقتة يتغير
+عند كل كتابة تمس ناخبي النطاق، ومفتاح البيانات المخزنة يتضمن هذا الرقم؛
+فتغيير الإصدار يُبطل بيانات ذلك النطاق وحده دون مسح بقية الذاكرة المؤقتة.
+
+يعمل مع أي واجهة من واجهات Django للتخزين المؤقت، لكن الذاكرة المحلية خاصة بكل
+عملية: مع عدة عمليات للخادم لا ترى العمليات الأخرى تغيير الإصدار. لذلك تنتهي
+أرقام الإصدارات بعد VERSION_TIMEOUT ثانية فيبدأ النطاق بإصدار جديد، وهي أقصى مدة
+قد تُعرض فيها إحصائيات قديمة. مع ذاكرة مشتركة (Redis أو Memcached) يمكن ضبط
+ELECTIONS_STATS_VERSION_TIMEOUT = None.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+KEY_PREFIX = 'elections'
+# مدة حفظ البيانات المحسوبة (بالثواني)، والبيانات تُبطل قبل ذلك عند تغير الإصدار
+STATS_TIMEOUT = getattr(settings, 'ELECTIONS_STATS_CACHE_TIMEOUT', 300)
+# أقصى مدة ينتظرها الطلب حتى يُكمل طلب آخر حساب نفس البيانات
+LOCK_TIMEOUT = 5
+# مدة صلاحية أرقام الإصدارات (بالثواني)، None بلا انتهاء مع ذاكرة مؤقتة مشتركة
+VERSION_TIMEOUT = getattr(settings, 'ELECTIONS_STATS_VERSION_TIMEOUT', 60)
+LOCK_WAIT = 0.05
+
+
+def get_cache():
+    return caches[getattr(settings, 'ELECTIONS_STATS_CACHE', 'default')]
+
+
+def _version_key(scope, scope_id):
+    return f'{KEY_PREFIX}:version:{scope}:{scope_id or 0}'
+
+
+def scope_version(scope, scope_id=0):
+    """
+    رقم الإصدار الحالي للنطاق (توقيت آخر تغيير بالنانو ثانية)
+    عند غيابه من الذاكرة المؤقتة يبدأ بالتوقيت الحالي فلا يتطابق مع بيانات قديمة
+    """
+    cache = get_cache()
+    key = _version_key(scope, scope_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=VERSION_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+def scope_versions(keys):
+    """أرقام إصدارات عدة نطاقات دفعة واحدة"""
+    cache = get_cache()
+    version_keys = {key: _version_key(*key) for key in keys}
+    found = cache.get_many(version_keys.values())
+    return {key: found.get(vkey) or scope_version(*key) for key, vkey in version_keys.items()}
+
+
+def bump_scopes(keys):
+    """تغيير إصدار النطاقات المحددة لإبطال بياناتها المخزنة"""
+    keys = set(keys)
+    if not keys:
+        return
+    cache = get_cache()
+    version_keys = [_version_key(*key) for key in keys]
+    current = cache.get_many(version_keys)
+    now = time.time_ns()
+    cache.set_many({
+        vkey: max(now, current.get(vkey, 0) + 1) for vkey in version_keys
+    }, timeout=VERSION_TIMEOUT)
+
+
+def invalidate_scopes(keys):
+    """
+    إبطال النطاقات فوراً ثم مرة أخرى بعد اعتماد المعاملة، حتى لا تبقى قيمة حسبها
+    طلب آخر قبل الاعتماد مخزنة تحت الإصدار الجديد
+    """
+    keys = {key for key in keys if key[1] is not None}
+    bump_scopes(keys)
+    transaction.on_commit(lambda: bump_scopes(keys))
+
+
+def content_scope(key):
+    """
+    نطاق إصدار محتوى قوائم النطاق: يتغير مع كل كتابة على ناخبيه (الاسم أو الهاتف
+    مثلاً) حتى إن لم يتغير أي عداد، فلا يُبطل الإحصائيات المخزنة لكنه يغير وسم الصفحة
+    """
+    return (f'{key[0]}_content', key[1])
+
+
+def invalidate_content(keys):
+    invalidate_scopes(content_scope(key) for key in keys)
+
+
+def cached_scope_data(name, scope, scope_id, compute, timeout=None):
+    """
+    قراءة بيانات نطاق من الذاكرة المؤقتة أو حسابها مرة واحدة عند تغير الإصدار؛
+    الطلبات المتزامنة تنتظر من يحسبها بدلاً من تكرار الحساب
+    """
+    cache = get_cache()
+    version = scope_version(scope, scope_id)
+    key = f'{KEY_PREFIX}:{name}:{scope}:{scope_id or 0}:{version}'
+    value = cache.get(key)
+    if value is not None:
+        return value
+    lock_key = f'{key}:lock'
+    if not cache.add(lock_key, 1, timeout=LOCK_TIMEOUT):
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_WAIT)
+            value = cache.get(key)
+            if value is not None:
+                return value
+    try:
+        value = compute()
+        cache.set(key, value, timeout=STATS_TIMEOUT if timeout is None else timeout)
+    finally:
+        cache.delete(lock_key)
+    return value
@@ -1,3 +1,1148 @@
-from django.test import TestCase
+import asyncio
+import csv
+import datetime
+import io
+import json
+import tempfile
+import time
+from unittest import mock
 
-# Create your tests here.
+import openpyxl
+from asgiref.sync import async_to_sync, sync_to_async
+
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import F
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import CustomUser, Entity, Candidate, Pillar, Voter, VoterRollup, PollingCenter, Station, ImportJob
+from .locations import LocationLookup
+from .pagination import KeysetPaginator, decode_cursor, encode_cursor
+from .search import normalize_arabic, search_voters, rebuild_index
+from . import readers, stats_cache
+from .imports import chunked, import_voters, read_file, validate_chunks
+from .readers import count_rows, read_rows, sniff_format
+from .jobs import claim_job, claim_next_job, requeue_stale_jobs, submit_job
+from .events import InProcessBroker, get_broker, scope_channel
+from .rollups import check_rollups, rebuild_rollups, rollup_stats, turnout_series
+from .views import stats_event_stream
+from .statistics import scope_stats, compute_scope_stats, candidate_stats, scope_facets, VoterResultSet
+
+
+class ElectionsDataMixin:
+    """بيانات تجريبية مشتركة: كيان ومرشحان وركيزتان لكل مرشح"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_user = CustomUser.objects.create_user(
+            username='admin', password='pass', full_name='المدير', user_type='admin')
+        entity_user = CustomUser.objects.create_user(
+            username='entity', password='pass', full_name='الكيان', user_type='entity')
+        cls.entity = Entity.objects.create(user=entity_user, entity_name='كيان تجريبي')
+        cls.candidates = []
+        cls.pillars = []
+        for c in range(2):
+            candidate_user = CustomUser.objects.create_user(
+                username=f'candidate{c}', password='pass', full_name=f'مرشح {c}', user_type='candidate')
+            candidate = Candidate.objects.create(user=candidate_user, entity=cls.entity)
+            cls.candidates.append(candidate)
+            for p in range(2):
+                pillar_user = CustomUser.objects.create_user(
+                    username=f'pillar{c}{p}', password='pass', full_name=f'ركيزة {c}{p}', user_type='pillar')
+                cls.pillars.append(Pillar.objects.create(user=pillar_user, candidate=candidate))
+        cls.voter_seq = 0
+        for pillar in cls.pillars:
+            cls.add_voters(pillar, 5)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    @classmethod
+    def add_voters(cls, pillar, count, **fields):
+        voters = []
+        for i in range(count):
+            cls.voter_seq += 1
+            data = {
+                'voter_number': f'V{cls.voter_seq:06d}',
+                'name': f'ناخب {cls.voter_seq}',
+                'governorate': 'بغداد',
+                'district': f'منطقة {i % 2}',
+                'sub_district': f'ناحية {i % 3}',
+                'card_status': 'updated' if i % 2 else 'not_updated',
+                'center_name': f'مركز {i % 3}',
+                'center_number': str(100 + i % 3),
+                'station': str(i % 4),
+                'phone_number': f'0770{cls.voter_seq:07d}',
+                'voting_status': 'voted' if i % 3 == 0 else 'not_voted',
+            }
+            data.update(fields)
+            voters.append(Voter.objects.create(pillar=pillar, candidate=pillar.candidate, **data))
+        return voters
+
+
+class StatisticsTests(ElectionsDataMixin, TestCase):
+
+    def test_scope_stats_matches_individual_counts(self):
+        voters = Voter.objects.filter(candidate=self.candidates[0])
+        stats = compute_scope_stats('candidate', self.candidates[0].pk)
+        self.assertEqual(stats['total_voters'], voters.count())
+        self.assertEqual(stats['voted'], voters.filter(voting_status='voted').count())
+        self.assertEqual(stats['not_voted'], voters.filter(voting_status='not_voted').count())
+        self.assertEqual(stats['updated_cards'], voters.filter(card_status='updated').count())
+        self.assertEqual(stats['not_updated_cards'], voters.filter(card_status='not_updated').count())
+        self.assertEqual(stats['total_centers'], voters.values('polling_center').distinct().count())
+        self.assertEqual(stats['total_stations'], voters.values('polling_station').distinct().count())
+
+    def test_scope_stats_counts_related_objects(self):
+        stats = scope_stats('entity', self.entity.id)
+        self.assertEqual(stats['total_candidates'], 2)
+        self.assertEqual(stats['total_pillars'], 4)
+        self.assertEqual(stats['total_voters'], 20)
+        self.assertEqual(scope_stats('admin')['total_entities'], 1)
+
+    def test_candidate_stats_constant_queries(self):
+        # المرشحون مع عدد الركائز، ثم صفوف الإحصائيات المجمعة
+        with self.assertNumQueries(2):
+            rows = candidate_stats(self.entity.candidates.all())
+            names = [row['candidate'].user.full_name for row in rows]
+        self.assertEqual(len(names), 2)
+        for row in rows:
+            voters = row['candidate'].voters
+            self.assertEqual(row['voters_count'], voters.count())
+            self.assertEqual(row['voted_count'], voters.filter(voting_status='voted').count())
+            self.assertEqual(row['not_voted_count'], voters.filter(voting_status='not_voted').count())
+            self.assertEqual(row['pillars_count'], 2)
+            self.assertEqual(row['voting_percentage'], round(row['voted_count'] / 10 * 100, 1))
+
+    def test_admin_percentage_keeps_two_decimals(self):
+        # 9 مصوتين من 21 ناخباً
+        self.add_voters(self.pillars[0], 1)
+        self.client.force_login(self.admin_user)
+        response = self.client.get(reverse('elections:admin_dashboard'))
+        self.assertEqual(response.context['voting_percentage'], 42.86)
+        self.assertEqual(scope_stats('pillar', self.pillars[0].pk)['voting_percentage'], 50.0)
+
+    def test_empty_scope(self):
+        stats = scope_stats('pillar', 0)
+        self.assertEqual(stats['total_voters'], 0)
+        self.assertEqual(stats['voting_percentage'], 0)
+
+
+class RollupTests(ElectionsDataMixin, TestCase):
+    """الإحصائيات المجمعة يجب أن تطابق بيانات الناخبين بعد كل عملية كتابة"""
+
+    def assertConsistent(self):
+        self.assertEqual(check_rollups(), [])
+
+    def test_initial_data(self):
+        self.assertConsistent()
+        voters = self.pillars[0].voters.all()
+        stats = rollup_stats('pillar', self.pillars[0].pk)
+        self.assertEqual((stats['total_voters'], stats['voted'], stats['total_centers']),
+                         (voters.count(), voters.filter(voting_status='voted').count(),
+                          voters.values('polling_center').distinct().count()))
+
+    def test_status_change(self):
+        voter = self.pillars[0].voters.filter(voting_status='not_voted').first()
+        voter.voting_status = 'voted'
+        voter.card_status = 'updated'
+        voter.save()
+        self.assertConsistent()
+
+    def test_update_voter_status_view(self):
+        voter = self.pillars[0].voters.filter(voting_status='not_voted').first()
+        before = rollup_stats('entity', self.entity.pk)['voted']
+        self.client.force_login(self.pillars[0].user)
+        response = self.client.post(
+            reverse('elections:update_voter_status', args=[voter.pk]),
+            json.dumps({'status': 'صوت'}), content_type='application/json')
+        self.assertTrue(response.json()['success'])
+        self.assertEqual(rollup_stats('entity', self.entity.pk)['voted'], before + 1)
+        self.assertConsistent()
+
+    def test_center_change_and_reassignment(self):
+        voter = self.pillars[0].voters.first()
+        voter.center_number = '999'
+        voter.station = '99'
+        voter.pillar = self.pillars[3]
+        voter.candidate = self.pillars[3].candidate
+        voter.save()
+        self.assertConsistent()
+        self.assertEqual(rollup_stats('pillar', self.pillars[0].pk)['total_voters'], 4)
+
+    def test_delete_voter(self):
+        self.pillars[1].voters.first().delete()
+        Voter.objects.filter(pillar=self.pillars[2]).delete()
+        self.assertConsistent()
+
+    def test_delete_pillar_and_candidate(self):
+        self.pillars[0].delete()
+        self.assertConsistent()
+        self.candidates[1].user.delete()
+        self.assertConsistent()
+        self.assertFalse(VoterRollup.objects.filter(scope='candidate', scope_id=self.candidates[1].pk).exists())
+
+    def test_stale_voter_delete_uses_stored_values(self):
+        voter = self.pillars[0].voters.first()
+        # الركيزة نُقلت لمرشح آخر بعد تحميل الناخب
+        self.pillars[0].candidate = self.candidates[1]
+        self.pillars[0].save()
+        voter.delete()
+        self.assertConsistent()
+
+    def test_cascade_delete_is_set_based(self):
+        self.add_voters(self.pillars[3], 60)
+        counts = []
+        for candidate in self.candidates:
+            with CaptureQueriesContext(connection) as ctx:
+                candidate.user.delete()
+            counts.append(len(ctx.captured_queries))
+            self.assertConsistent()
+        # الاستعلامات لا تزيد مع عدد الناخبين (الثاني لديه 60 ناخباً إضافياً)
+        self.assertEqual(counts[0], counts[1])
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM elections_voter_fts')
+            self.assertEqual(cursor.fetchone()[0], Voter.objects.count())
+
+    def test_candidate_moved_to_other_entity(self):
+        user = CustomUser.objects.create_user(username='entity2', password='pass', user_type='entity')
+        other = Entity.objects.create(user=user, entity_name='كيان آخر')
+        candidate = self.candidates[0]
+        candidate.entity = other
+        candidate.save()
+        self.assertConsistent()
+        self.assertEqual(rollup_stats('entity', other.pk)['total_voters'], 10)
+        self.assertEqual(Voter.objects.filter(entity=other).count(), 10)
+
+    def test_pillar_moved_to_other_candidate(self):
+        user = CustomUser.objects.create_user(username='entity2', password='pass', user_type='entity')
+        other = Entity.objects.create(user=user, entity_name='كيان آخر')
+        self.candidates[1].entity = other
+        self.candidates[1].save()
+        pillar = self.pillars[0]
+        pillar.candidate = self.candidates[1]
+        pillar.save()
+        self.assertConsistent()
+        self.assertEqual(set(pillar.voters.values_list('candidate_id', 'entity_id')),
+                         {(self.candidates[1].pk, other.pk)})
+        self.assertEqual(rollup_stats('entity', other.pk)['total_voters'], 15)
+
+    def test_voter_scope_derived_from_pillar(self):
+        voter = self.pillars[0].voters.first()
+        self.assertEqual(voter.entity_id, self.entity.pk)
+        voter.pillar = self.pillars[3]
+        voter.save()
+        voter.refresh_from_db()
+        self.assertEqual(voter.candidate_id, self.pillars[3].candidate_id)
+        self.assertConsistent()
+
+    def test_rebuild_and_check_command(self):
+        VoterRollup.objects.filter(scope='admin').update(voted=0)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_rollups', '--check', stdout=open('/dev/null', 'w'))
+        call_command('rebuild_rollups', stdout=open('/dev/null', 'w'))
+        self.assertConsistent()
+        self.assertEqual(rebuild_rollups(), VoterRollup.objects.count())
+
+
+class LocationTests(ElectionsDataMixin, TestCase):
+    """قيم المراكز والمحطات تُحفظ مرة واحدة في جداول الأبعاد"""
+
+    def test_voters_share_centers(self):
+        # القيم نفسها تتكرر في كل الركائز فتبقى 5 مجموعات مميزة فقط من 20 ناخباً
+        self.assertEqual(PollingCenter.objects.count(), 5)
+        self.assertEqual(Station.objects.count(), Voter.objects.values('polling_station').distinct().count())
+        voter = Voter.objects.select_related('polling_center', 'polling_station').get(voter_number='V000002')
+        self.assertEqual((voter.center_name, voter.center_number, voter.station), ('مركز 1', '101', '1'))
+
+    def test_lookup_caches_ids(self):
+        lookup = LocationLookup()
+        location = {'governorate': 'البصرة', 'district': 'منطقة', 'center_name': 'مركز جديد',
+                    'center_number': '500', 'station': '1'}
+        ids = lookup.resolve(**location)
+        with self.assertNumQueries(0):
+            self.assertEqual(lookup.resolve(**location), ids)
+        preloaded = LocationLookup().preload()
+        with self.assertNumQueries(0):
+            self.assertEqual(preloaded.resolve(**location), ids)
+
+    def test_form_write_path(self):
+        self.client.force_login(self.pillars[0].user)
+        response = self.client.post(reverse('elections:add_voter'), {
+            'voter_number': 'N1', 'name': 'ناخب جديد', 'governorate': 'بغداد', 'district': 'منطقة 0',
+            'sub_district': 'ناحية 0', 'card_status': 'updated', 'center_name': 'مركز 0',
+            'center_number': '100', 'station': '0', 'phone_number': '07700000000'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(PollingCenter.objects.count(), 5)
+        self.assertEqual(Voter.objects.get(voter_number='N1').district, 'منطقة 0')
+        self.assertEqual(check_rollups(), [])
+
+    def test_pillar_dashboard_district_filter(self):
+        self.client.force_login(self.pillars[0].user)
+        response = self.client.get(reverse('elections:pillar_dashboard'), {'district': 'منطقة 1'})
+        self.assertEqual(len(response.context['voters']), 2)
+        self.assertEqual(response.context['districts'], [('منطقة 0', 3), ('منطقة 1', 2)])
+
+
+class KeysetPaginationTests(ElectionsDataMixin, TestCase):
+    """التصفح بالمؤشر يمر على كل الصفوف مرة واحدة بالترتيب في الاتجاهين"""
+
+    def walk(self, paginator, query=None):
+        query = QueryDict(mutable=True) if query is None else query
+        pages = []
+        while True:
+            page = paginator.page(query)
+            pages.append(page)
+            if not page.has_next:
+                return pages
+            query = QueryDict(page.next_query)
+
+    def test_forward_and_backward(self):
+        voters = Voter.objects.filter(candidate=self.candidates[0])
+        paginator = KeysetPaginator(voters, 3, ('name', 'id'))
+        expected = list(voters.order_by('name', 'id').values_list('id', flat=True))
+        pages = self.walk(paginator)
+        self.assertEqual([v.id for page in pages for v in page], expected)
+        self.assertFalse(pages[0].has_previous)
+        self.assertEqual(len(pages), 4)
+        previous = paginator.page(QueryDict(pages[-1].previous_query))
+        self.assertEqual([v.id for v in previous], [v.id for v in pages[-2]])
+        # الصفحة الأخيرة تُجلب من النهاية فتكون ممتلئة
+        last = paginator.page(QueryDict(pages[0].last_query))
+        self.assertEqual([v.id for v in last], expected[-3:])
+        self.assertFalse(last.has_next)
+        # ترقيم الصفوف يستمر بين الصفحات في الاتجاهين
+        self.assertEqual([page.start_index() for page in pages], [1, 4, 7, 10])
+        self.assertEqual(previous.start_index(), 7)
+        self.assertEqual(last.start_index(), len(expected) - 2)
+        self.assertEqual(paginator.page(QueryDict(last.previous_query)).start_index(), len(expected) - 5)
+
+    def test_invalid_cursor_returns_first_page(self):
+        self.assertIsNone(decode_cursor('not-a-cursor'))
+        page = KeysetPaginator(Voter.objects.all(), 5).page(QueryDict('after=not-a-cursor'))
+        self.assertEqual([v.id for v in page], list(Voter.objects.order_by('id').values_list('id', flat=True)[:5]))
+
+    def test_malformed_cursors_return_first_page(self):
+        voters = Voter.objects.filter(candidate=self.candidates[0])
+        by_id, by_name = ('id',), ('name', 'id')
+        cursors = [(by_id, ['abc', 1]), (by_id, [{'x': 1}, 1]), (by_name, ['x', 'abc', 1]), (by_name, [None, None, 1]),
+                   (by_name, ['x', [1], 1]), (by_name, ['x', True, 1]), (by_name, ['x', 1]), (by_id, [1, '2']),
+                   (by_id, [1, 0])]
+        for ordering, values in cursors:
+            paginator = KeysetPaginator(voters, 3, ordering)
+            first = [v.id for v in paginator.page(QueryDict())]
+            for param in ('after', 'before'):
+                query = QueryDict(mutable=True)
+                query[param] = encode_cursor(values)
+                page = paginator.page(query)
+                self.assertEqual(([v.id for v in page], page.has_previous), (first, False), (param, values))
+
+    def test_malformed_cursors_in_views(self):
+        self.client.force_login(self.pillars[0].user)
+        for url, values in ((reverse('elections:api_voters'), ['abc', 1]),
+                            (reverse('elections:api_voters'), [{'x': 1}, 1]),
+                            (reverse('elections:pillar_dashboard'), ['x', 'abc', 1]),
+                            (reverse('elections:pillar_dashboard'), [None, None, 1])):
+            response = self.client.get(url, {'after': encode_cursor(values)})
+            self.assertEqual(response.status_code, 200, (url, values))
+
+    def test_statistics_detail_keeps_filters(self):
+        self.add_voters(self.pillars[0], 60, voting_status='voted')
+        self.client.force_login(self.candidates[0].user)
+        url = reverse('elections:statistics_detail', args=['voters'])
+        response = self.client.get(url, {'vote_status': 'voted'})
+        page = response.context['voters']
+        self.assertEqual(len(page), 50)
+        self.assertIn('vote_status=voted', page.next_query)
+        response = self.client.get(f'{url}?{page.next_query}')
+        second = response.context['voters']
+        self.assertContains(response, '<td>51</td>')
+        self.assertFalse(second.has_next)
+        self.assertEqual(len(page) + len(second), Voter.objects.filter(
+            candidate=self.candidates[0], voting_status='voted').count())
+
+
+class FacetTests(ElectionsDataMixin, TestCase):
+    """قوائم التصفية مع أعدادها تُخزن مؤقتاً لكل نطاق"""
+
+    def test_counts_and_cache(self):
+        facets = scope_facets('candidate', self.candidates[0].pk)
+        self.assertEqual(facets['district'], [('منطقة 0', 6), ('منطقة 1', 4)])
+        self.assertEqual(sum(n for _, n in facets['sub_district']), 10)
+        with self.assertNumQueries(0):
+            self.assertEqual(scope_facets('candidate', self.candidates[0].pk), facets)
+
+    def test_invalidated_by_voter_and_center_writes(self):
+        self.add_voters(self.pillars[0], 1, district='منطقة جديدة')
+        self.assertIn(('منطقة جديدة', 1), scope_facets('pillar', self.pillars[0].pk)['district'])
+        self.assertNotIn(('منطقة جديدة', 1), scope_facets('pillar', self.pillars[1].pk)['district'])
+        center = PollingCenter.objects.get(district='منطقة جديدة')
+        center.district = 'منطقة معدلة'
+        center.save()
+        self.assertIn(('منطقة معدلة', 1), scope_facets('pillar', self.pillars[0].pk)['district'])
+
+
+class VoterResultSetTests(ElectionsDataMixin, TestCase):
+    """أعداد قوائم الناخبين تُحسب مرة واحدة"""
+
+    def test_unfiltered_counts_from_rollups(self):
+        scope_stats('candidate', self.candidates[0].pk)
+        voters = Voter.objects.filter(candidate=self.candidates[0])
+        voted, not_voted = voters.filter(voting_status='voted').count(), voters.filter(voting_status='not_voted').count()
+        with self.assertNumQueries(0):
+            result = VoterResultSet('candidate', self.candidates[0].pk, status=('voting_status', 'voted'))
+            self.assertEqual(result.total, voted)
+            result = VoterResultSet('candidate', self.candidates[0].pk)
+            self.assertEqual(result.counts['not_voted'], not_voted)
+
+    def test_filtered_counts_in_one_aggregate(self):
+        result = VoterResultSet('entity', self.entity.pk, status=('card_status', 'updated'))
+        result.filter(polling_center__district='منطقة 1')
+        voters = Voter.objects.filter(card_status='updated', polling_center__district='منطقة 1')
+        total, voted = voters.count(), voters.filter(voting_status='voted').count()
+        with self.assertNumQueries(1):
+            self.assertEqual(result.total, total)
+            self.assertEqual(result.counts['voted'], voted)
+
+    def test_statistics_detail_scans_voters_once(self):
+        self.client.force_login(self.candidates[0].user)
+        # قوائم التصفية تُحسب في الطلب الأول فقط
+        self.client.get(reverse('elections:statistics_detail', args=['voters']))
+        for stat_type in ('voters', 'voted', 'not_voted', 'updated', 'not_updated'):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(reverse('elections:statistics_detail', args=[stat_type]))
+            self.assertEqual(response.status_code, 200)
+            voter_queries = [q for q in ctx.captured_queries
+                             if 'FROM "elections_voter"' in q['sql'] and 'COUNT' in q['sql'].upper()]
+            self.assertEqual(voter_queries, [], stat_type)
+
+
+class SearchTests(ElectionsDataMixin, TestCase):
+    """البحث المطبّع في جدول FTS5 ضمن نطاق المستخدم"""
+
+    def test_normalize_arabic(self):
+        self.assertEqual(normalize_arabic('أَحْمَــد'), 'احمد')
+        self.assertEqual(normalize_arabic('فاطمة  مصطفى'), 'فاطمه مصطفي')
+        self.assertEqual(normalize_arabic('إسماعيل ٠٧٧٠'), 'اسماعيل 0770')
+
+    def test_admin_search_stays_on_index(self):
+        voter = self.add_voters(self.pillars[0], 1, name='أحمد عبدالله')[0]
+        model_admin = admin.site._registry[Voter]
+        for term in ('احمد', voter.voter_number, voter.phone_number):
+            voters, _ = model_admin.get_search_results(None, Voter.objects.all(), term)
+            self.assertIn(voter, voters)
+            self.assertNotRegex(voters.explain(), r'SCAN elections_voter\b(?!_)', term)
+
+    def test_folded_name_found_within_scope(self):
+        voter = self.add_voters(self.pillars[0], 1, name='أحمد عبدالله')[0]
+        self.add_voters(self.pillars[2], 1, name='أحمد علي')
+        voters = search_voters(Voter.objects.filter(pillar=self.pillars[0]), 'احمد')
+        self.assertEqual(list(voters), [voter])
+        self.assertEqual(search_voters(Voter.objects.all(), 'إحمد').count(), 2)
+
+    def test_index_follows_save_and_delete(self):
+        voter = self.add_voters(self.pillars[0], 1, name='سلمى')[0]
+        voter.name = 'ليلى'
+        voter.save()
+        self.assertFalse(search_voters(Voter.objects.all(), 'سلمى').exists())
+        self.assertTrue(search_voters(Voter.objects.all(), 'ليلي').exists())
+        voter.delete()
+        self.assertFalse(search_voters(Voter.objects.all(), 'ليلى').exists())
+        self.assertEqual(rebuild_index(), Voter.objects.count())
+
+    def test_short_query_and_number_search(self):
+        # أقصر من trigram: يعود إلى icontains
+        self.assertEqual(search_voters(Voter.objects.all(), '12').count(),
+                         Voter.objects.filter(voter_number__contains='12').count())
+        self.assertEqual(list(search_voters(Voter.objects.all(), 'V000003')), [Voter.objects.get(voter_number='V000003')])
+
+    def test_number_and_phone_lookups(self):
+        voter = self.add_voters(self.pillars[0], 1, voter_number='20260418', phone_number='+964 770 123 4567')[0]
+        self.assertEqual(voter.phone_reversed, '76543210770')
+        for query in ('20260418', '2026', '1234567', '٠٧٧٠١٢٣٤٥٦٧', '07701234567'):
+            self.assertEqual(list(search_voters(Voter.objects.all(), query)), [voter], query)
+        self.assertFalse(search_voters(Voter.objects.all(), '0418').exists())
+        voter.phone_number = '07809999999'
+        voter.save(update_fields=['phone_number'])
+        self.assertEqual(Voter.objects.get(pk=voter.pk).phone_reversed, '99999990870')
+
+    def test_dashboard_search(self):
+        self.add_voters(self.pillars[0], 1, name='مصطفى كمال')
+        self.client.force_login(self.pillars[0].user)
+        response = self.client.get(reverse('elections:pillar_dashboard'), {'search': 'مصطفي'})
+        self.assertEqual([v.name for v in response.context['voters']], ['مصطفى كمال'])
+
+
+class ExportTests(ElectionsDataMixin, TestCase):
+    """تصدير قوائم الناخبين المتدفق بالتصفية الحالية"""
+
+    def export(self, user, stat_type, **params):
+        self.client.force_login(user)
+        response = self.client.get(reverse('elections:export_voters', args=[stat_type]), params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_with_filters_in_scope(self):
+        response, content = self.export(self.candidates[0].user, 'voted', district='منطقة 0')
+        rows = list(csv.reader(io.StringIO(content.decode('utf-8-sig'))))
+        self.assertEqual(rows[0][-1], 'الركيزة')
+        expected = Voter.objects.filter(candidate=self.candidates[0], voting_status='voted',
+                                        polling_center__district='منطقة 0')
+        self.assertEqual(sorted(row[0] for row in rows[1:]), sorted(v.voter_number for v in expected))
+        self.assertEqual({row[10] for row in rows[1:]}, {'صوت'})
+
+    def test_xlsx_search(self):
+        voter = self.add_voters(self.pillars[1], 1, name='أحمد المصدر')[0]
+        response, content = self.export(self.admin_user, 'voters', search='احمد', format='xlsx')
+        sheet = openpyxl.load_workbook(io.BytesIO(content)).active
+        rows = list(sheet.iter_rows(values_only=True))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][:2], (voter.voter_number, voter.name))
+        self.assertEqual(rows[1][-1], self.pillars[1].user.full_name)
+
+    def test_rows_read_in_one_query(self):
+        self.client.force_login(self.admin_user)
+        response = self.client.get(reverse('elections:export_voters', args=['voters']))
+        with CaptureQueriesContext(connection) as ctx:
+            b''.join(response.streaming_content)
+        self.assertEqual(len([q for q in ctx.captured_queries if 'elections_voter' in q['sql']]), 1)
+
+
+@override_settings(ELECTIONS_IMPORT_IN_PROCESS=False, MEDIA_ROOT=tempfile.mkdtemp(prefix='voters-media-'))
+class ImportTests(ElectionsDataMixin, TestCase):
+    """استيراد ملفات Excel على دفعات كمهام في الخلفية"""
+
+    HEADER = ['الاسم', 'رقم الناخب', 'رقم الهاتف', 'المحافظة', 'اسم المركز', 'رقم المركز', 'المحطة',
+              'حالة البطاقة', 'حالة التصويت']
+
+    def workbook(self, rows, header=HEADER):
+        workbook = openpyxl.Workbook()
+        workbook.active.append(header)
+        for row in rows:
+            workbook.active.append(row)
+        output = io.BytesIO()
+        workbook.save(output)
+        output.seek(0)
+        output.name = 'voters.xlsx'
+        return output
+
+    def rows(self, count, start=0):
+        return [[f'مستورد {i}', f'IMP{i:05d}', 7701000000 + i, 'بغداد', 'مركز 1', 101, i % 3,
+                 'محدث', 'صوت' if i % 4 == 0 else 'لم يصوت'] for i in range(start, start + count)]
+
+    def upload(self, url, data):
+        """رفع ملف ثم تنفيذ مهمته بالعامل وإرجاع تقدمها النهائي"""
+        response = self.client.post(url, data).json()
+        self.assertTrue(response['success'], response)
+        self.assertEqual(self.client.get(response['progress_url']).json()['status'], 'pending')
+        call_command('run_import_worker', '--once', stdout=io.StringIO())
+        return self.client.get(response['progress_url']).json()
+
+    def test_candidate_upload_creates_voters(self):
+        pillar = self.pillars[1]
+        self.client.force_login(self.candidates[0].user)
+        rows = self.rows(25) + [['', 'IMP99999'], ['مكرر', 'IMP00003', '', '', '', 101, 0],
+                                ['قديم', 'V000001', '', '', '', 101, 0], ['خطأ', 'IMP88888', '', '', '', 101, 0, 'x']]
+        job = self.upload(reverse('elections:upload_excel_candidate'),
+                          {'excel_file': self.workbook(rows), 'pillar': pillar.pk})
+        self.assertEqual((job['status'], job['total_rows'], job['processed_rows'], job['created'], job['skipped'],
+                          job['eta_seconds']), ('done', 29, 29, 25, 4, 0))
+        self.assertEqual(len(job['errors']), 4)
+        # الملف المرفوع يُحذف بعد انتهاء المهمة
+        stored = ImportJob.objects.get(pk=job['id']).file
+        self.assertFalse(stored.storage.exists(stored.name))
+        voters = Voter.objects.filter(voter_number__startswith='IMP')
+        self.assertEqual(set(voters.values_list('pillar', 'candidate', 'entity')),
+                         {(pillar.pk, self.candidates[0].pk, self.entity.pk)})
+        voter = voters.get(voter_number='IMP00004')
+        self.assertEqual((voter.phone_number, voter.card_status, voter.voting_status, voter.station),
+                         ('07701000004', 'updated', 'voted', '1'))
+        # المصوتون المستوردون بلا وقت تصويت فلا يظهرون كلهم في فترة الاستيراد
+        self.assertFalse(voters.filter(voted_at__isnull=False).exists())
+        self.assertEqual(sum(n for _, n in turnout_series('pillar', pillar.pk)),
+                         pillar.voters.filter(voted_at__isnull=False).count())
+        voter.name = 'مستورد 4 معدل'
+        voter.save()
+        self.assertIsNone(Voter.objects.get(pk=voter.pk).voted_at)
+        self.assertEqual(voter.phone_reversed, '40000010770')
+        self.assertEqual(check_rollups(), [])
+        self.assertIn(voter, search_voters(Voter.objects.all(), 'مستورد 4'))
+
+    def test_chunks_use_bounded_queries(self):
+        pillar = self.pillars[2]
+        LocationLookup().resolve('بغداد', '', '', 'مركز 1', '101', '0')
+        counts = []
+        for start, count in ((0, 20), (100, 200)):
+            file = self.workbook(self.rows(count, start))
+            with CaptureQueriesContext(connection) as ctx:
+                result = import_voters(file, pillar, chunk_size=100)
+            self.assertEqual(result['created'], count)
+            counts.append(len(ctx.captured_queries))
+        # الاستعلامات لكل دفعة لا لكل صف (المحطتان الجديدتان تُنشآن مرة واحدة)
+        self.assertLess(counts[1], counts[0] * 2)
+        self.assertEqual(check_rollups(), [])
+
+    def test_entity_upload_requires_own_pillar(self):
+        self.client.force_login(self.entity.user)
+        response = self.client.post(reverse('elections:upload_excel_entity'),
+                                    {'excel_file': self.workbook(self.rows(2))})
+        self.assertFalse(response.json()['success'])
+        job = self.upload(reverse('elections:upload_excel_entity'),
+                          {'excel_file': self.workbook(self.rows(2), header=['الاسم']), 'pillar': self.pillars[3].pk})
+        self.assertEqual(job['status'], 'failed')
+        self.assertIn('رقم الناخب', job['message'])
+        job = self.upload(reverse('elections:upload_excel_entity'),
+                          {'excel_file': self.workbook(self.rows(2)), 'pillar': self.pillars[3].pk})
+        self.assertEqual(job['created'], 2)
+        # مهمة مستخدم آخر غير متاحة
+        self.client.force_login(self.candidates[0].user)
+        self.assertEqual(self.client.get(reverse('elections:import_progress', args=[job['id']])).status_code, 404)
+        self.assertEqual(Voter.objects.filter(voter_number__startswith='IMP', pillar=self.pillars[3]).count(), 2)
+
+
+    def test_upsert_updates_changed_rows_and_reports_conflicts(self):
+        pillar = self.pillars[0]
+        import_voters(self.workbook(self.rows(10)), pillar)
+        moved = Voter.objects.get(voter_number='IMP00001')
+        moved.pillar = self.pillars[1]
+        moved.save()
+        rows = self.rows(12)
+        rows[1][0] = 'اسم مصحح'
+        rows[2][8] = 'صوت'
+        rows[3][6] = 7
+        other = Voter.objects.filter(candidate=self.candidates[1]).first()
+        rows.append(['مرشح آخر', other.voter_number, '', '', '', 101, 0])
+        self.client.force_login(self.candidates[0].user)
+        job = self.upload(reverse('elections:upload_excel_candidate'),
+                          {'excel_file': self.workbook(rows), 'pillar': pillar.pk, 'mode': 'upsert'})
+        self.assertEqual((job['status'], job['created'], job['updated'], job['conflicts'], job['skipped']),
+                         ('done', 2, 3, 1, 1), job)
+        self.assertIn('دون تغيير 7', job['message'])
+        moved.refresh_from_db()
+        self.assertEqual((moved.name, moved.pillar), ('اسم مصحح', self.pillars[1]))
+        voter = Voter.objects.get(voter_number='IMP00002')
+        self.assertEqual(voter.voting_status, 'voted')
+        self.assertIsNone(voter.voted_at)
+        self.assertEqual(Voter.objects.get(voter_number='IMP00003').station, '7')
+        self.assertEqual(Voter.objects.get(pk=other.pk).name, other.name)
+        self.assertEqual(check_rollups(), [])
+        self.assertIn(moved, search_voters(Voter.objects.all(), 'اسم مصحح'))
+
+    def test_upsert_unchanged_file_writes_nothing(self):
+        file = self.workbook(self.rows(50))
+        import_voters(file, self.pillars[0])
+        file.seek(0)
+        with CaptureQueriesContext(connection) as ctx:
+            result = import_voters(file, self.pillars[0], chunk_size=20, mode='upsert')
+        self.assertEqual((result['created'], result['updated'], result['unchanged']), (0, 0, 50))
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE'))])
+
+    def test_process_pool_validation_matches_serial(self):
+        rows = self.rows(30) + [['مكرر', 'IMP00003', '', '', '', 101, 0], ['خطأ', 'IMP88888', '', '', '', 101, 0, 'x']]
+        chunks = list(chunked(read_file(self.workbook(rows)), 7))
+        serial = list(validate_chunks(chunks))
+        self.assertEqual(list(validate_chunks(chunks, workers=2)), serial)
+        self.assertEqual(sum(message is not None for results in serial for _, _, message in results), 1)
+        result = import_voters(self.workbook(rows), self.pillars[0], chunk_size=7, workers=2)
+        self.assertEqual((result['rows'], result['created'], result['skipped']), (32, 30, 2))
+        self.assertEqual([error.split(':')[0] for error in result['errors']], ['الصف 32', 'الصف 33'])
+        self.assertEqual(check_rollups(), [])
+
+    def csv_file(self, rows, encoding='utf-8-sig', delimiter=','):
+        output = io.StringIO()
+        csv.writer(output, delimiter=delimiter).writerows([self.HEADER] + rows)
+        return io.BytesIO(output.getvalue().encode(encoding))
+
+    def test_readers_yield_same_rows(self):
+        rows = [[str(value) for value in row] for row in self.rows(3)]
+        files = {
+            'xlsx': self.workbook(rows),
+            'utf-8-sig': self.csv_file(rows),
+            'utf-8': self.csv_file(rows, 'utf-8', ';'),
+            'cp1256': self.csv_file(rows, 'cp1256', '\t'),
+        }
+        expected = [tuple(self.HEADER)] + [tuple(row) for row in rows]
+        for name, file in files.items():
+            self.assertEqual(sniff_format(file), 'xlsx' if name == 'xlsx' else 'csv')
+            self.assertEqual(count_rows(file), 3, name)
+            self.assertEqual(list(read_rows(file)), expected, name)
+
+    def test_csv_upload_and_xls_without_xlrd(self):
+        self.client.force_login(self.candidates[0].user)
+        file = self.csv_file(self.rows(4), 'cp1256')
+        file.name = 'voters.csv'
+        job = self.upload(reverse('elections:upload_excel_candidate'), {'excel_file': file, 'pillar': self.pillars[0].pk})
+        self.assertEqual((job['status'], job['total_rows'], job['created']), ('done', 4, 4))
+        self.assertEqual(Voter.objects.get(voter_number='IMP00001').name, 'مستورد 1')
+        # هاتف CSV نصي بلا صفر أول يُبحث عنه بالصيغة المحلية والدولية
+        voter = Voter.objects.get(voter_number='IMP00002')
+        self.assertEqual(voter.phone_number, '7701000002')
+        for query in ('07701000002', '+964 770 100 0002', '7701000002'):
+            self.assertEqual(list(search_voters(Voter.objects.all(), query)), [voter], query)
+        file = io.BytesIO(b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1' + bytes(504))
+        file.name = 'voters.xls'
+        jobs = ImportJob.objects.count()
+        with mock.patch.object(readers, 'xlrd', None):
+            response = self.client.post(reverse('elections:upload_excel_candidate'),
+                                        {'excel_file': file, 'pillar': self.pillars[0].pk}).json()
+        self.assertFalse(response['success'])
+        self.assertIn('xlrd', response['error'])
+        self.assertEqual(ImportJob.objects.count(), jobs)
+
+    def test_jobs_claimed_once_and_requeued_when_stale(self):
+        job = ImportJob.objects.create(user=self.candidates[0].user, pillar=self.pillars[0],
+                                       file=ContentFile(self.workbook(self.rows(1)).read(), name='voters.xlsx'))
+        self.assertEqual(claim_next_job(), job)
+        self.assertIsNone(claim_job(job.pk))
+        self.assertEqual(requeue_stale_jobs(), 0)
+        ImportJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - datetime.timedelta(hours=1))
+        self.assertEqual(requeue_stale_jobs(), 1)
+        self.assertEqual(claim_next_job(), job)
+
+    def test_in_process_submit_after_commit(self):
+        job = ImportJob.objects.create(user=self.candidates[0].user, pillar=self.pillars[0], file='imports/x.xlsx')
+        with self.captureOnCommitCallbacks() as callbacks:
+            submit_job(job)
+        self.assertEqual(len(callbacks), 0)
+        with self.settings(ELECTIONS_IMPORT_IN_PROCESS=True), self.captureOnCommitCallbacks() as callbacks:
+            submit_job(job)
+        self.assertEqual(len(callbacks), 1)
+
+
+class VoterApiTests(ElectionsDataMixin, TestCase):
+    """API الناخبين المضغوط لتطبيقات الركائز"""
+
+    def get(self, user, **params):
+        self.client.force_login(user)
+        return self.client.get(reverse('elections:api_voters'), params)
+
+    def test_cursor_walk_in_scope(self):
+        ids, after = [], ''
+        while True:
+            data = self.get(self.pillars[0].user, limit=2, after=after, fields='id').json()
+            ids += [row[0] for row in data['rows']]
+            if data['next'] is None:
+                break
+            after = data['next']
+        expected = list(Voter.objects.filter(pillar=self.pillars[0]).order_by('id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(data['count'], 5)
+
+    def test_projection_and_filters(self):
+        response = self.get(self.candidates[0].user, fields='voter_number,district,pillar',
+                            district='منطقة 1', voting_status='not_voted')
+        self.assertNotIn(b': ', response.content)
+        data = response.json()
+        self.assertEqual(data['fields'], ['voter_number', 'district', 'pillar'])
+        expected = Voter.objects.filter(candidate=self.candidates[0], polling_center__district='منطقة 1',
+                                        voting_status='not_voted').order_by('id')
+        self.assertEqual(data['rows'], [[v.voter_number, 'منطقة 1', v.pillar_id] for v in expected])
+
+    def test_unknown_field(self):
+        self.assertEqual(self.get(self.admin_user, fields='name,password').status_code, 400)
+
+
+class FragmentTests(ElectionsDataMixin, TestCase):
+    """أجزاء الصفحات (جدول الناخبين، الإحصائيات) تُعرض وحدها عند طلبها"""
+
+    def test_pillar_fragments(self):
+        self.client.force_login(self.pillars[0].user)
+        url = reverse('elections:pillar_dashboard')
+        page = self.client.get(url, {'voting_status': 'voted'})
+        fragment = self.client.get(url, {'voting_status': 'voted', 'fragment': 'voters'})
+        self.assertNotContains(fragment, '<html')
+        self.assertEqual([v.pk for v in fragment.context['voters']], [v.pk for v in page.context['voters']])
+        self.assertLess(len(fragment.content) * 3, len(page.content))
+        self.assertContains(self.client.get(url, {'fragment': 'stats'}), 'data-stat="total_voters"')
+
+    def test_fragment_not_in_page_links(self):
+        self.add_voters(self.pillars[0], 30)
+        self.client.force_login(self.pillars[0].user)
+        response = self.client.get(reverse('elections:pillar_dashboard'), {'fragment': 'voters'})
+        self.assertNotIn('fragment', response.context['voters'].next_query)
+
+    def test_statistics_voters_fragment(self):
+        self.client.force_login(self.candidates[0].user)
+        response = self.client.get(reverse('elections:statistics_detail', args=['voters']),
+                                   {'district': 'منطقة 1', 'fragment': 'voters'})
+        self.assertNotContains(response, '<html')
+        self.assertContains(response, 'لم يصوتوا')
+        self.assertEqual(response.context['total_count'], 4)
+
+    def test_status_toggle_returns_row_and_stats(self):
+        voter = Voter.objects.filter(pillar=self.pillars[0], voting_status='not_voted').first()
+        self.client.force_login(self.pillars[0].user)
+        response = self.client.post(reverse('elections:update_voter_status', args=[voter.pk]),
+                                    json.dumps({'status': 'voted'}), content_type='application/json')
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertIn(f'data-voter-id="{voter.pk}"', data['row'])
+        self.assertEqual(data['stats']['voted'], Voter.objects.filter(pillar=self.pillars[0], voting_status='voted').count())
+
+
+class TurnoutTests(ElectionsDataMixin, TestCase):
+    """وقت التصويت وفترات منحنى المشاركة المجمعة"""
+
+    def vote(self, voter, moment):
+        voter.voting_status = 'voted'
+        voter.voted_at = moment
+        voter.save()
+
+    def test_voted_at_on_transition(self):
+        voter = Voter.objects.filter(voting_status='not_voted').first()
+        self.assertIsNone(voter.voted_at)
+        voter.voting_status = 'voted'
+        voter.save(update_fields=['voting_status'])
+        voted_at = Voter.objects.get(pk=voter.pk).voted_at
+        self.assertIsNotNone(voted_at)
+        voter.save()
+        self.assertEqual(Voter.objects.get(pk=voter.pk).voted_at, voted_at)
+        voter.voting_status = 'not_voted'
+        voter.save(update_fields=['voting_status'])
+        self.assertIsNone(Voter.objects.get(pk=voter.pk).voted_at)
+
+    def test_buckets_follow_votes(self):
+        start = datetime.datetime(2026, 11, 11, 9, 0, tzinfo=datetime.timezone.utc)
+        voters = list(Voter.objects.filter(pillar=self.pillars[0], voting_status='not_voted'))
+        self.vote(voters[0], start + datetime.timedelta(minutes=3))
+        self.vote(voters[1], start + datetime.timedelta(minutes=14))
+        self.vote(voters[2], start + datetime.timedelta(minutes=20))
+        expected = [(start, 2), (start + datetime.timedelta(minutes=15), 1)]
+        for scope, scope_id in (('admin', 0), ('entity', self.entity.pk),
+                                ('candidate', self.candidates[0].pk), ('pillar', self.pillars[0].pk)):
+            self.assertEqual(turnout_series(scope, scope_id, since=start), expected, scope)
+        voters[1].voting_status = 'not_voted'
+        voters[1].save()
+        self.assertEqual(turnout_series('pillar', self.pillars[0].pk, since=start)[0], (start, 1))
+
+        # نقل الركيزة ينقل فتراتها، وإعادة البناء تعطي النتيجة نفسها
+        self.pillars[0].candidate = self.candidates[1]
+        self.pillars[0].save()
+        self.assertEqual(turnout_series('candidate', self.candidates[0].pk, since=start), [])
+        series = turnout_series('candidate', self.candidates[1].pk)
+        self.assertEqual(series[-2:], [(start, 1), (start + datetime.timedelta(minutes=15), 1)])
+        rebuild_rollups()
+        self.assertEqual(turnout_series('candidate', self.candidates[1].pk), series)
+
+    def test_turnout_api(self):
+        start = datetime.datetime(2026, 11, 11, 9, 0, tzinfo=datetime.timezone.utc)
+        self.vote(Voter.objects.filter(candidate=self.candidates[0], voting_status='not_voted').first(), start)
+        self.client.force_login(self.candidates[0].user)
+        # الجلسة والمستخدم وملفه، ثم الفترات والإحصائيات المجمعة فقط
+        with self.assertNumQueries(6):
+            data = self.client.get(reverse('elections:api_turnout')).json()
+        voted = Voter.objects.filter(candidate=self.candidates[0], voting_status='voted').count()
+        self.assertEqual(data['buckets'][-1], [start.isoformat(), 1, voted])
+        self.assertEqual((data['voted'], data['untimed']), (voted, 0))
+        # المصوتون قبل تسجيل أوقات التصويت يظهرون كعدد بلا وقت
+        Voter.objects.filter(candidate=self.candidates[0]).exclude(voted_at=start).update(voted_at=None)
+        rebuild_rollups()
+        data = self.client.get(reverse('elections:api_turnout')).json()
+        self.assertEqual((data['buckets'], data['untimed']), ([[start.isoformat(), 1, 1]], voted - 1))
+
+
+class StatsCacheTests(ElectionsDataMixin, TestCase):
+
+    def test_repeat_reads_hit_cache(self):
+        stats = scope_stats('entity', self.entity.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(scope_stats('entity', self.entity.pk), stats)
+
+    def test_voter_write_invalidates_scope_and_parents_only(self):
+        pillar = self.pillars[0]
+        other_pillar = self.pillars[3]
+        for scope, scope_id in (('admin', 0), ('entity', self.entity.pk),
+                                ('candidate', pillar.candidate_id), ('pillar', pillar.pk),
+                                ('pillar', other_pillar.pk)):
+            scope_stats(scope, scope_id)
+        voter = pillar.voters.filter(voting_status='not_voted').first()
+        voter.voting_status = 'voted'
+        voter.save()
+        with self.assertNumQueries(0):
+            scope_stats('pillar', other_pillar.pk)
+        self.assertEqual(scope_stats('pillar', pillar.pk), compute_scope_stats('pillar', pillar.pk))
+        self.assertEqual(scope_stats('candidate', pillar.candidate_id)['voted'],
+                         pillar.candidate.voters.filter(voting_status='voted').count())
+        self.assertEqual(scope_stats('entity', self.entity.pk)['voted'],
+                         Voter.objects.filter(voting_status='voted').count())
+        self.assertEqual(scope_stats('admin')['voted'], Voter.objects.filter(voting_status='voted').count())
+
+    def test_version_expires_for_writes_in_other_processes(self):
+        pillar = self.pillars[0]
+        voted = scope_stats('pillar', pillar.pk)['voted']
+        # كتابة في عملية أخرى لها ذاكرتها المحلية الخاصة فلا يتغير الإصدار هنا
+        VoterRollup.objects.filter(scope='pillar', scope_id=pillar.pk).update(voted=F('voted') + 1)
+        self.assertEqual(scope_stats('pillar', pillar.pk)['voted'], voted)
+        with mock.patch('time.time', return_value=time.time() + stats_cache.VERSION_TIMEOUT + 1):
+            self.assertEqual(scope_stats('pillar', pillar.pk)['voted'], voted + 1)
+
+    def test_new_pillar_invalidates_candidate_counts(self):
+        candidate = self.candidates[0]
+        self.assertEqual(scope_stats('candidate', candidate.pk)['total_pillars'], 2)
+        user = CustomUser.objects.create_user(username='new_pillar', password='pass', user_type='pillar')
+        Pillar.objects.create(user=user, candidate=candidate)
+        self.assertEqual(scope_stats('candidate', candidate.pk)['total_pillars'], 3)
+        self.assertEqual(scope_stats('entity', self.entity.pk)['total_pillars'], 5)
+
+
+class StatsApiTests(ElectionsDataMixin, TestCase):
+
+    def get_stats(self, user):
+        self.client.force_login(user)
+        response = self.client.get(reverse('elections:api_stats'))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_stats_for_each_role(self):
+        self.assertEqual(self.get_stats(self.admin_user)['stats']['total_voters'], 20)
+        data = self.get_stats(self.entity.user)
+        self.assertEqual(data['scope'], 'entity')
+        self.assertEqual(data['stats']['total_candidates'], 2)
+        self.assertEqual(self.get_stats(self.candidates[1].user)['stats']['total_voters'], 10)
+        data = self.get_stats(self.pillars[0].user)
+        self.assertEqual(data['stats'], compute_scope_stats('pillar', self.pillars[0].pk))
+
+    def test_user_without_profile_is_rejected(self):
+        user = CustomUser.objects.create_user(username='orphan', password='pass', user_type='pillar')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(reverse('elections:api_stats')).status_code, 403)
+
+    def test_dashboards_poll_json_endpoint(self):
+        self.client.force_login(self.entity.user)
+        response = self.client.get(reverse('elections:entity_dashboard'))
+        self.assertContains(response, reverse('elections:api_stats'))
+        self.assertNotContains(response, 'DOMParser')
+
+
+class StatsStreamTests(ElectionsDataMixin, TestCase):
+
+    def test_broker_delivers_to_channel_subscribers(self):
+        async def run():
+            broker = InProcessBroker()
+            subscription = broker.subscribe('stats:pillar:1')
+            other = broker.subscribe('stats:pillar:2')
+            broker.publish('stats:pillar:1', {'changes': {'voted': 1}})
+            message = await asyncio.wait_for(subscription.get(), 1)
+            self.assertTrue(other.queue.empty())
+            broker.unsubscribe(subscription)
+            broker.unsubscribe(other)
+            self.assertEqual(broker.subscriber_count('stats:pillar:1'), 0)
+            return message
+        self.assertEqual(async_to_sync(run)(), {'changes': {'voted': 1}})
+
+    def test_stream_sends_snapshot_then_delta(self):
+        pillar = self.pillars[0]
+        voter = pillar.voters.filter(voting_status='not_voted').first()
+
+        def vote():
+            with self.captureOnCommitCallbacks(execute=True):
+                voter.voting_status = 'voted'
+                voter.save()
+
+        async def run():
+            stream = stats_event_stream('pillar', pillar.pk)
+            snapshot = await stream.__anext__()
+            self.assertEqual(get_broker().subscriber_count(scope_channel('pillar', pillar.pk)), 1)
+            await sync_to_async(vote)()
+            delta = await asyncio.wait_for(stream.__anext__(), 5)
+            await stream.aclose()
+            return snapshot, delta
+
+        snapshot, delta = async_to_sync(run)()
+        self.assertTrue(snapshot.startswith('event: snapshot'))
+        self.assertTrue(delta.startswith('event: delta'))
+        data = json.loads(delta.split('data: ', 1)[1])
+        self.assertEqual(data['voted'], pillar.voters.filter(voting_status='voted').count())
+        self.assertNotIn('total_voters', data)
+        self.assertEqual(get_broker().subscriber_count(scope_channel('pillar', pillar.pk)), 0)
+
+    def test_stream_closes_after_lifetime(self):
+        pillar = self.pillars[0]
+
+        async def run():
+            return [message async for message in stats_event_stream('pillar', pillar.pk)]
+
+        with mock.patch('elections.views.STREAM_LIFETIME', 0.05):
+            messages = async_to_sync(run)()
+        self.assertTrue(messages[0].startswith('event: snapshot'))
+        self.assertEqual(messages[-1], 'retry: 1000\n\n')
+        self.assertEqual(get_broker().subscriber_count(scope_channel('pillar', pillar.pk)), 0)
+
+    def test_stream_requires_asgi(self):
+        self.client.force_login(self.pillars[0].user)
+        self.assertEqual(self.client.get(reverse('elections:stats_stream')).status_code, 204)
+
+
+class ConditionalGetTests(ElectionsDataMixin, TestCase):
+
+    def test_unchanged_dashboard_returns_304_without_queries(self):
+        self.client.force_login(self.entity.user)
+        url = reverse('elections:entity_dashboard')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertNotIn('no-store', response['Cache-Control'])
+        etag = response['ETag']
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([q for q in ctx.captured_queries if 'elections_voter' in q['sql']])
+
+    def test_voter_change_changes_etag(self):
+        pillar = self.pillars[0]
+        self.client.force_login(pillar.user)
+        url = reverse('elections:pillar_dashboard')
+        etag = self.client.get(url)['ETag']
+        voter = pillar.voters.filter(voting_status='not_voted').first()
+        voter.voting_status = 'voted'
+        voter.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_name_and_phone_edits_change_etag(self):
+        pillar = self.pillars[0]
+        self.client.force_login(pillar.user)
+        voter = pillar.voters.first()
+        for field, value in (('name', 'اسم جديد'), ('phone_number', '07719999999')):
+            for url in (reverse('elections:pillar_dashboard'), reverse('elections:statistics_detail', args=['voters'])):
+                # الطلب الأول يضبط ملف تعريف CSRF الذي يدخل في الوسم
+                self.client.get(url)
+                etag = self.client.get(url)['ETag']
+                setattr(voter, field, value)
+                voter.save()
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200, (field, url))
+                if field == 'name':
+                    self.assertContains(response, value)
+                setattr(voter, field, value + '1' if field == 'name' else '07718888888')
+                voter.save()
+
+    def test_upsert_import_changes_etag(self):
+        pillar = self.pillars[0]
+        self.client.force_login(pillar.user)
+        url = reverse('elections:pillar_dashboard')
+        self.client.get(url)
+        etag = self.client.get(url)['ETag']
+        voter = pillar.voters.select_related('polling_center', 'polling_station').first()
+        center = voter.polling_center
+        output = io.StringIO()
+        csv.writer(output).writerows([
+            ['الاسم', 'رقم الناخب', 'رقم الهاتف', 'المحافظة', 'المنطقة', 'الناحية', 'اسم المركز', 'رقم المركز',
+             'المحطة', 'حالة البطاقة', 'حالة التصويت'],
+            ['اسم مصحح', voter.voter_number, voter.phone_number, center.governorate, center.district,
+             center.sub_district, center.name, center.number, voter.polling_station.number,
+             voter.get_card_status_display(), voter.get_voting_status_display()],
+        ])
+        result = import_voters(io.BytesIO(output.getvalue().encode()), pillar, mode='upsert')
+        self.assertEqual((result['updated'], result['skipped']), (1, 0), result)
+        self.assertEqual(check_rollups(), [])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'اسم مصحح')
+
+    def test_other_scope_change_keeps_etag(self):
+        self.client.force_login(self.pillars[0].user)
+        url = reverse('elections:pillar_dashboard')
+        # الطلب الأول يضبط ملف تعريف CSRF الذي يدخل في الوسم
+        self.client.get(url)
+        etag = self.client.get(url)['ETag']
+        voter = self.pillars[3].voters.first()
+        voter.card_status = 'updated'
+        voter.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_query_string_and_json_api(self):
+        self.client.force_login(self.admin_user)
+        url = reverse('elections:statistics_detail', args=['voters'])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url + '?page=2', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        stats_url = reverse('elections:get_voter_stats')
+        etag = self.client.get(stats_url)['ETag']
+        self.assertEqual(self.client.get(stats_url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class DashboardQueryCountTests(ElectionsDataMixin, TestCase):
+    """عدد الاستعلامات لكل لوحة تحكم يجب ألا يتغير مع زيادة عدد الناخبين"""
+
+    def dashboard_queries(self, username, url_name):
+        self.client.force_login(CustomUser.objects.get(username=username))
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def assertConstantQueries(self, username, url_name, expected):
+        self.assertEqual(self.dashboard_queries(username, url_name), expected)
+        for pillar in self.pillars:
+            self.add_voters(pillar, 10)
+        self.assertEqual(self.dashboard_queries(username, url_name), expected)
+
+    def test_admin_dashboard(self):
+        self.assertConstantQueries('admin', 'elections:admin_dashboard', 9)
+
+    def test_entity_dashboard(self):
+        self.assertConstantQueries('entity', 'elections:entity_dashboard', 10)
+
+    def test_entity_dashboard_independent_of_candidates(self):
+        before = self.dashboard_queries('entity', 'elections:entity_dashboard')
+        for c in range(3):
+            user = CustomUser.objects.create_user(
+                username=f'extra{c}', password='pass', full_name=f'مرشح إضافي {c}', user_type='candidate')
+            candidate = Candidate.objects.create(user=user, entity=self.entity)
+            pillar_user = CustomUser.objects.create_user(
+                username=f'extra_pillar{c}', password='pass', full_name=f'ركيزة إضافية {c}', user_type='pillar')
+            self.add_voters(Pillar.objects.create(user=pillar_user, candidate=candidate), 3)
+        self.assertEqual(self.dashboard_queries('entity', 'elections:entity_dashboard'), before)
+
+    def test_candidate_dashboard(self):
+        self.assertConstantQueries('candidate0', 'elections:candidate_dashboard', 10)
+
+    def test_pillar_dashboard(self):
+        self.assertConstantQueries('pillar00', 'elections:pillar_dashboard', 11)
+
+    def test_statistics_detail_per_stat_type(self):
+        cases = [('admin', 'entities'), ('admin', 'candidates'), ('entity', 'candidates'),
+                 ('admin', 'pillars'), ('entity', 'pillars'), ('candidate0', 'pillars')]
+        cases += [(username, stat_type) for username in ('admin', 'entity', 'candidate0', 'pillar00')
+                  for stat_type in ('voters', 'voted', 'not_voted', 'updated', 'not_updated')]
+
+        def counts():
+            result = {}
+            for username, stat_type in cases:
+                self.client.force_login(CustomUser.objects.get(username=username))
+                url = reverse('elections:statistics_detail', args=[stat_type])
+                # الطلب الأول يملأ الذاكرة المؤقتة للإحصائيات وقوائم التصفية
+                self.client.get(url)
+                with CaptureQueriesContext(connection) as ctx:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                if stat_type == 'pillars' and username != 'candidate0':
+                    self.assertContains(response, self.pillars[0].candidate.user.full_name)
+                result[username, stat_type] = len(ctx.captured_queries)
+            return result
+
+        before = counts()
+        user = CustomUser.objects.create_user(
+            username='extra', password='pass', full_name='مرشح إضافي', user_type='candidate')
+        candidate = Candidate.objects.create(user=user, entity=self.entity)
+        for p in range(3):
+            pillar_user = CustomUser.objects.create_user(
+                username=f'extra_pillar{p}', password='pass', full_name=f'ركيزة إضافية {p}', user_type='pillar')
+            self.add_voters(Pillar.objects.create(user=pillar_user, candidate=candidate), 10)
+        for pillar in self.pillars:
+            self.add_voters(pillar, 10)
+        # عدد ثابت لكل نوع مهما زاد عدد المرشحين والركائز والناخبين
+        base = {'admin': 4, 'entity': 5, 'candidate0': 5, 'pillar00': 5}
+        self.assertEqual(before, {(username, stat_type): base[username] + (stat_type in ('entities', 'candidates', 'pillars'))
+                                  for username, stat_type in cases})
+        self.assertEqual(counts(), before)
@@ -41,6 +41,7 @@ urlpatterns = [
     
     # إحصائيات
     path('statistics/<str:stat_type>/', views.statistics_detail, name='statistics_detail'),
+    path('statistics/<str:stat_type>/export/', views.export_voters, name='export_voters'),
     
     # صفحة اختبار الصور
     path('test-images/', views.test_candidate_images, name='test_candidate_images'),
@@ -48,5 +49,10 @@ urlpatterns = [
     
     # API endpoints
     path('api/get-voter-stats/', views.get_voter_stats, name='get_voter_stats'),
+    path('api/stats/', views.api_stats, name='api_stats'),
+    path('api/voters/', views.api_voters, name='api_voters'),
+    path('api/turnout/', views.api_turnout, name='api_turnout'),
+    path('api/imports/<int:job_id>/', views.import_progress, name='import_progress'),
+    path('api/stats/stream/', views.stats_stream, name='stats_stream'),
     path('get-pillars/<int:candidate_id>/', views.get_pillars_for_candidate, name='get_pillars_for_candidate'),
 ]
\ No newline at end of file
@@ -1,16 +1,33 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
+from django.urls import reverse
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.core.paginator import Paginator
 from django.db.models import Q, Count
-from .models import CustomUser, Entity, Candidate, Pillar, Voter, AppearanceSettings
+from .models import CustomUser, Entity, Candidate, Pillar, Voter, AppearanceSettings, ImportJob
+from .statistics import scope_stats, scope_facets, candidate_stats, attach_rollups, user_scope, VoterResultSet
+from .pagination import KeysetPaginator
+from .rollups import TURNOUT_BUCKET_MINUTES, turnout_series
+from .exports import EXPORT_FORMATS, export_response
+from .jobs import submit_job
 from .forms import LoginForm, ExcelUploadForm, VoterForm, PillarForm, CandidateForm, VoterCandidateForm, EntityForm, EditEntityForm, EditCandidateForm
+from .events import get_broker, scope_channel
+from .conditional import scope_conditional, admin_scopes
+from asgiref.sync import sync_to_async
+import asyncio
 import json
-import openpyxl
+
+def render_page(request, template_name, context, fragments):
+    """الصفحة كاملة، أو جزء منها وحده إن طلبه المتصفح بـ ?fragment=الاسم (انظر fragments.js)"""
+    fragment = fragments.get(request.GET.get('fragment'))
+    return render(request, fragment or template_name, context)
 
 # صفحة تسجيل الدخول
 def login_view(request):
@@ -44,6 +61,7 @@ def logout_view(request):
 
 # لوحة تحكم الكيان
 @login_required
+@scope_conditional()
 def entity_dashboard(request):
     if request.user.user_type != 'entity':
         return redirect('elections:login')
@@ -52,106 +70,43 @@ def entity_dashboard(request):
     candidates = entity.candidates.all()
     
     # إحصائيات عامة
-    total_candidates = candidates.count()
-    total_pillars = Pillar.objects.filter(candidate__entity=entity).count()
-    total_voters = Voter.objects.filter(candidate__entity=entity).count()
-    total_centers = Voter.objects.filter(candidate__entity=entity).values('center_number').distinct().count()
-    total_stations = Voter.objects.filter(candidate__entity=entity).values('station').distinct().count()
-    updated_voters = Voter.objects.filter(candidate__entity=entity, card_status='updated').count()
-    not_updated_voters = Voter.objects.filter(candidate__entity=entity, card_status='not_updated').count()
-    voted_voters = Voter.objects.filter(candidate__entity=entity, voting_status='voted').count()
-    not_voted_voters = Voter.objects.filter(candidate__entity=entity, voting_status='not_voted').count()
-    
-    # إحصائيات لكل مرشح
-    candidate_stats = []
-    for candidate in candidates:
-        candidate_voters = candidate.voters.count()
-        candidate_voted = candidate.voters.filter(voting_status='voted').count()
-        candidate_not_voted = candidate.voters.filter(voting_status='not_voted').count()
-        candidate_pillars = candidate.pillars.count()
-        voting_percentage = (candidate_voted / candidate_voters * 100) if candidate_voters > 0 else 0
-        candidate_stats.append({
-            'candidate': candidate,
-            'voters_count': candidate_voters,
-            'voted_count': candidate_voted,
-            'not_voted_count': candidate_not_voted,
-            'pillars_count': candidate_pillars,
-            'voting_percentage': round(voting_percentage, 1)
-        })
+    stats = scope_stats('entity', entity.id)
     
-    # تجميع الإحصائيات في متغير stats
-    stats = {
-        'total_candidates': total_candidates,
-        'total_pillars': total_pillars,
-        'total_voters': total_voters,
-        'total_centers': total_centers,
-        'total_stations': total_stations,
-        'updated_cards': updated_voters,
-        'not_updated_cards': not_updated_voters,
-        'voted_voters': voted_voters,
-        'not_voted_voters': not_voted_voters,
-    }
+    # إحصائيات لكل مرشح (استعلام واحد مجمّع حسب المرشح)
+    candidates_stats = candidate_stats(candidates)
     
     context = {
         'entity': entity,
         'stats': stats,
-        'candidate_stats': candidate_stats,
+        'candidate_stats': candidates_stats,
     }
-    response = render(request, 'elections/entity_dashboard.html', context)
-    # إضافة رؤوس لمنع التخزين المؤقت
-    response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response['Pragma'] = 'no-cache'
-    response['Expires'] = '0'
-    return response
+    return render(request, 'elections/entity_dashboard.html', context)
 
 # لوحة تحكم المرشح
 @login_required
+@scope_conditional()
 def candidate_dashboard(request):
     if request.user.user_type != 'candidate':
         return redirect('elections:login')
     
     candidate = get_object_or_404(Candidate, user=request.user)
-    pillars = candidate.pillars.all()
-    
-    # إحصائيات
-    total_pillars = pillars.count()
-    total_voters = candidate.voters.count()
-    total_centers = candidate.voters.values('center_number').distinct().count()
-    total_stations = candidate.voters.values('station').distinct().count()
-    updated_voters = candidate.voters.filter(card_status='updated').count()
-    not_updated_voters = candidate.voters.filter(card_status='not_updated').count()
-    voted_voters = candidate.voters.filter(voting_status='voted').count()
-    not_voted_voters = candidate.voters.filter(voting_status='not_voted').count()
+    pillars = attach_rollups(candidate.pillars.select_related('user'), 'pillar')
     
     context = {
         'candidate': candidate,
         'pillars': pillars,
-        'stats': {
-            'total_pillars': total_pillars,
-            'total_voters': total_voters,
-            'total_centers': total_centers,
-            'total_stations': total_stations,
-            'updated_cards': updated_voters,
-            'not_updated_cards': not_updated_voters,
-            'voted': voted_voters,
-            'not_voted': not_voted_voters,
-        }
+        'stats': scope_stats('candidate', candidate.id),
     }
-    response = render(request, 'elections/candidate_dashboard.html', context)
-    # إضافة رؤوس لمنع التخزين المؤقت
-    response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response['Pragma'] = 'no-cache'
-    response['Expires'] = '0'
-    return response
+    return render(request, 'elections/candidate_dashboard.html', context)
 
 # لوحة تحكم الركيزة
 @login_required
+@scope_conditional()
 def pillar_dashboard(request):
     if request.user.user_type != 'pillar':
         return redirect('elections:login')
     
     pillar = get_object_or_404(Pillar, user=request.user)
-    voters = pillar.voters.all()
     
     # البحث والفلترة
     search_query = request.GET.get('search', '')
@@ -159,60 +114,19 @@ def pillar_dashboard(request):
     voting_status_filter = request.GET.get('voting_status', '')
     district_filter = request.GET.get('district', '')
     sub_district_filter = request.GET.get('sub_district', '')
+    governorate_filter = request.GET.get('governorate', '')
+    result = voter_list(('pillar', pillar.id), 'voters', request.GET)
     
-    if search_query:
-        voters = voters.filter(
-            Q(name__icontains=search_query) |
-            Q(voter_number__icontains=search_query) |
-            Q(phone_number__icontains=search_query)
-        )
-    
-    if card_status_filter:
-        voters = voters.filter(card_status=card_status_filter)
-    
-    if voting_status_filter:
-        voters = voters.filter(voting_status=voting_status_filter)
-    
-    if district_filter:
-        voters = voters.filter(district=district_filter)
-    
-    if sub_district_filter:
-        voters = voters.filter(sub_district=sub_district_filter)
-    
-    # التصفح
-    paginator = Paginator(voters, 25)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # التصفح بالمؤشر مرتباً بالاسم (فهرس الركيزة والاسم)، أو بالصلة عند البحث
+    voters = result.voters.select_related('polling_center', 'polling_station')
+    ordering = result.ordering or ('name', 'id')
+    page_obj = KeysetPaginator(voters, 25, ordering, count=result.total).page(request.GET)
     
     # إحصائيات
-    total_voters = pillar.voters.count()
-    total_centers = pillar.voters.values('center_number').distinct().count()
-    total_stations = pillar.voters.values('station').distinct().count()
-    updated_voters = pillar.voters.filter(card_status='updated').count()
-    not_updated_voters = pillar.voters.filter(card_status='not_updated').count()
-    voted_voters = pillar.voters.filter(voting_status='voted').count()
-    not_voted_voters = pillar.voters.filter(voting_status='not_voted').count()
-    
-    # حساب النسب المئوية
-    voting_percentage = (voted_voters / total_voters * 100) if total_voters > 0 else 0
-    update_percentage = (updated_voters / total_voters * 100) if total_voters > 0 else 0
-    
-    stats = {
-        'total_voters': total_voters,
-        'total_centers': total_centers,
-        'total_stations': total_stations,
-        'updated_cards': updated_voters,
-        'not_updated_cards': not_updated_voters,
-        'voted': voted_voters,
-        'not_voted': not_voted_voters,
-        'voting_percentage': voting_percentage,
-        'update_percentage': update_percentage,
-    }
+    stats = scope_stats('pillar', pillar.id)
     
     # الحصول على قوائم المناطق والنواحي المتاحة
-    governorates = pillar.voters.values_list('governorate', flat=True).distinct().order_by('governorate')
-    districts = pillar.voters.values_list('district', flat=True).distinct().order_by('district')
-    sub_districts = pillar.voters.values_list('sub_district', flat=True).distinct().order_by('sub_district')
+    facets = scope_facets('pillar', pillar.id)
     
     context = {
         'pillar': pillar,
@@ -223,16 +137,15 @@ def pillar_dashboard(request):
         'voting_status_filter': voting_status_filter,
         'district_filter': district_filter,
         'sub_district_filter': sub_district_filter,
-        'governorates': governorates,
-        'districts': districts,
-        'sub_districts': sub_districts,
+        'governorate_filter': governorate_filter,
+        'governorates': facets['governorate'],
+        'districts': facets['district'],
+        'sub_districts': facets['sub_district'],
     }
-    response = render(request, 'elections/pillar_dashboard.html', context)
-    # إضافة رؤوس لمنع التخزين المؤقت
-    response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response['Pragma'] = 'no-cache'
-    response['Expires'] = '0'
-    return response
+    return render_page(request, 'elections/pillar_dashboard.html', context, {
+        'voters': 'elections/partials/pillar_voters.html',
+        'stats': 'elections/partials/pillar_stats.html',
+    })
 
 # تحديث حالة التصويت
 @login_required
@@ -241,7 +154,8 @@ def update_voter_status(request, voter_id):
         return JsonResponse({'success': False, 'error': 'غير مصرح'})
     
     pillar = get_object_or_404(Pillar, user=request.user)
-    voter = get_object_or_404(Voter, id=voter_id, pillar=pillar)
+    voter = get_object_or_404(Voter.objects.select_related('polling_center', 'polling_station'),
+                              id=voter_id, pillar=pillar)
     
     if request.method == 'POST':
         data = json.loads(request.body)
@@ -250,13 +164,20 @@ def update_voter_status(request, voter_id):
         # تحويل القيم العربية إلى القيم المخزنة في قاعدة البيانات
         status_mapping = {
             'صوت': 'voted',
-            'لم يصوت': 'not_voted'
+            'لم يصوت': 'not_voted',
+            'voted': 'voted',
+            'not_voted': 'not_voted',
         }
         
         if new_status in status_mapping:
             voter.voting_status = status_mapping[new_status]
-            voter.save()
-            return JsonResponse({'success': True})
+            voter.save(update_fields=['voting_status'])
+            # صف الناخب المحدث والإحصائيات الجديدة ليُستبدلا في الصفحة دون إعادة تحميلها
+            return JsonResponse({
+                'success': True,
+                'row': render_to_string('elections/partials/pillar_voter_row.html', {'voter': voter}, request),
+                'stats': scope_stats('pillar', pillar.id),
+            })
     
     return JsonResponse({'success': False})
 
@@ -408,136 +329,203 @@ def add_voters_to_candidate(request):
     
     return render(request, 'elections/add_voters_candidate.html', {'form': form})
 
-# رفع ملف Excel للكيان
+def upload_voters(request, title, user_type):
+    """رفع ملف Excel أو CSV لناخبين يُضافون إلى ركيزة من ركائز المستخدم (مهمة استيراد في الخلفية)"""
+    if request.method == 'POST':
+        form = ExcelUploadForm(request.user, request.POST, request.FILES)
+        if not form.is_valid():
+            errors = [error for field_errors in form.errors.values() for error in field_errors]
+            return JsonResponse({'success': False, 'error': ' '.join(errors)})
+        excel_file = form.cleaned_data['excel_file']
+        # الاستيراد يُنفذ في الخلفية وتتابع الصفحة تقدمه من import_progress
+        job = ImportJob.objects.create(user=request.user, pillar=form.cleaned_data['pillar'], file=excel_file,
+                                     mode=form.cleaned_data['mode'])
+        submit_job(job)
+        return JsonResponse({
+            'success': True,
+            'job_id': job.pk,
+            'progress_url': reverse('elections:import_progress', args=[job.pk]),
+        })
+
+    form = ExcelUploadForm(request.user)
+    return render(request, 'elections/upload_excel.html', {'type': user_type, 'title': title, 'form': form})
+
+# تقدم مهمة استيراد يتابعه صاحبها
+@login_required
+def import_progress(request, job_id):
+    job = get_object_or_404(ImportJob, pk=job_id, user=request.user)
+    return JsonResponse(job.progress())
+
+# رفع ملف Excel لناخبي الكيان
 @login_required
 def upload_excel_entity(request):
     if request.user.user_type != 'entity':
         return redirect('elections:login')
-    
-    if request.method == 'POST':
-        try:
-            if 'excel_file' not in request.FILES:
-                return JsonResponse({'success': False, 'error': 'لم يتم اختيار ملف'})
-            
-            excel_file = request.FILES['excel_file']
-            
-            # التحقق من نوع الملف
-            if not excel_file.name.endswith(('.xlsx', '.xls')):
-                return JsonResponse({'success': False, 'error': 'يجب أن يكون الملف من نوع Excel'})
-            
-            # قراءة ملف Excel
-            workbook = openpyxl.load_workbook(excel_file)
-            sheet = workbook.active
-            
-            # معالجة البيانات وإضافتها للقاعدة
-            created_count = 0
-            errors = []
-            
-            for row_num, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), start=2):
-                try:
-                    # إنشاء مستخدم جديد للكيان
-                    user = CustomUser.objects.create_user(
-                        username=row[0] if row[0] else f'entity_{row_num}',
-                        email=row[1] if row[1] else '',
-                        first_name=row[2] if row[2] else '',
-                        last_name=row[3] if row[3] else '',
-                        password='defaultpassword123',
-                        user_type='entity'
-                    )
-                    
-                    # إنشاء كيان جديد
-                    entity = Entity.objects.create(
-                        user=user,
-                        phone=row[4] if row[4] else '',
-                        address=row[5] if row[5] else ''
-                    )
-                    
-                    created_count += 1
-                except Exception as e:
-                    errors.append(f'الصف {row_num}: {str(e)}')
-            
-            return JsonResponse({
-                'success': True, 
-                'message': f'تم إنشاء {created_count} كيان بنجاح',
-                'errors': errors
-            })
-            
-        except Exception as e:
-            return JsonResponse({'success': False, 'error': f'خطأ في معالجة الملف: {str(e)}'})
-    
-    return render(request, 'elections/upload_excel.html', {'type': 'entity', 'title': 'رفع ملف الكيانات'})
+    return upload_voters(request, 'رفع ملف الناخبين للكيان', 'entity')
 
-# رفع ملف Excel للمرشح
+# رفع ملف Excel لناخبي المرشح
 @login_required
 def upload_excel_candidate(request):
     if request.user.user_type != 'candidate':
         return redirect('elections:login')
-    
-    candidate = get_object_or_404(Candidate, user=request.user)
-    
-    if request.method == 'POST':
-        try:
-            if 'excel_file' not in request.FILES:
-                return JsonResponse({'success': False, 'error': 'لم يتم اختيار ملف'})
-            
-            excel_file = request.FILES['excel_file']
-            
-            # التحقق من نوع الملف
-            if not excel_file.name.endswith(('.xlsx', '.xls')):
-                return JsonResponse({'success': False, 'error': 'يجب أن يكون الملف من نوع Excel'})
-            
-            # قراءة ملف Excel
-            workbook = openpyxl.load_workbook(excel_file)
-            sheet = workbook.active
-            
-            # معالجة البيانات وإضافتها للقاعدة
-            created_count = 0
-            errors = []
-            
-            for row_num, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), start=2):
-                try:
-                    # إنشاء ناخب جديد
-                    voter = Voter.objects.create(
-                        name=row[0] if row[0] else '',
-                        voter_number=row[1] if row[1] else '',
-                        phone_number=row[2] if row[2] else '',
-                        address=row[3] if row[3] else '',
-                        center_number=row[4] if row[4] else '',
-                        station=row[5] if row[5] else '',
-                        card_status=row[6] if row[6] else 'not_updated',
-                        voting_status=row[7] if row[7] else 'not_voted',
-                        notes=row[8] if row[8] else '',
-                        candidate=candidate
-                    )
-                    
-                    created_count += 1
-                except Exception as e:
-                    errors.append(f'الصف {row_num}: {str(e)}')
-            
-            return JsonResponse({
-                'success': True, 
-                'message': f'تم إنشاء {created_count} ناخب بنجاح',
-                'errors': errors
-            })
-            
-        except Exception as e:
-            return JsonResponse({'success': False, 'error': f'خطأ في معالجة الملف: {str(e)}'})
-    
-    return render(request, 'elections/upload_excel.html', {'type': 'candidate', 'title': 'رفع ملف الناخبين للمرشح'})
+    return upload_voters(request, 'رفع ملف الناخبين للمرشح', 'candidate')
 
 
 
 # API للحصول على إحصائيات الناخبين
 @csrf_exempt
+@scope_conditional(admin_scopes)
 def get_voter_stats(request):
     if request.method == 'GET':
         # منطق الحصول على الإحصائيات
-        stats = {
-            'total_voters': Voter.objects.count(),
-            'voted': Voter.objects.filter(voting_status='voted').count(),
-            'not_voted': Voter.objects.filter(voting_status='not_voted').count(),
-        }
-        return JsonResponse(stats)
+        stats = scope_stats('admin')
+        return JsonResponse({
+            'total_voters': stats['total_voters'],
+            'voted': stats['voted'],
+            'not_voted': stats['not_voted'],
+        })
+
+# API إحصائيات نطاق المستخدم الحالي (تستخدمه لوحات التحكم للتحديث الدوري)
+@login_required
+@scope_conditional()
+def api_stats(request):
+    scope = user_scope(request.user)
+    if scope is None:
+        return JsonResponse({'error': 'غير مصرح'}, status=403)
+    return JsonResponse({'scope': scope[0], 'stats': scope_stats(*scope)})
+
+# منحنى المشاركة لنطاق المستخدم من فترات المصوتين المجمعة (لا يمر بجدول الناخبين)
+@login_required
+@scope_conditional()
+def api_turnout(request):
+    scope = user_scope(request.user)
+    if scope is None:
+        return JsonResponse({'error': 'غير مصرح'}, status=403)
+    series = turnout_series(*scope)
+    voted = scope_stats(*scope)['voted']
+    cumulative = 0
+    buckets = []
+    for bucket, count in series:
+        cumulative += count
+        buckets.append([bucket.isoformat(), count, cumulative])
+    return JsonResponse({
+        'bucket_minutes': TURNOUT_BUCKET_MINUTES,
+        'buckets': buckets,
+        'voted': voted,
+        # مصوتون قبل تسجيل أوقات التصويت
+        'untimed': voted - cumulative,
+    }, json_dumps_params={'separators': (',', ':')})
+
+# حقول الناخب المتاحة في API الناخبين (الاسم في الاستجابة: مسار الحقل)
+API_VOTER_FIELDS = {
+    'id': 'id',
+    'voter_number': 'voter_number',
+    'name': 'name',
+    'phone_number': 'phone_number',
+    'card_status': 'card_status',
+    'voting_status': 'voting_status',
+    'governorate': 'polling_center__governorate',
+    'district': 'polling_center__district',
+    'sub_district': 'polling_center__sub_district',
+    'center_name': 'polling_center__name',
+    'center_number': 'polling_center__number',
+    'station': 'polling_station__number',
+    'pillar': 'pillar_id',
+    'candidate': 'candidate_id',
+}
+API_DEFAULT_FIELDS = ('id', 'voter_number', 'name', 'card_status', 'voting_status')
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+
+# API ناخبي نطاق المستخدم: تصفية لوحة الركيزة، تصفح بالمؤشر (after/before)، واختيار الحقول (fields=)
+@login_required
+def api_voters(request):
+    scope = user_scope(request.user)
+    if scope is None:
+        return JsonResponse({'error': 'غير مصرح'}, status=403)
+    fields = [f for f in request.GET.get('fields', '').split(',') if f] or list(API_DEFAULT_FIELDS)
+    unknown = [f for f in fields if f not in API_VOTER_FIELDS]
+    if unknown:
+        return JsonResponse({'error': f'حقول غير معروفة: {", ".join(unknown)}'}, status=400)
+    try:
+        limit = min(max(int(request.GET.get('limit', API_PAGE_SIZE)), 1), API_MAX_PAGE_SIZE)
+    except ValueError:
+        limit = API_PAGE_SIZE
+    
+    result = voter_list(scope, 'voters', request.GET)
+    ordering = result.ordering or ('id',)
+    # الصفوف قواميس بالحقول المطلوبة وحقول الترتيب فقط (لا تُنشأ كائنات Voter)
+    voters = result.voters.values(*{API_VOTER_FIELDS[f] for f in fields} | set(ordering))
+    page = KeysetPaginator(voters, limit, ordering, count=result.total).page(request.GET)
+    return JsonResponse({
+        'count': page.count,
+        'fields': fields,
+        'rows': [[row[API_VOTER_FIELDS[f]] for f in fields] for row in page],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    }, json_dumps_params={'ensure_ascii': False, 'separators': (',', ':')})
+
+# فترة إرسال نبضة إبقاء الاتصال في البث المباشر، ومدة تجميع التغييرات المتتالية (بالثواني)
+STREAM_KEEPALIVE = 15
+STREAM_COALESCE = 0.25
+# أقصى مدة للاتصال الواحد: Django 4.2 لا يكتشف انقطاع المتصفح أثناء البث، فيُغلق
+# البث بعدها ويعيد EventSource الاتصال بعد STREAM_RETRY ملي ثانية (إن بقيت الصفحة مفتوحة)
+STREAM_LIFETIME = getattr(settings, 'ELECTIONS_STREAM_LIFETIME', 300)
+STREAM_RETRY = 1000
+
+
+def sse_message(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+
+async def stats_event_stream(scope, scope_id):
+    """
+    بث إحصائيات النطاق: لقطة كاملة عند الاتصال، ثم القيم التي تغيرت فقط
+    بعد كل تغيير في بيانات النطاق، حتى انتهاء STREAM_LIFETIME
+    """
+    broker = get_broker()
+    subscription = broker.subscribe(scope_channel(scope, scope_id))
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + STREAM_LIFETIME
+    try:
+        last = await sync_to_async(scope_stats)(scope, scope_id)
+        yield sse_message('snapshot', last)
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                yield f'retry: {STREAM_RETRY}\n\n'
+                return
+            try:
+                await asyncio.wait_for(subscription.get(), timeout=min(STREAM_KEEPALIVE, remaining))
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            # تجميع دفعة التغييرات المتتالية في رسالة واحدة
+            await asyncio.sleep(STREAM_COALESCE)
+            subscription.drain()
+            stats = await sync_to_async(scope_stats)(scope, scope_id)
+            delta = {key: value for key, value in stats.items() if last.get(key) != value}
+            if delta:
+                yield sse_message('delta', delta)
+                last = stats
+    finally:
+        broker.unsubscribe(subscription)
+
+
+# بث مباشر لإحصائيات نطاق المستخدم (Server-Sent Events) عند التشغيل عبر ASGI
+async def stats_stream(request):
+    scope = await sync_to_async(
+        lambda: user_scope(request.user) if request.user.is_authenticated else None
+    )()
+    if scope is None:
+        return JsonResponse({'error': 'غير مصرح'}, status=403)
+    if not isinstance(request, ASGIRequest):
+        # خادم WSGI لا يدعم الاتصالات الطويلة؛ 204 يوقف EventSource فتعود الصفحة للتحديث الدوري
+        return HttpResponse(status=204)
+    response = StreamingHttpResponse(stats_event_stream(*scope), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 # جلب الركائز للمرشح المحدد
 @login_required
@@ -561,39 +549,30 @@ def get_pillars_for_candidate(request, candidate_id):
 
 # لوحة تحكم الإدارة
 @login_required
+@scope_conditional()
 def admin_dashboard(request):
     if request.user.user_type != 'admin':
         return redirect('elections:login')
     
     # إحصائيات شاملة
-    total_entities = Entity.objects.count()
-    total_candidates = Candidate.objects.count()
-    total_pillars = Pillar.objects.count()
-    total_voters = Voter.objects.count()
-    voted_count = Voter.objects.filter(voting_status='voted').count()
-    not_voted_count = Voter.objects.filter(voting_status='not_voted').count()
+    stats = scope_stats('admin')
     
     # أحدث الكيانات والمرشحين
     recent_entities = Entity.objects.select_related('user').order_by('-user__created_at')[:5]
     recent_candidates = Candidate.objects.select_related('user', 'entity').order_by('-user__created_at')[:5]
     
     context = {
-        'total_entities': total_entities,
-        'total_candidates': total_candidates,
-        'total_pillars': total_pillars,
-        'total_voters': total_voters,
-        'voted_count': voted_count,
-        'not_voted_count': not_voted_count,
-        'voting_percentage': round((voted_count / total_voters * 100) if total_voters > 0 else 0, 2),
+        'total_entities': stats['total_entities'],
+        'total_candidates': stats['total_candidates'],
+        'total_pillars': stats['total_pillars'],
+        'total_voters': stats['total_voters'],
+        'voted_count': stats['voted'],
+        'not_voted_count': stats['not_voted'],
+        'voting_percentage': stats['voting_percentage'],
         'recent_entities': recent_entities,
         'recent_candidates': recent_candidates,
     }
-    response = render(request, 'elections/admin_dashboard.html', context)
-    # إضافة رؤوس لمنع التخزين المؤقت
-    response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response['Pragma'] = 'no-cache'
-    response['Expires'] = '0'
-    return response
+    return render(request, 'elections/admin_dashboard.html', context)
 
 # إنشاء كيان جديد
 @login_required
@@ -815,8 +794,72 @@ def delete_candidate(request, candidate_id):
     context = {'candidate': candidate}
     return render(request, 'elections/delete_candidate.html', context)
 
+# قوائم الناخبين في صفحة تفاصيل الإحصائيات: (فلتر الحالة، العنوان)
+VOTER_LISTS = {
+    'voters': (None, 'تفاصيل الناخبين'),
+    'voted': (('voting_status', 'voted'), 'الناخبون الذين صوتوا'),
+    'not_voted': (('voting_status', 'not_voted'), 'الناخبون الذين لم يصوتوا'),
+    'updated': (('card_status', 'updated'), 'الناخبون المحدثون'),
+    'not_updated': (('card_status', 'not_updated'), 'الناخبون غير المحدثين'),
+}
+
+# معاملات الرابط التي تصفي قوائم الناخبين وحقولها
+VOTER_FILTERS = {
+    'governorate': 'polling_center__governorate',
+    'card_status': 'card_status',
+    'voting_status': 'voting_status',
+    'district': 'polling_center__district',
+    'sub_district': 'polling_center__sub_district',
+}
+
+def voter_list(scope, stat_type, params):
+    """ناخبو قائمة stat_type في نطاق المستخدم بعد البحث والتصفية من معاملات الرابط"""
+    status = VOTER_LISTS[stat_type][0]
+    if stat_type == 'voters' and params.get('vote_status') in ('voted', 'not_voted'):
+        status = ('voting_status', params['vote_status'])
+    result = VoterResultSet(*scope, status=status)
+    result.search(params.get('search', '').strip())
+    for param, field in VOTER_FILTERS.items():
+        if params.get(param):
+            result.filter(**{field: params[param]})
+    return result
+
+# أعمدة جدول الناخبين، والعلاقات المعروضة فيه حسب نطاق المستخدم (تُجلب بالربط نفسه)
+VOTER_LIST_FIELDS = ('name', 'voter_number', 'card_status', 'phone_number', 'voting_status', 'created_at')
+VOTER_LIST_RELATED = {
+    'admin': {'entity': 'entity_name', 'candidate__user': 'full_name', 'pillar__user': 'full_name'},
+    'entity': {'candidate__user': 'full_name', 'pillar__user': 'full_name'},
+    'candidate': {'pillar__user': 'full_name'},
+    'pillar': {},
+}
+
+def voter_list_rows(voters, scope):
+    """ناخبو صفحة الإحصائيات بأعمدة الجدول فقط وعلاقاته في استعلام واحد"""
+    related = VOTER_LIST_RELATED[scope]
+    fields = [f'{path}__{field}' for path, field in related.items()]
+    # المفاتيح الأجنبية على طريق كل علاقة تُحمّل معها
+    for path in related:
+        parts = path.split('__')
+        fields += ['__'.join(parts[:i]) for i in range(1, len(parts) + 1)]
+    return voters.select_related(*related).only(*VOTER_LIST_FIELDS, *fields)
+
+# تصدير قائمة ناخبين بالبحث والتصفية الحالية (CSV أو Excel)
+@login_required
+def export_voters(request, stat_type):
+    scope = user_scope(request.user)
+    if scope is None or stat_type not in VOTER_LISTS:
+        messages.error(request, 'ليس لديك صلاحية لعرض هذه البيانات')
+        return redirect('elections:login')
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return HttpResponse('صيغة التصدير غير مدعومة', status=400)
+    result = voter_list(scope, stat_type, request.GET)
+    return export_response(request, result.voters, scope[0], export_format,
+                           name=stat_type, ordering=result.ordering or ('id',))
+
 # صفحة تفاصيل الإحصائيات
 @login_required
+@scope_conditional()
 def statistics_detail(request, stat_type):
     # التحقق من صلاحيات المستخدم
     if request.user.user_type not in ['admin', 'entity', 'candidate', 'pillar']:
@@ -832,14 +875,15 @@ def statistics_detail(request, stat_type):
     # تحديد البيانات حسب نوع الإحصائية ونوع المستخدم
     if stat_type == 'entities':
         if request.user.user_type == 'admin':
-            entities = Entity.objects.all().annotate(
-                candidates_count=Count('candidates'),
-                voters_count=Count('candidates__voters')
+            entities = attach_rollups(
+                Entity.objects.select_related('user').only('entity_name', 'user__created_at')
+                .annotate(candidates_count=Count('candidates')),
+                'entity',
             )
             context.update({
                 'entities': entities,
                 'page_title': 'تفاصيل الكيانات',
-                'total_count': entities.count()
+                'total_count': len(entities)
             })
         else:
             messages.error(request, 'ليس لديك صلاحية لعرض هذه البيانات')
@@ -847,208 +891,93 @@ def statistics_detail(request, stat_type):
     
     elif stat_type == 'candidates':
         if request.user.user_type == 'admin':
-            candidates = Candidate.objects.all().select_related('entity').annotate(
-                pillars_count=Count('pillars'),
-                voters_count=Count('voters')
-            )
+            candidates = Candidate.objects.all()
         elif request.user.user_type == 'entity':
-            candidates = Candidate.objects.filter(entity=request.user.entity_profile).annotate(
-                pillars_count=Count('pillars'),
-                voters_count=Count('voters')
-            )
+            candidates = Candidate.objects.filter(entity=request.user.entity_profile)
         else:
             messages.error(request, 'ليس لديك صلاحية لعرض هذه البيانات')
             return redirect('elections:login')
         
+        # أعمدة الجدول فقط، وعدد الناخبين من الإحصائيات المجمعة بدلاً من ربط جدول الناخبين
+        candidates = attach_rollups(
+            candidates.select_related('user', 'entity')
+            .only('user__full_name', 'user__created_at', 'entity__entity_name')
+            .annotate(pillars_count=Count('pillars')),
+            'candidate',
+        )
         context.update({
             'candidates': candidates,
             'page_title': 'تفاصيل المرشحين',
-            'total_count': candidates.count()
+            'total_count': len(candidates)
         })
     
     elif stat_type == 'pillars':
         if request.user.user_type == 'admin':
-            pillars = Pillar.objects.all().select_related('candidate', 'candidate__entity').annotate(
-                voters_count=Count('voters')
-            )
+            pillars = Pillar.objects.all()
         elif request.user.user_type == 'entity':
-            pillars = Pillar.objects.filter(candidate__entity=request.user.entity_profile).select_related('candidate').annotate(
-                voters_count=Count('voters')
-            )
+            pillars = Pillar.objects.filter(candidate__entity=request.user.entity_profile)
         elif request.user.user_type == 'candidate':
-            pillars = Pillar.objects.filter(candidate=request.user.candidate_profile).annotate(
-                voters_count=Count('voters')
-            )
+            pillars = Pillar.objects.filter(candidate=request.user.candidate_profile)
         else:
             messages.error(request, 'ليس لديك صلاحية لعرض هذه البيانات')
             return redirect('elections:login')
         
+        pillars = attach_rollups(
+            pillars.select_related('user', 'candidate__user', 'candidate__entity')
+            .only('user__full_name', 'user__phone_number', 'user__created_at',
+                  'candidate__user__full_name', 'candidate__entity__entity_name'),
+            'pillar',
+        )
         context.update({
             'pillars': pillars,
             'page_title': 'تفاصيل الركائز',
-            'total_count': pillars.count()
+            'total_count': len(pillars)
         })
     
-    elif stat_type == 'voters':
-        if request.user.user_type == 'admin':
-            voters = Voter.objects.all().select_related('pillar', 'pillar__candidate', 'pillar__candidate__entity')
-        elif request.user.user_type == 'entity':
-            voters = Voter.objects.filter(pillar__candidate__entity=request.user.entity_profile).select_related('pillar', 'pillar__candidate')
-        elif request.user.user_type == 'candidate':
-            voters = Voter.objects.filter(pillar__candidate=request.user.candidate_profile).select_related('pillar')
-        elif request.user.user_type == 'pillar':
-            voters = Voter.objects.filter(pillar=request.user.pillar_profile)
-        
-        # تطبيق التصفية حسب حالة التصويت إذا تم تمريرها
-        vote_status = request.GET.get('vote_status')
-        if vote_status == 'voted':
-            voters = voters.filter(voting_status='voted')
-            context['filter_status'] = 'صوتوا'
-        elif vote_status == 'not_voted':
-            voters = voters.filter(voting_status='not_voted')
-            context['filter_status'] = 'لم يصوتوا'
-        
-        # تطبيق البحث والفلترة
-        search_query = request.GET.get('search')
-        district_filter = request.GET.get('district')
-        sub_district_filter = request.GET.get('sub_district')
-        
-        if search_query:
-            voters = voters.filter(
-                    Q(name__icontains=search_query) |
-                    Q(voter_number__icontains=search_query) |
-                    Q(phone_number__icontains=search_query)
-                )
-            context['search_query'] = search_query
-        
-        if district_filter:
-            voters = voters.filter(district=district_filter)
-            context['district_filter'] = district_filter
-        
-        if sub_district_filter:
-            voters = voters.filter(sub_district=sub_district_filter)
-            context['sub_district_filter'] = sub_district_filter
-        
-        # التصفح
-        paginator = Paginator(voters, 50)
-        page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
-        
-        # الحصول على قوائم المناطق والنواحي المتاحة
-        all_voters_for_filters = voters.model.objects.all()
-        if request.user.user_type == 'entity':
-            all_voters_for_filters = voters.model.objects.filter(pillar__candidate__entity=request.user.entity_profile)
-        elif request.user.user_type == 'candidate':
-            all_voters_for_filters = voters.model.objects.filter(pillar__candidate=request.user.candidate_profile)
-        elif request.user.user_type == 'pillar':
-            all_voters_for_filters = voters.model.objects.filter(pillar=request.user.pillar_profile)
-        
-        districts = all_voters_for_filters.values_list('district', flat=True).distinct().order_by('district')
-        sub_districts = all_voters_for_filters.values_list('sub_district', flat=True).distinct().order_by('sub_district')
-        
-        context.update({
-            'voters': page_obj,
-            'page_title': 'تفاصيل الناخبين',
-            'total_count': voters.count(),
-            'voted_count': voters.filter(voting_status='voted').count(),
-            'not_voted_count': voters.filter(voting_status='not_voted').count(),
-            'districts': districts,
-            'sub_districts': sub_districts,
-        })
-    
-    elif stat_type == 'voted':
-        # إحصائيات المصوتين
-        if request.user.user_type == 'admin':
-            voters = Voter.objects.filter(voting_status='voted').select_related('pillar', 'pillar__candidate', 'pillar__candidate__entity')
-        elif request.user.user_type == 'entity':
-            voters = Voter.objects.filter(voting_status='voted', pillar__candidate__entity=request.user.entity_profile).select_related('pillar', 'pillar__candidate')
-        elif request.user.user_type == 'candidate':
-            voters = Voter.objects.filter(voting_status='voted', pillar__candidate=request.user.candidate_profile).select_related('pillar')
-        elif request.user.user_type == 'pillar':
-            voters = Voter.objects.filter(voting_status='voted', pillar=request.user.pillar_profile)
-        
-        # التصفح
-        paginator = Paginator(voters, 50)
-        page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
-        
-        context.update({
-            'voters': page_obj,
-            'page_title': 'الناخبون الذين صوتوا',
-            'total_count': voters.count()
-        })
-    
-    elif stat_type == 'not_voted':
-        # إحصائيات غير المصوتين
-        if request.user.user_type == 'admin':
-            voters = Voter.objects.filter(voting_status='not_voted').select_related('pillar', 'pillar__candidate', 'pillar__candidate__entity')
-        elif request.user.user_type == 'entity':
-            voters = Voter.objects.filter(voting_status='not_voted', pillar__candidate__entity=request.user.entity_profile).select_related('pillar', 'pillar__candidate')
-        elif request.user.user_type == 'candidate':
-            voters = Voter.objects.filter(voting_status='not_voted', pillar__candidate=request.user.candidate_profile).select_related('pillar')
-        elif request.user.user_type == 'pillar':
-            voters = Voter.objects.filter(voting_status='not_voted', pillar=request.user.pillar_profile)
-        
-        # التصفح
-        paginator = Paginator(voters, 50)
-        page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
-        
-        context.update({
-            'voters': page_obj,
-            'page_title': 'الناخبون الذين لم يصوتوا',
-            'total_count': voters.count()
-        })
-    
-    elif stat_type == 'updated':
-        # إحصائيات المحدثين
-        if request.user.user_type == 'admin':
-            voters = Voter.objects.filter(card_status='updated').select_related('pillar', 'pillar__candidate', 'pillar__candidate__entity')
-        elif request.user.user_type == 'entity':
-            voters = Voter.objects.filter(card_status='updated', pillar__candidate__entity=request.user.entity_profile).select_related('pillar', 'pillar__candidate')
-        elif request.user.user_type == 'candidate':
-            voters = Voter.objects.filter(card_status='updated', pillar__candidate=request.user.candidate_profile).select_related('pillar')
-        elif request.user.user_type == 'pillar':
-            voters = Voter.objects.filter(card_status='updated', pillar=request.user.pillar_profile)
-        
-        # التصفح
-        paginator = Paginator(voters, 50)
-        page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
+    elif stat_type in VOTER_LISTS:
+        scope = user_scope(request.user)
+        if scope is None:
+            messages.error(request, 'ليس لديك صلاحية لعرض هذه البيانات')
+            return redirect('elections:login')
+        page_title = VOTER_LISTS[stat_type][1]
+        result = voter_list(scope, stat_type, request.GET)
         
-        context.update({
-            'voters': page_obj,
-            'page_title': 'الناخبون المحدثون',
-            'total_count': voters.count()
-        })
-    
-    elif stat_type == 'not_updated':
-        # إحصائيات غير المحدثين
-        if request.user.user_type == 'admin':
-            voters = Voter.objects.filter(card_status='not_updated').select_related('pillar', 'pillar__candidate', 'pillar__candidate__entity')
-        elif request.user.user_type == 'entity':
-            voters = Voter.objects.filter(card_status='not_updated', pillar__candidate__entity=request.user.entity_profile).select_related('pillar', 'pillar__candidate')
-        elif request.user.user_type == 'candidate':
-            voters = Voter.objects.filter(card_status='not_updated', pillar__candidate=request.user.candidate_profile).select_related('pillar')
-        elif request.user.user_type == 'pillar':
-            voters = Voter.objects.filter(card_status='not_updated', pillar=request.user.pillar_profile)
+        if stat_type == 'voters':
+            vote_status = request.GET.get('vote_status')
+            if vote_status in ('voted', 'not_voted'):
+                context['filter_status'] = 'صوتوا' if vote_status == 'voted' else 'لم يصوتوا'
+            context.update({
+                'search_query': request.GET.get('search'),
+                'district_filter': request.GET.get('district'),
+                'sub_district_filter': request.GET.get('sub_district'),
+            })
+            
+            # قوائم المناطق والنواحي المتاحة في نطاق المستخدم
+            facets = scope_facets(*scope)
+            context.update({
+                'voted_count': result.counts['voted'],
+                'not_voted_count': result.counts['not_voted'],
+                'districts': facets['district'],
+                'sub_districts': facets['sub_district'],
+            })
         
-        # التصفح
-        paginator = Paginator(voters, 50)
-        page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
+        # التصفح بالمؤشر مرتباً بالمعرف ضمن النطاق (أو بالصلة عند البحث)، بالعدد المحسوب مسبقاً
+        voters = voter_list_rows(result.voters, scope[0])
+        page_obj = KeysetPaginator(voters, 50, result.ordering or ('id',), count=result.total).page(request.GET)
         
         context.update({
             'voters': page_obj,
-            'page_title': 'الناخبون غير المحدثين',
-            'total_count': voters.count()
+            'page_title': page_title,
+            'total_count': result.total,
         })
     
     else:
         messages.error(request, 'نوع الإحصائية غير صحيح')
         return redirect('elections:admin_dashboard')
     
-    return render(request, 'elections/statistics_detail.html', context)
+    return render_page(request, 'elections/statistics_detail.html', context, {
+        'voters': 'elections/partials/statistics_voters.html',
+    } if stat_type in VOTER_LISTS else {})
 
 @login_required
 def appearance_settings(request):